@@ -1,24 +1,212 @@
 
 import os
 import sys
+import threading
+import time
 
-from fastapi import FastAPI
-from starlette.responses import JSONResponse
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, PlainTextResponse, Response
 
-from api.models.models import HousePricing
-from mlops_project.predictor.api_predict import ModelAPIPredictor
+from api.models.models import FEATURES as REQUEST_FEATURES
+from api.models.models import (HousePricing, HousePricingBatch,
+                               HousePricingBatchResponse,
+                               HousePricingTrainingBatch, TrainingJobRequest)
+from mlops_project.predictor.metrics import (PROCESS_START_TIME,
+                                             MetricsRegistry,
+                                             RequestMetricsMiddleware,
+                                             process_memory)
+from mlops_project.predictor.micro_batcher import MicroBatcher
+from mlops_project.predictor.model_registry import ModelRegistry
+from mlops_project.predictor.prediction_cache import PredictionCache
+from mlops_project.predictor.wire_formats import (COLUMNS_JSON, FLOAT32, JSON,
+                                                  OCTET_STREAM,
+                                                  REQUEST_MEDIA_TYPES,
+                                                  decode_features,
+                                                  encode_predictions,
+                                                  media_type, negotiate)
 
 # Add the parent directory to sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
 sys.path.append(current_dir)
 
-relative_path = "mlops_project\\models"
+# Training modules import their siblings as top-level packages (see mlops_project/mlops_project.py)
+sys.path.append(os.path.join(parent_dir, "mlops_project"))
+from train.job_queue import TrainingJobQueue  # noqa: E402
+
+# Serving imports numpy, pydantic and the predictor modules only. pandas and the training modules (sklearn, opendatasets)
+# are imported by the endpoints that train, and sklearn by unpickling a joblib model: serving a '.forest' file never loads them
+
+relative_path = os.path.join("mlops_project", "models")
 model_path = os.path.join(os.path.abspath(parent_dir), relative_path)
 # relative_path = os.path.relpath("C:/Users/usuario/Documents/GitHub/mlops_project/mlops_project/models/random_forest_output.pkl",current_dir)
 
 
+MODEL_PATH = os.environ.get("MODEL_PATH", os.path.join(model_path, "random_forest_output.pkl"))
+MODEL_POLL_INTERVAL = float(os.environ.get("MODEL_POLL_INTERVAL", "5"))
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "auto")
+FLAT_ENGINE_MAX_ROWS = int(os.environ.get("FLAT_ENGINE_MAX_ROWS", "256"))
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "10000"))
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", "32"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get("MICRO_BATCH_MAX_WAIT_MS", "2"))
+SEED_MODEL = int(os.environ.get("SEED_MODEL", "102"))
+SEED_SPLIT = int(os.environ.get("SEED_SPLIT", "42"))
+DATA_PATH = os.environ.get("DATA_PATH", os.path.join(parent_dir, "mlops_project", "data", "data.csv"))
+TRAINING_EXECUTOR = os.environ.get("TRAINING_EXECUTOR", "processes")
+TRAINING_MAX_CONCURRENT_JOBS = int(os.environ.get("TRAINING_MAX_CONCURRENT_JOBS", "1"))
+TRAINING_WORKERS_PER_JOB = int(os.environ.get("TRAINING_WORKERS_PER_JOB", "1"))
+TRAINING_MAX_FINISHED_JOBS = int(os.environ.get("TRAINING_MAX_FINISHED_JOBS", "100"))
+FEATURES = ['CRIM', 'ZN', 'INDUS', 'CHAS', 'NOX', 'RM', 'AGE', 'DIS', 'RAD', 'TAX', 'PTRATIO', 'B', 'LSTAT']
+TARGET = 'MEDV'
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", "3600"))
+PREDICTION_CACHE_DECIMALS = int(os.environ["PREDICTION_CACHE_DECIMALS"]) if os.environ.get("PREDICTION_CACHE_DECIMALS") else None
+
+
+def warm_up(predictor):
+    # First predictions of a newly loaded model, through both tree engines, before it serves requests
+    predictor.predict(np.zeros((1, len(FEATURES))))
+    predictor.predict(np.zeros((FLAT_ENGINE_MAX_ROWS + 1, len(FEATURES))))
+
+
+# Loaded (and warmed up) once per process at startup, and hot reloaded when the artifact changes on disk
+registry = ModelRegistry(MODEL_PATH, poll_interval=MODEL_POLL_INTERVAL,
+                         predictor_options={'engine': INFERENCE_ENGINE, 'flat_max_rows': FLAT_ENGINE_MAX_ROWS}, warmup=warm_up)
+
+# Predictions of single rows already seen, dropped whenever the served model version changes
+cache = PredictionCache(maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL, decimals=PREDICTION_CACHE_DECIMALS)
+
+# Served at '/metrics' in the Prometheus text format. Request path metrics are per-thread counters (no lock);
+# model, cache, batcher and process metrics are read when scraped
+metrics = MetricsRegistry()
+http_requests_total = metrics.counter('http_requests_total', 'HTTP requests handled, by method, endpoint and status code.', ('method', 'endpoint', 'status'))
+http_request_duration = metrics.histogram('http_request_duration_seconds', 'HTTP request latency in seconds, by method and endpoint.', ('method', 'endpoint'))
+http_requests_in_flight = metrics.gauge('http_requests_in_flight', 'HTTP requests being handled.')
+predicted_rows_total = metrics.counter('housepricing_predicted_rows_total', 'Rows predicted, by endpoint (cached predictions included).', ('endpoint',))
+predict_stage_duration = metrics.histogram(
+    'housepricing_predict_stage_seconds',
+    'Seconds spent in every prediction stage, by endpoint: request parsing and validation, feature matrix assembly and scaling, '
+    'and tree evaluation (once per micro batch on /predict).',
+    ('endpoint', 'stage'))
+
+
+def observe_validation(request, endpoint):
+    # Time between the request arrival (see RequestMetricsMiddleware) and the endpoint call: body parsing and validation
+    predict_stage_duration.observe(time.perf_counter() - request.state.request_start, endpoint, 'validation')
+
+
+def observe_predict_timings(timings, endpoint):
+    predict_stage_duration.observe(timings['feature_assembly'], endpoint, 'feature_assembly')
+    predict_stage_duration.observe(timings['tree_evaluation'], endpoint, 'tree_evaluation')
+
+
+def predict_micro_batch(X):
+    timings = {}
+    predictions = registry.get().predict(X, timings=timings)
+    observe_predict_timings(timings, '/predict')
+    return predictions
+
+
+def response_media_type(request):
+    # Encoding of the predictions asked for by the Accept header. JSON of the API models unless another supported type
+    # is explicitly preferred: clients that accept nothing we offer (e.g. 'text/plain') keep getting JSON, as before
+    return negotiate(request.headers.get('accept')) or JSON
+
+
+def read_batch(body, content_type):
+    # Feature matrix of a '/predict/batch' body: JSON validated by HousePricingBatch (records or columns), or
+    # columnar JSON and packed float32 rows decoded straight into numpy
+    if content_type in REQUEST_MEDIA_TYPES:
+        try:
+            return decode_features(body, content_type, REQUEST_FEATURES)
+        except ValueError as error:
+            raise HTTPException(status_code=422, detail=str(error))
+    if content_type != JSON and not content_type.endswith('+json'):
+        raise HTTPException(status_code=415, detail=f"Unsupported media type '{content_type}', expected one of {[JSON, *REQUEST_MEDIA_TYPES]}.")
+    try:
+        batch = HousePricingBatch.model_validate_json(body)
+    except ValidationError as error:
+        raise RequestValidationError([dict(detail, loc=('body',) + tuple(detail['loc'])) for detail in error.errors(include_url=False)])
+    if len(batch) == 0:
+        raise HTTPException(status_code=422, detail="The batch is empty.")
+    return batch.to_feature_matrix()
+
+
+# Documents the request encodings of '/predict/batch', whose body is decoded by the endpoint
+BATCH_REQUEST_BODY = {
+    'requestBody': {
+        'required': True,
+        'content': {
+            JSON: {'schema': HousePricingBatch.model_json_schema()},
+            COLUMNS_JSON: {'schema': {'type': 'object', 'additionalProperties': {'type': 'array', 'items': {'type': 'number'}}}},
+            FLOAT32: {'schema': {'type': 'string', 'format': 'binary'}},
+            OCTET_STREAM: {'schema': {'type': 'string', 'format': 'binary'}},
+        },
+    },
+}
+
+
+# Coalesces concurrent '/predict' calls into one model call; the model is looked up per batch to follow hot reloads
+batcher = MicroBatcher(predict_micro_batch, max_batch_size=MICRO_BATCH_MAX_SIZE, max_wait_ms=MICRO_BATCH_MAX_WAIT_MS)
+
+
+def model_metric(key):
+    # Reads a value of the active model's load telemetry, or nothing before the model is loaded
+    return lambda: registry.status().get(key)
+
+
+def model_info():
+    status = registry.status()
+    return {(status['version'], status['engine']): 1} if status['loaded'] else {}
+
+
+def cache_metric(key):
+    return lambda: cache.stats()[key]
+
+
+def batcher_metric(key):
+    return lambda: batcher.metrics()[key]
+
+
+metrics.gauge('housepricing_model_info', 'Model being served (always 1), by version and tree evaluation engine.', ('version', 'engine'),
+              function=model_info)
+metrics.gauge('housepricing_model_load_seconds', 'Seconds the active model took to load.', function=model_metric('load_time_s'))
+metrics.gauge('housepricing_model_size_bytes', 'Size of the active model artifact in bytes.', function=model_metric('size_bytes'))
+metrics.gauge('housepricing_model_loaded_timestamp_seconds', 'Unix time the active model was loaded.', function=model_metric('loaded_at'))
+metrics.counter('housepricing_model_reloads_total', 'New model versions swapped in since startup.', function=model_metric('reloads'))
+metrics.gauge('housepricing_prediction_cache_entries', 'Rows held by the prediction cache.', function=cache_metric('size'))
+for counter in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+    metrics.counter(f'housepricing_prediction_cache_{counter}_total', f'Prediction cache {counter}.', function=cache_metric(counter))
+metrics.counter('housepricing_micro_batches_total', 'Micro batches of /predict rows scored.', function=batcher_metric('batches'))
+metrics.counter('housepricing_micro_batch_rows_total', 'Rows scored in micro batches.', function=batcher_metric('rows'))
+metrics.gauge('process_resident_memory_bytes', 'Resident memory size in bytes.', function=lambda: process_memory()['resident_bytes'])
+metrics.gauge('process_virtual_memory_bytes', 'Virtual memory size in bytes.', function=lambda: process_memory()['virtual_bytes'])
+metrics.counter('process_cpu_seconds_total', 'User and system CPU time spent in seconds.', function=time.process_time)
+metrics.gauge('process_start_time_seconds', 'Start time of the process since unix epoch in seconds.', function=lambda: PROCESS_START_TIME)
+
+# Incremental updates read, grow and rewrite the served artifact: one at a time
+update_lock = threading.Lock()
+
+
+def publish_trained_model(job):
+    # Moves the model trained by a job over the served artifact; the registry swaps it in
+    if job['spec']['publish']:
+        with update_lock:
+            os.replace(job['result']['artifact_path'], MODEL_PATH)
+            registry.reload_if_changed()
+
+
+# Training runs out of the request path, in at most TRAINING_MAX_CONCURRENT_JOBS background workers
+job_queue = TrainingJobQueue(max_concurrent_jobs=TRAINING_MAX_CONCURRENT_JOBS, executor=TRAINING_EXECUTOR, on_success=publish_trained_model,
+                             max_finished_jobs=TRAINING_MAX_FINISHED_JOBS)
+
 app = FastAPI()
+app.add_middleware(RequestMetricsMiddleware, requests_total=http_requests_total, request_duration=http_request_duration,
+                   requests_in_flight=http_requests_in_flight)
 
 """
 PARAMETER VALUES
@@ -26,14 +214,69 @@ Values are required after de endpoint.
 """
 
 
+# Set once the model is loaded and warmed up, see '/ready'
+startup = {'ready': False, 'started_at': None, 'ready_at': None}
+
+
+@app.on_event('startup')
+def load_model():
+    startup['started_at'] = time.time()
+    registry.load()
+    registry.start_watcher()
+    startup['ready_at'] = time.time()
+    startup['ready'] = True
+
+
+@app.on_event('shutdown')
+def stop_model_watcher():
+    registry.stop_watcher()
+    job_queue.shutdown()
+
+
 @app.get('/', status_code=200)
 async def healthcheck():
     return 'HousePricing Regressor is ready to go!'
 
 
+@app.get('/ready', status_code=200)
+def readiness():
+    status = registry.status()
+    body = {
+        'ready': startup['ready'] and status['loaded'],
+        'version': status['version'],
+        'model_load_time_s': status.get('load_time_s'),
+        'warmup_time_s': status.get('warmup_time_s'),
+        'startup_time_s': startup['ready_at'] - PROCESS_START_TIME if startup['ready_at'] is not None else None,
+        'training_modules_loaded': 'train.train_data' in sys.modules,
+        'sklearn_loaded': 'sklearn' in sys.modules,
+    }
+    return JSONResponse(body, status_code=200 if body['ready'] else 503)
+
+
+@app.get('/model', status_code=200)
+def model_status():
+    return registry.status()
+
+
+@app.get('/cache', status_code=200)
+def cache_stats():
+    return cache.stats()
+
+
+@app.get('/batcher', status_code=200)
+def batcher_metrics():
+    return batcher.metrics()
+
+
+@app.get('/metrics', status_code=200)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=MetricsRegistry.CONTENT_TYPE)
+
+
 @app.post('/predict')
-def predictor(housepricing_features: HousePricing):
-    predictor = ModelAPIPredictor(model_path + "\\random_forest_output.pkl")
+async def predictor(housepricing_features: HousePricing, request: Request):
+    observe_validation(request, '/predict')
+    response_type = response_media_type(request)
     X = [
         housepricing_features.crim,
         housepricing_features.zn,
@@ -49,5 +292,135 @@ def predictor(housepricing_features: HousePricing):
         housepricing_features.b,
         housepricing_features.lstat
     ]
-    prediction = predictor.predict([X])
-    return JSONResponse(f"Resultado predicción: {prediction}")
+    version = registry.version
+    prediction, queue_time = cache.get(X, version), 0.0
+    if prediction is None:
+        prediction, queue_time = await batcher.predict(X)
+        cache.put(X, version, prediction)
+    predicted_rows_total.inc(1, '/predict')
+    headers = {'X-Queue-Time-Ms': f"{1000 * queue_time:.3f}"}
+    if response_type != JSON:
+        return Response(encode_predictions([prediction], response_type, version), media_type=response_type, headers=headers)
+    prediction = np.array([prediction])
+    return JSONResponse(f"Resultado predicción: {prediction}", headers=headers)
+
+
+def predict_batch(X):
+    timings = {}
+    predictions = registry.get().predict(X, timings=timings)        # One model call for the whole batch
+    return predictions, timings
+
+
+@app.post('/predict/batch', response_model=HousePricingBatchResponse, openapi_extra=BATCH_REQUEST_BODY)
+async def batch_predictor(request: Request):
+    response_type = response_media_type(request)
+    start = time.perf_counter()
+    X = read_batch(await request.body(), media_type(request.headers.get('content-type')))
+    assembly_time = time.perf_counter() - start
+    observe_validation(request, '/predict/batch')
+    n_rows = len(X)
+    if n_rows == 0:
+        raise HTTPException(status_code=422, detail="The batch is empty.")
+    if n_rows > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch of {n_rows} rows exceeds the limit of {MAX_BATCH_SIZE} rows.")
+
+    version = registry.version
+    predictions, timings = await run_in_threadpool(predict_batch, X)
+    timings['feature_assembly'] += assembly_time
+    observe_predict_timings(timings, '/predict/batch')
+    predicted_rows_total.inc(n_rows, '/predict/batch')
+
+    if response_type != JSON:
+        return Response(encode_predictions(predictions, response_type, version), media_type=response_type)
+    return {
+        'n_rows': n_rows,
+        'predictions': [{'row': row, 'prediction': prediction} for row, prediction in enumerate(predictions.tolist())]
+    }
+
+
+@app.post('/train_new_model')
+def train_new_model(training_batch: HousePricingTrainingBatch):
+    if len(training_batch.records) == 0:
+        raise HTTPException(status_code=422, detail="There are no records to train with.")
+    if len(training_batch.records) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch of {len(training_batch.records)} rows exceeds the limit of {MAX_BATCH_SIZE} rows.")
+
+    import pandas as pd
+    from train.train_data import HousepricingDataPipeline
+
+    trained_model_dir, file_save_name = os.path.split(MODEL_PATH)
+    trained_model_dir = trained_model_dir + os.sep
+
+    with update_lock:
+        housepricing_pipeline = HousepricingDataPipeline(features=None, target='MEDV', n=1, seed_model=SEED_MODEL)
+        try:
+            housepricing_pipeline.load_model(trained_model_dir=trained_model_dir, file_save_name=file_save_name)
+        except ValueError as error:
+            raise HTTPException(status_code=409, detail=f"The served model cannot be updated: {error}")
+
+        features = housepricing_pipeline.inference_artifact['features']
+        new_data = pd.DataFrame(training_batch.to_feature_matrix(), columns=features)
+        new_data['MEDV'] = training_batch.targets()
+
+        start = time.perf_counter()
+        model = housepricing_pipeline.update_model(new_data, n_new_estimators=training_batch.n_new_estimators,
+                                                   max_estimators=training_batch.max_estimators)
+        fit_time = time.perf_counter() - start
+        housepricing_pipeline.persist_model(trained_model_dir=trained_model_dir, file_save_name=file_save_name)
+        registry.reload_if_changed()
+
+    return {
+        'n_rows': len(new_data),
+        'n_estimators': len(model.estimators_),
+        'fit_time_s': fit_time,
+        'version': registry.version,
+    }
+
+
+@app.post('/jobs/train', status_code=202)
+def submit_training_job(job_request: TrainingJobRequest):
+    from train.train_data import check_model_params
+
+    # Checked here, so bad parameters are rejected at submission instead of failing the job in its worker
+    try:
+        check_model_params(job_request.hyperparameters, n_features=len(FEATURES))
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    spec = {
+        'data_path': DATA_PATH,
+        'features': FEATURES,
+        'target': TARGET,
+        'n': 1,
+        'seed_model': SEED_MODEL,
+        'seed_split': SEED_SPLIT,
+        'test_size': 0.2,
+        'evaluation': job_request.evaluation,
+        'model_params': job_request.hyperparameters,
+        'n_workers': TRAINING_WORKERS_PER_JOB,
+        'output_path': os.path.join(os.path.dirname(MODEL_PATH), 'jobs', '{job_id}' + os.path.splitext(MODEL_PATH)[1]),
+        'model_format': 'mmap' if MODEL_PATH.endswith('.forest') else 'joblib',
+        'publish': job_request.publish,
+    }
+    job_id = job_queue.submit(spec)
+    return job_queue.get(job_id)
+
+
+@app.get('/jobs', status_code=200)
+def list_training_jobs():
+    return job_queue.list()
+
+
+@app.get('/jobs/{job_id}', status_code=200)
+def training_job_status(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}.")
+    return job
+
+
+@app.delete('/jobs/{job_id}', status_code=200)
+def cancel_training_job(job_id: str):
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}.")
+    job_queue.cancel(job_id)
+    return job_queue.get(job_id)
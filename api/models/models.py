@@ -1,4 +1,10 @@
-from pydantic import BaseModel
+from typing import Dict, List, Literal, Optional, Union
+
+import numpy as np
+from pydantic import BaseModel, Field, model_validator
+
+# Order of the features expected by the trained model
+FEATURES = ['crim', 'zn', 'indus', 'chas', 'nox', 'rm', 'age', 'dis', 'rad', 'tax', 'ptratio', 'b', 'lstat']
 
 
 class HousePricing(BaseModel):
@@ -34,3 +40,126 @@ class HousePricing(BaseModel):
     ptratio: float
     b: float
     lstat: float
+
+
+class HousePricingBatch(BaseModel):
+    """
+    Represents a batch of houses to be priced in a single call.
+
+    Exactly one of the two layouts must be provided.
+
+    Attributes:
+        records (list of HousePricing): One object per house, with the same fields as the '/predict' endpoint.
+        columns (dict of str to list of float): One array per feature (the HousePricing field names), all of the same length.
+            Cheaper to parse than records for large batches.
+    """
+
+    records: Optional[List[HousePricing]] = None
+    columns: Optional[Dict[str, List[float]]] = None
+
+    @model_validator(mode='after')
+    def check_layout(self):
+        if (self.records is None) == (self.columns is None):
+            raise ValueError("Provide either 'records' or 'columns'.")
+        if self.columns is not None:
+            missing = [feature for feature in FEATURES if feature not in self.columns]
+            if missing:
+                raise ValueError(f"Missing feature columns: {missing}")
+            if len({len(self.columns[feature]) for feature in FEATURES}) > 1:
+                raise ValueError("All feature columns must have the same length.")
+        return self
+
+    def __len__(self):
+        if self.records is not None:
+            return len(self.records)
+        return len(self.columns[FEATURES[0]])
+
+    def to_feature_matrix(self):
+        """
+        Builds one contiguous (n_rows, n_features) float64 matrix with the features in model order.
+
+        Returns:
+            np.ndarray: Feature matrix.
+        """
+        if self.records is not None:
+            return np.array([[getattr(record, feature) for feature in FEATURES] for record in self.records], dtype=np.float64).reshape(-1, len(FEATURES))
+        X = np.empty((len(self), len(FEATURES)), dtype=np.float64)
+        for j, feature in enumerate(FEATURES):
+            X[:, j] = self.columns[feature]
+        return X
+
+
+class BatchPrediction(BaseModel):
+    """
+    Prediction for one row of a batch.
+
+    Attributes:
+        row (int): Position of the house in the request.
+        prediction (float): Predicted median value of the house (MEDV).
+    """
+
+    row: int
+    prediction: float
+
+
+class HousePricingBatchResponse(BaseModel):
+    """
+    Predictions for a batch of houses, in the same order as the request.
+
+    Attributes:
+        n_rows (int): Number of houses priced.
+        predictions (list of BatchPrediction): Per-row results.
+    """
+
+    n_rows: int
+    predictions: List[BatchPrediction]
+
+
+class HousePricingLabelled(HousePricing):
+    """
+    Represents a house with its known median value, used to update the model.
+
+    Attributes:
+        medv (float): Median value of owner-occupied homes in $1000's (target).
+    """
+
+    medv: float
+
+
+class HousePricingTrainingBatch(BaseModel):
+    """
+    New labelled houses to update the served model incrementally.
+
+    Attributes:
+        records (list of HousePricingLabelled): New houses with their known value.
+        n_new_estimators (int): Number of trees fit on the new houses and added to the forest.
+        max_estimators (int, optional): Maximum size of the forest; the oldest trees are retired beyond it.
+    """
+
+    records: List[HousePricingLabelled]
+    n_new_estimators: int = Field(10, ge=1)
+    max_estimators: Optional[int] = Field(None, ge=1)
+
+    def to_feature_matrix(self):
+        """
+        Builds one (n_rows, n_features) float64 matrix with the features in model order.
+        """
+        return HousePricingBatch(records=self.records).to_feature_matrix()
+
+    def targets(self):
+        return np.array([record.medv for record in self.records], dtype=np.float64)
+
+
+class TrainingJobRequest(BaseModel):
+    """
+    Request to train a new model from the dataset in the background.
+
+    Attributes:
+        hyperparameters (dict): RandomForestRegressor parameters, on top of n_estimators=100.
+        evaluation (str): 'oob' (out-of-bag, no extra fits) or 'cv' (10-fold cross validation).
+        publish (bool): Serve the new model as soon as the job succeeds.
+    """
+
+    hyperparameters: Dict[str, Union[int, float, str, None]] = {}
+    evaluation: Literal['oob', 'cv'] = 'oob'
+    publish: bool = True
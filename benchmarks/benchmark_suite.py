@@ -0,0 +1,279 @@
+"""
+Performance benchmark suite of the House-pricing pipeline.
+
+Builds synthetic datasets 1x-1000x the size of data.csv and times every preprocessing transformer, model training,
+evaluation, persistence, loading and prediction on them. Results (seconds, peak memory and throughput) are written
+as JSON, and can be compared against a stored baseline:
+
+    python benchmarks/benchmark_suite.py --scales 1 10 100 --output benchmarks/results.json
+    python benchmarks/benchmark_suite.py --scales 1 10 100 --baseline benchmarks/results.json --fail-on-regression
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.model_selection import train_test_split
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'mlops_project'))
+
+from mlops_project.predictor.api_predict import ModelAPIPredictor  # noqa: E402
+from preprocess.preprocess_data import (DropMissing, IQR_DropOutliers,  # noqa: E402
+                                        MissingIndicator, Standard_Scaler)
+from train.train_data import HousepricingDataPipeline  # noqa: E402
+
+DATA_PATH = os.path.join(ROOT_DIR, 'mlops_project', 'data', 'data.csv')
+FEATURES = ['CRIM', 'ZN', 'INDUS', 'CHAS', 'NOX', 'RM', 'AGE', 'DIS', 'RAD', 'TAX', 'PTRATIO', 'B', 'LSTAT']
+CATEGORICAL_FEATURES = ['CHAS', 'RAD']
+TARGET = 'MEDV'
+RESULTS_FORMAT_VERSION = 1
+# (model_format, compression) of persist_model, the first one is the reference of the prediction drift
+PERSISTENCE_FORMATS = [('joblib', None), ('joblib', 'zlib'), ('mmap', None), ('mmap', 'zlib'),
+                       ('compact', None), ('compact', 'zlib'), ('compact', 'lzma'), ('compact', 'bz2')]
+
+
+def make_synthetic_dataset(source_df, scale, seed=0):
+    """
+    Creates a dataset 'scale' times the size of source_df, sampled from its distributions.
+
+    Rows are drawn with replacement, so the joint distribution of features and target is kept, and continuous
+    columns get a Gaussian jitter of 1% of their standard deviation, so rows are not plain duplicates. Categorical
+    columns keep their observed codes, and missing values appear with the same rate as in the source.
+
+    Parameters:
+        source_df (pd.DataFrame): Dataset to sample from.
+        scale (float): Size of the synthetic dataset relative to source_df.
+        seed (int): Seed, the same seed and scale always give the same dataset.
+
+    Returns:
+        pd.DataFrame: The synthetic dataset.
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = int(round(len(source_df) * scale))
+    df = source_df.iloc[rng.integers(len(source_df), size=n_rows)].reset_index(drop=True)
+    for column in df.columns:
+        if column in CATEGORICAL_FEATURES:
+            continue
+        values = df[column].to_numpy(dtype=np.float64)
+        df[column] = values + rng.normal(0.0, 0.01 * np.nanstd(source_df[column].to_numpy(dtype=np.float64)), size=n_rows)
+    return df
+
+
+def measure(fn, repeat):
+    """
+    Runs fn 'repeat' times and returns wall-clock seconds (median and best), and the peak memory it allocates
+    (traced in one extra run, so tracing does not slow down the timed ones). Anything fn prints is discarded.
+    """
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'seconds': float(np.median(times)), 'seconds_min': float(min(times)), 'peak_memory_bytes': int(peak)}
+
+
+class BenchmarkSuite:
+    """
+    Times the pipeline stages on synthetic datasets of growing size.
+
+    Parameters:
+        scales (list of float): Dataset sizes, relative to data.csv.
+        repeat (int): Timed runs of every benchmark (the median is reported).
+        n_estimators (int): Number of trees of the forests trained.
+        batch_rows (int): Number of rows of the batch prediction benchmark.
+        seed (int): Seed of the synthetic datasets and the models.
+
+    Attributes:
+        results (list of dict): One entry per benchmark and scale: name, scale, rows, seconds, seconds_min,
+            peak_memory_bytes and rows_per_second. Model loads also report the file size_bytes, and the max_abs_drift
+            of the predictions from those of the pickled model.
+
+    Methods:
+        run(): Runs every benchmark at every scale and returns the results document.
+        save(path): Writes the results document as JSON.
+    """
+
+    def __init__(self, scales=(1, 10, 100), repeat=3, n_estimators=100, batch_rows=1000, seed=0):
+        self.scales = list(scales)
+        self.repeat = repeat
+        self.n_estimators = n_estimators
+        self.batch_rows = batch_rows
+        self.seed = seed
+        self.results = []
+
+    def _record(self, name, scale, rows, fn, repeat=None):
+        result = measure(fn, self.repeat if repeat is None else repeat)
+        result.update({'name': name, 'scale': scale, 'rows': rows,
+                       'rows_per_second': rows / result['seconds'] if result['seconds'] > 0 else None})
+        self.results.append(result)
+        print(f"{name:<32} x{scale:<6g} {rows:>9} rows {1000 * result['seconds']:>11.3f} ms "
+              f"{result['peak_memory_bytes'] / 2 ** 20:>9.2f} MiB")
+        return result
+
+    def run(self):
+        """
+        Runs every benchmark at every scale.
+
+        Returns:
+            dict: The results document (metadata and results).
+        """
+        source_df = pd.read_csv(DATA_PATH)
+        with tempfile.TemporaryDirectory() as model_dir:
+            for scale in self.scales:
+                self._run_scale(make_synthetic_dataset(source_df, scale, self.seed), scale, model_dir + os.sep)
+        return self.document()
+
+    def _run_scale(self, raw_df, scale, model_dir):
+        n = len(raw_df)
+
+        # Every transformer, on the output of the previous one
+        missing_indicator = MissingIndicator(variables=FEATURES)
+        iqr_dropoutliers = IQR_DropOutliers(features=FEATURES, n=1)
+        drop_missing = DropMissing()
+        scaler = Standard_Scaler(features=FEATURES, target=TARGET)
+        self._record('missing_indicator.transform', scale, n, lambda: missing_indicator.transform(raw_df))
+        df_indicated = missing_indicator.transform(raw_df)
+        self._record('iqr_dropoutliers.fit_transform', scale, n, lambda: iqr_dropoutliers.fit_transform(df_indicated))
+        df_inliers = iqr_dropoutliers.fit_transform(df_indicated)
+        self._record('drop_missing.transform', scale, len(df_inliers), lambda: drop_missing.transform(df_inliers))
+        with contextlib.redirect_stdout(io.StringIO()):
+            df_complete = drop_missing.transform(df_inliers)
+        self._record('standard_scaler.fit_transform', scale, len(df_complete), lambda: scaler.fit_transform(df_complete))
+
+        for masked in [False, True]:
+            housepricing_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=self.seed,
+                                                             model_params={'n_estimators': self.n_estimators})
+            pipeline = housepricing_pipeline.create_pipeline(masked=masked)
+            self._record('pipeline.fit_transform' + ('[masked]' if masked else ''), scale, n, lambda: pipeline.fit_transform(raw_df))
+        with contextlib.redirect_stdout(io.StringIO()):
+            df_transformed = pipeline.fit_transform(raw_df)
+
+        X_train, X_test, y_train, y_test = train_test_split(df_transformed.drop(TARGET, axis=1), df_transformed[TARGET],
+                                                            test_size=0.2, random_state=self.seed)
+        # Training dominates the suite: timed once
+        self._record('fit_random_forest', scale, len(X_train), lambda: housepricing_pipeline.fit_random_forest(X_train, y_train), repeat=1)
+        housepricing_pipeline.predict(X_test)
+        self._record('get_evaluation_metrics', scale, len(X_test), lambda: housepricing_pipeline.get_evaluation_metrics(y_test))
+
+        raw_X = raw_df[FEATURES].fillna(raw_df[FEATURES].median()).to_numpy()
+        batch = raw_X[np.arange(self.batch_rows) % len(raw_X)]
+        reference = None
+        for model_format, compression in PERSISTENCE_FORMATS:
+            name = model_format + (f'+{compression}' if compression else '')
+            file_name = 'model.pkl' if model_format == 'joblib' else 'model.forest'
+            self._record(f'persist_model[{name}]', scale, len(X_train),
+                         lambda: housepricing_pipeline.persist_model(model_dir, file_name, model_format=model_format, compression=compression))
+            result = self._record(f'load_model[{name}]', scale, len(X_train), lambda: ModelAPIPredictor(model_dir + file_name))
+            # Trade-offs of the format: file size, and how far its predictions are from the pickled sklearn model
+            predictions = ModelAPIPredictor(model_dir + file_name).predict(batch)
+            reference = predictions if reference is None else reference
+            result.update({'size_bytes': os.path.getsize(model_dir + file_name),
+                           'max_abs_drift': float(np.max(np.abs(predictions - reference)))})
+            if compression is None:
+                os.replace(model_dir + file_name, model_dir + name + '.' + file_name.split('.')[1])
+
+        for model_format, file_name in [('joblib', 'joblib.pkl'), ('mmap', 'mmap.forest'), ('compact', 'compact.forest')]:
+            predictor = ModelAPIPredictor(model_dir + file_name)
+            self._record(f'predict_single_row[{model_format}]', scale, 1, lambda: predictor.predict(raw_X[:1]), repeat=max(self.repeat, 20))
+            self._record(f'predict_batch[{model_format}]', scale, len(batch), lambda: predictor.predict(batch))
+
+    def document(self):
+        return {
+            'format_version': RESULTS_FORMAT_VERSION,
+            'metadata': {
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'sklearn': sklearn.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'scales': self.scales,
+                'repeat': self.repeat,
+                'n_estimators': self.n_estimators,
+                'batch_rows': self.batch_rows,
+                'seed': self.seed,
+            },
+            'results': self.results,
+        }
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.document(), file, indent=2)
+        print("Benchmark results stored in: " + path)
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compares benchmark results with a baseline run.
+
+    Parameters:
+        results (dict): Results document of the current run.
+        baseline (dict): Results document of the baseline run.
+        threshold (float): Relative slowdown beyond which a benchmark counts as a regression (0.1 = 10%).
+
+    Returns:
+        list of dict: One entry per benchmark present in both runs: name, scale, baseline and current seconds,
+            ratio (current / baseline) and whether it regressed.
+    """
+    baseline_seconds = {(result['name'], result['scale']): result['seconds'] for result in baseline['results']}
+    comparison = []
+    for result in results['results']:
+        key = (result['name'], result['scale'])
+        if key not in baseline_seconds:
+            continue
+        ratio = result['seconds'] / baseline_seconds[key] if baseline_seconds[key] > 0 else float('inf')
+        comparison.append({'name': result['name'], 'scale': result['scale'], 'baseline_seconds': baseline_seconds[key],
+                           'seconds': result['seconds'], 'ratio': ratio, 'regression': ratio > 1 + threshold})
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='House-pricing performance benchmarks')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100], help='Dataset sizes relative to data.csv (up to 1000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs of every benchmark')
+    parser.add_argument('--n-estimators', type=int, default=100, help='Number of trees of the forests trained')
+    parser.add_argument('--batch-rows', type=int, default=1000, help='Rows of the batch prediction benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic datasets and models')
+    parser.add_argument('--output', type=str, default=os.path.join(ROOT_DIR, 'benchmarks', 'results.json'), help='Path of the JSON results')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown reported as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 if any benchmark regressed')
+    args = parser.parse_args()
+
+    # Batches above the flat engine limit reach sklearn as arrays, fitted with DataFrame column names
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    suite = BenchmarkSuite(scales=args.scales, repeat=args.repeat, n_estimators=args.n_estimators, batch_rows=args.batch_rows, seed=args.seed)
+    results = suite.run()
+    suite.save(args.output)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            comparison = compare(results, json.load(file), threshold=args.threshold)
+        print()
+        for entry in comparison:
+            print(f"{entry['name']:<32} x{entry['scale']:<6g} {1000 * entry['baseline_seconds']:>11.3f} ms -> "
+                  f"{1000 * entry['seconds']:>11.3f} ms  x{entry['ratio']:.2f}{'  REGRESSION' if entry['regression'] else ''}")
+        if args.fail_on_regression and any(entry['regression'] for entry in comparison):
+            sys.exit(1)
@@ -0,0 +1,115 @@
+"""
+Cold start breakdown of the House-pricing API.
+
+Imports the serving entry point (api.main) in a fresh interpreter with '-X importtime', and reports the total import
+time and where it goes, by top-level package. Optionally starts the API (see load_test.LocalServer) and measures the
+time until '/ready' answers, i.e. imports, model load and warmup. Exits with status 1 when over budget:
+
+    python benchmarks/import_time.py --budget-ms 500
+    python benchmarks/import_time.py --model-path mlops_project/models/random_forest_output.forest --ready-budget-ms 2000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Imported lazily by the serving path: none of them should appear in the breakdown
+HEAVY_MODULES = ('pandas', 'sklearn', 'scipy', 'joblib', 'opendatasets', 'train.train_data')
+
+
+def import_breakdown(module='api.main', top=15):
+    """
+    Imports a module in a fresh interpreter and breaks its import time down.
+
+    Parameters:
+        module (str): Module imported.
+        top (int): Number of packages and modules listed.
+
+    Returns:
+        dict: Total import time in ms ('total_ms', the interpreter startup excluded), self time of every top-level package
+            ('packages', largest first), cumulative time of the slowest modules ('modules') and the heavy modules loaded.
+    """
+    code = f"import sys, {module}; print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+
+    packages, modules = {}, []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        packages[name.split('.')[0]] = packages.get(name.split('.')[0], 0) + int(self_us)
+        modules.append((name, int(cumulative_us)))
+
+    module_time = dict(modules).get(module, 0)
+    return {
+        'module': module,
+        'total_ms': module_time / 1000,
+        'packages': [{'package': name, 'self_ms': us / 1000} for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]],
+        'modules': [{'module': name, 'cumulative_ms': us / 1000} for name, us in sorted(modules, key=lambda item: -item[1])[:top]],
+        'heavy_modules_loaded': [name for name in process.stdout.strip().split(',') if name],
+    }
+
+
+def time_to_ready(model_path=None, startup_timeout=120.0):
+    """
+    Starts the API in a new process and measures the seconds until '/ready' answers.
+
+    Returns:
+        dict: Seconds from the process start to ready, and the startup telemetry reported by '/ready'.
+    """
+    import httpx
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from load_test import LocalServer
+
+    env = {'MODEL_PATH': os.path.abspath(model_path)} if model_path is not None else None
+    start = time.perf_counter()
+    with LocalServer(env=env, startup_timeout=startup_timeout) as server:
+        elapsed = time.perf_counter() - start
+        ready = httpx.get(server.url + '/ready').json()
+    return {'time_to_ready_s': elapsed, 'ready': ready}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='House-pricing API cold start breakdown')
+    parser.add_argument('--module', type=str, default='api.main', help='Serving entry point imported')
+    parser.add_argument('--top', type=int, default=15, help='Number of packages and modules listed')
+    parser.add_argument('--budget-ms', type=float, default=None, help='Import time budget in milliseconds')
+    parser.add_argument('--model-path', type=str, default=None, help='Also start the API with this model and time it until ready')
+    parser.add_argument('--ready-budget-ms', type=float, default=None, help='Time to ready budget in milliseconds (with --model-path)')
+    parser.add_argument('--output', type=str, default=None, help='Path of the JSON results')
+    args = parser.parse_args()
+
+    results = import_breakdown(args.module, top=args.top)
+    print(f"Import of {results['module']}: {results['total_ms']:.1f} ms")
+    print()
+    print(f"{'package':<32} {'self ms':>9}")
+    for entry in results['packages']:
+        print(f"{entry['package']:<32} {entry['self_ms']:>9.1f}")
+    print()
+    print(f"{'module':<48} {'cumulative ms':>14}")
+    for entry in results['modules']:
+        print(f"{entry['module']:<48} {entry['cumulative_ms']:>14.1f}")
+    if results['heavy_modules_loaded']:
+        print()
+        print("Heavy modules imported by the serving path: " + ', '.join(results['heavy_modules_loaded']))
+
+    over_budget = args.budget_ms is not None and results['total_ms'] > args.budget_ms
+    if args.model_path is not None:
+        results.update(time_to_ready(args.model_path))
+        print()
+        print(f"Time to ready: {1000 * results['time_to_ready_s']:.0f} ms "
+              f"(model load {1000 * results['ready']['model_load_time_s']:.0f} ms, warmup {1000 * results['ready']['warmup_time_s']:.0f} ms)")
+        over_budget = over_budget or (args.ready_budget_ms is not None and 1000 * results['time_to_ready_s'] > args.ready_budget_ms)
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if over_budget:
+        print("Cold start is over budget.")
+        sys.exit(1)
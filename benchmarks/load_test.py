@@ -0,0 +1,357 @@
+"""
+Load-testing harness of the House-pricing API.
+
+Starts api.main:app locally with uvicorn (or targets a running server with --url) and replays realistic HousePricing
+payloads, sampled from data.csv, either at a target request rate (open loop) or with a fixed number of concurrent
+clients (closed loop). Reports latency percentiles, throughput, error rate and the time requests waited server side
+(X-Queue-Time-Ms header), and saves the results as JSON to compare runs:
+
+    python benchmarks/load_test.py --scenario predict --concurrency 32 --duration 20
+    python benchmarks/load_test.py --scenario predict predict_batch --rate 200 --baseline benchmarks/load_results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(ROOT_DIR, 'mlops_project', 'data', 'data.csv')
+FEATURES = ['CRIM', 'ZN', 'INDUS', 'CHAS', 'NOX', 'RM', 'AGE', 'DIS', 'RAD', 'TAX', 'PTRATIO', 'B', 'LSTAT']
+INTEGER_FEATURES = ['CHAS', 'RAD']
+RESULTS_FORMAT_VERSION = 1
+# Media types of mlops_project/predictor/wire_formats.py
+COLUMNS_JSON = 'application/vnd.housepricing.columns+json'
+FLOAT32 = 'application/vnd.housepricing.float32'
+PREDICTIONS_JSON = 'application/vnd.housepricing.predictions+json'
+
+
+class PayloadSampler:
+    """
+    Realistic request bodies: rows of data.csv (complete ones), picked at random.
+
+    Parameters:
+        data_path (str): Dataset the rows are sampled from.
+        jitter (float): Relative Gaussian noise added to continuous features, so repeated rows are not answered
+            from the prediction cache. Default is 0 (rows replayed as they are).
+        seed (int): Seed of the sampling.
+
+    Methods:
+        record(): Returns one HousePricing body.
+        records(n): Returns n HousePricing bodies.
+        columns(n): Returns n rows in columnar form (one list per feature).
+        matrix(n): Returns n rows as a (n, n_features) matrix.
+    """
+
+    def __init__(self, data_path=DATA_PATH, jitter=0.0, seed=0):
+        rows = pd.read_csv(data_path)[FEATURES].dropna()
+        self.values = rows.to_numpy(dtype=np.float64)
+        self.jitter = jitter
+        self.rng = np.random.default_rng(seed)
+
+    def _rows(self, n):
+        rows = self.values[self.rng.integers(len(self.values), size=n)]
+        if self.jitter:
+            continuous = [position for position, feature in enumerate(FEATURES) if feature not in INTEGER_FEATURES]
+            rows[:, continuous] *= 1 + self.jitter * self.rng.standard_normal((n, len(continuous)))
+        return rows
+
+    def matrix(self, n):
+        return self._rows(n)
+
+    def records(self, n):
+        return [{feature.lower(): int(value) if feature in INTEGER_FEATURES else float(value) for feature, value in zip(FEATURES, row)}
+                for row in self._rows(n)]
+
+    def record(self):
+        return self.records(1)[0]
+
+    def columns(self, n):
+        rows = self._rows(n)
+        return {feature.lower(): (rows[:, position].astype(int) if feature in INTEGER_FEATURES else rows[:, position]).tolist()
+                for position, feature in enumerate(FEATURES)}
+
+
+# Scenario name -> (method, path, request options (body and headers), rows per request)
+SCENARIOS = {
+    'predict': lambda sampler, batch_size: ('POST', '/predict', {'json': sampler.record()}, 1),
+    'predict_batch': lambda sampler, batch_size: ('POST', '/predict/batch', {'json': {'records': sampler.records(batch_size)}}, batch_size),
+    'predict_batch_columns': lambda sampler, batch_size: ('POST', '/predict/batch', {'json': {'columns': sampler.columns(batch_size)}}, batch_size),
+    'predict_batch_columnar_json': lambda sampler, batch_size: (
+        'POST', '/predict/batch', {'content': json.dumps(sampler.columns(batch_size)),
+                                   'headers': {'content-type': COLUMNS_JSON, 'accept': PREDICTIONS_JSON}}, batch_size),
+    'predict_batch_float32': lambda sampler, batch_size: (
+        'POST', '/predict/batch', {'content': sampler.matrix(batch_size).astype('<f4').tobytes(),
+                                   'headers': {'content-type': FLOAT32, 'accept': FLOAT32}}, batch_size),
+}
+
+
+def percentiles(values, prefix):
+    if not values:
+        return {f'{prefix}_p50': None, f'{prefix}_p95': None, f'{prefix}_p99': None, f'{prefix}_mean': None, f'{prefix}_max': None}
+    values = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {f'{prefix}_p50': float(p50), f'{prefix}_p95': float(p95), f'{prefix}_p99': float(p99),
+            f'{prefix}_mean': float(values.mean()), f'{prefix}_max': float(values.max())}
+
+
+class LoadTest:
+    """
+    Replays a scenario against the API and measures it.
+
+    With 'rate', requests are sent on a Poisson schedule of that many requests per second whatever the server does
+    (open loop), and latency is measured from the scheduled send time, so a slow server is not hidden by requests
+    that were sent late. Without it, 'concurrency' clients send their next request as soon as the previous answer
+    arrives (closed loop).
+
+    Parameters:
+        base_url (str): URL of the API.
+        scenario (str): One of SCENARIOS.
+        rate (float, optional): Target requests per second (open loop).
+        concurrency (int): Number of concurrent clients (closed loop), or connection limit (open loop).
+        duration (float): Seconds the scenario runs.
+        batch_size (int): Rows per request of the batch scenarios.
+        warmup (int): Requests sent (and not measured) before the scenario starts.
+        timeout (float): Seconds before a request counts as failed.
+        sampler (PayloadSampler, optional): Source of the request bodies.
+
+    Methods:
+        run(): Runs the scenario and returns its summary.
+    """
+
+    def __init__(self, base_url, scenario='predict', rate=None, concurrency=16, duration=10.0, batch_size=100, warmup=10, timeout=10.0, sampler=None):
+        if scenario not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{scenario}', expected one of {list(SCENARIOS)}.")
+        self.base_url = base_url
+        self.scenario = scenario
+        self.rate = rate
+        self.concurrency = concurrency
+        self.duration = duration
+        self.batch_size = batch_size
+        self.warmup = warmup
+        self.timeout = timeout
+        self.sampler = sampler if sampler is not None else PayloadSampler()
+        self.samples = []
+
+    async def _send(self, client, scheduled_at=None):
+        method, path, options, rows = SCENARIOS[self.scenario](self.sampler, self.batch_size)
+        start = time.perf_counter()
+        sample = {'rows': rows, 'status': None, 'error': None, 'queue_ms': None}
+        try:
+            response = await client.request(method, path, **options)
+            sample['status'] = response.status_code
+            if response.status_code >= 400:
+                sample['error'] = f'HTTP {response.status_code}'
+            if 'x-queue-time-ms' in response.headers:
+                sample['queue_ms'] = float(response.headers['x-queue-time-ms'])
+        except httpx.HTTPError as error:
+            sample['error'] = type(error).__name__
+        sample['latency_ms'] = 1000 * (time.perf_counter() - (scheduled_at if scheduled_at is not None else start))
+        return sample
+
+    async def _closed_loop(self, client, deadline):
+        async def worker():
+            while time.perf_counter() < deadline:
+                self.samples.append(await self._send(client))
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    async def _open_loop(self, client, deadline):
+        rng = np.random.default_rng(0)
+        tasks = []
+        scheduled_at = time.perf_counter()
+        while True:
+            scheduled_at += rng.exponential(1.0 / self.rate)
+            if scheduled_at >= deadline:
+                break
+            await asyncio.sleep(max(0.0, scheduled_at - time.perf_counter()))
+            tasks.append(asyncio.ensure_future(self._send(client, scheduled_at)))
+        self.samples.extend(await asyncio.gather(*tasks))
+
+    async def _run(self):
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            for _ in range(self.warmup):
+                await self._send(client)
+            self.samples = []
+            start = time.perf_counter()
+            if self.rate is not None:
+                await self._open_loop(client, start + self.duration)
+            else:
+                await self._closed_loop(client, start + self.duration)
+            elapsed = time.perf_counter() - start
+        return elapsed
+
+    def run(self):
+        """
+        Runs the scenario.
+
+        Returns:
+            dict: Scenario configuration, number of requests, error rate, throughput (requests and rows per second),
+                latency and server-side queueing percentiles in milliseconds.
+        """
+        elapsed = asyncio.run(self._run())
+        succeeded = [sample for sample in self.samples if sample['error'] is None]
+        summary = {
+            'scenario': self.scenario,
+            'mode': 'open_loop' if self.rate is not None else 'closed_loop',
+            'target_rate': self.rate,
+            'concurrency': self.concurrency,
+            'batch_size': self.batch_size if self.scenario != 'predict' else 1,
+            'duration_s': elapsed,
+            'requests': len(self.samples),
+            'errors': len(self.samples) - len(succeeded),
+            'error_rate': (len(self.samples) - len(succeeded)) / len(self.samples) if self.samples else 0.0,
+            'errors_by_kind': {kind: sum(sample['error'] == kind for sample in self.samples) for kind in {sample['error'] for sample in self.samples} - {None}},
+            'throughput_rps': len(succeeded) / elapsed,
+            'throughput_rows_per_s': sum(sample['rows'] for sample in succeeded) / elapsed,
+        }
+        summary.update(percentiles([sample['latency_ms'] for sample in succeeded], 'latency_ms'))
+        summary.update(percentiles([sample['queue_ms'] for sample in succeeded if sample['queue_ms'] is not None], 'queue_ms'))
+        return summary
+
+
+class LocalServer:
+    """
+    Context manager running api.main:app with uvicorn in a subprocess, on a free local port.
+
+    Parameters:
+        workers (int): Number of uvicorn worker processes.
+        env (dict, optional): Extra environment variables of the server (e.g. MODEL_PATH, MICRO_BATCH_MAX_SIZE).
+        startup_timeout (float): Seconds to wait for the API to be ready (model loaded and warmed up).
+
+    Attributes:
+        url (str): Base URL of the running server.
+    """
+
+    def __init__(self, workers=1, env=None, startup_timeout=60.0):
+        self.workers = workers
+        self.env = env or {}
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}'
+        self.process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'api.main:app', '--host', '127.0.0.1', '--port', str(port),
+                                         '--workers', str(self.workers), '--log-level', 'warning'],
+                                        cwd=ROOT_DIR, env=dict(os.environ, **self.env))
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"The API server exited with status {self.process.returncode}.")
+            try:
+                if httpx.get(self.url + '/ready', timeout=1.0).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"The API server did not start within {self.startup_timeout} seconds.")
+
+    def __exit__(self, *exc_info):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        return False
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compares load test results with a baseline run, scenario by scenario.
+
+    Only runs of the same scenario and mode (open or closed loop) are compared.
+
+    Returns:
+        list of dict: One entry per scenario present in both runs with the baseline and current p50/p99 latency
+            and throughput, and whether it regressed (p99 latency or throughput worse than threshold).
+    """
+    baseline_runs = {(run['scenario'], run['mode']): run for run in baseline['runs']}
+    comparison = []
+    for run in results['runs']:
+        previous = baseline_runs.get((run['scenario'], run['mode']))
+        if previous is None or previous['latency_ms_p99'] is None or run['latency_ms_p99'] is None:
+            continue
+        slower = run['latency_ms_p99'] > previous['latency_ms_p99'] * (1 + threshold)
+        fewer_requests = run['throughput_rps'] < previous['throughput_rps'] * (1 - threshold)
+        comparison.append({
+            'scenario': run['scenario'],
+            'latency_ms_p50': (previous['latency_ms_p50'], run['latency_ms_p50']),
+            'latency_ms_p99': (previous['latency_ms_p99'], run['latency_ms_p99']),
+            'throughput_rps': (previous['throughput_rps'], run['throughput_rps']),
+            'regression': slower or fewer_requests,
+        })
+    return comparison
+
+
+def run_scenarios(base_url, scenarios, **load_options):
+    """
+    Runs every scenario against base_url, one after another.
+
+    Returns:
+        dict: The results document (metadata and one summary per scenario).
+    """
+    runs = []
+    for scenario in scenarios:
+        summary = LoadTest(base_url, scenario=scenario, **load_options).run()
+        runs.append(summary)
+        queue = f"  queue p95 {summary['queue_ms_p95']:.2f} ms" if summary['queue_ms_p95'] is not None else ''
+        print(f"{scenario:<28} {summary['requests']:>7} req {summary['throughput_rps']:>9.1f} req/s  "
+              f"p50 {summary['latency_ms_p50'] or 0:>8.2f} ms  p95 {summary['latency_ms_p95'] or 0:>8.2f} ms  "
+              f"p99 {summary['latency_ms_p99'] or 0:>8.2f} ms  errors {100 * summary['error_rate']:.2f}%{queue}")
+    return {
+        'format_version': RESULTS_FORMAT_VERSION,
+        'metadata': {'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'python': platform.python_version(),
+                     'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'base_url': base_url},
+        'runs': runs,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='House-pricing API load test')
+    parser.add_argument('--scenario', type=str, nargs='+', default=['predict'], choices=list(SCENARIOS), help='Scenarios to run')
+    parser.add_argument('--url', type=str, default=None, help='URL of a running API; by default one is started locally')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers of the local API')
+    parser.add_argument('--model-path', type=str, default=None, help='Model served by the local API (MODEL_PATH); default is the API default')
+    parser.add_argument('--rate', type=float, default=None, help='Target requests per second (open loop); default is closed loop')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients (closed loop) or connection limit (open loop)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds every scenario runs')
+    parser.add_argument('--batch-size', type=int, default=100, help='Rows per request of the batch scenarios')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Relative noise added to features, to avoid prediction cache hits')
+    parser.add_argument('--output', type=str, default=os.path.join(ROOT_DIR, 'benchmarks', 'load_results.json'), help='Path of the JSON results')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative p99 latency or throughput change reported as a regression')
+    args = parser.parse_args()
+
+    load_options = {'rate': args.rate, 'concurrency': args.concurrency, 'duration': args.duration, 'batch_size': args.batch_size,
+                    'sampler': PayloadSampler(jitter=args.jitter)}
+    if args.url is not None:
+        results = run_scenarios(args.url, args.scenario, **load_options)
+    else:
+        env = {'MODEL_PATH': os.path.abspath(args.model_path)} if args.model_path is not None else None
+        with LocalServer(workers=args.workers, env=env) as server:
+            results = run_scenarios(server.url, args.scenario, **load_options)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print("Load test results stored in: " + args.output)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            for entry in compare(results, json.load(file), threshold=args.threshold):
+                flag = '  REGRESSION' if entry['regression'] else ''
+                print(f"{entry['scenario']:<28} p99 {entry['latency_ms_p99'][0]:.2f} -> {entry['latency_ms_p99'][1]:.2f} ms  "
+                      f"throughput {entry['throughput_rps'][0]:.1f} -> {entry['throughput_rps'][1]:.1f} req/s{flag}")
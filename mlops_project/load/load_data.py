@@ -1,10 +1,17 @@
+import hashlib
+import json
 import os
 import shutil
 from pathlib import Path
 
+import numpy as np
 import opendatasets as od
 import pandas as pd
 
+CACHE_SUFFIX = '.cache'
+CACHE_MANIFEST = 'manifest.json'
+CACHE_FORMAT_VERSION = 1
+
 
 class DataRetriever():
     """
@@ -24,14 +31,26 @@ class DataRetriever():
         KAGGLE_URL (str): 2nd element of 'paths_list'. URL from which dataset is going to be downloaded.
         KAGGLE_LOCAL_DIR (str): 3rd element of 'paths_list'. Folder extracted from KAGGLE_URL, where dataset is dowonloaded by default.
         DATA_RETRIEVED: 4th element of 'paths_list'. Name for the final retrieved dataset.
+        use_cache (bool): Whether load_data reads (and maintains) the columnar binary cache of the dataset.
+        cache_dir (str): Directory of the cache, next to the dataset ('<DATA_RETRIEVED>.cache').
+
+    Methods:
+        retrieve_data(): Downloads the dataset from Kaggle.
+        load_data(chunksize=None): Reads the dataset, from its columnar binary cache when it is up to date.
+        build_cache(df, source_key): Writes the columnar binary cache of a dataset.
 
+    The cache holds one .npy file per column and a manifest with the dtypes and the sha256 of the CSV it was built
+    from. Loading it memory-maps the columns instead of parsing text, and it is rebuilt whenever the CSV changes:
+    the CSV's size and modification time are compared first, and its content hash only when they differ.
     """
 
-    def __init__(self, paths_list: list) -> None:
+    def __init__(self, paths_list: list, use_cache=True) -> None:
         self.DATASETS_DIR = paths_list[0]
         self.KAGGLE_URL = paths_list[1]
         self.KAGGLE_LOCAL_DIR = paths_list[2]
         self.DATA_RETRIEVED = paths_list[3]
+        self.use_cache = use_cache
+        self.cache_dir = self.DATASETS_DIR + self.DATA_RETRIEVED + CACHE_SUFFIX
 
     def retrieve_data(self) -> bool:
         # Downloads dataset from kaggle with pre-defined structure (folder)
@@ -60,8 +79,124 @@ class DataRetriever():
 
         return True
 
-    def load_data(self) -> pd.DataFrame:
-        df = pd.read_csv(self.DATASETS_DIR + self.DATA_RETRIEVED, delimiter=",")
+    def load_data(self, chunksize=None, dtype_policy=None):
+        """
+        Reads the retrieved dataset, from its columnar binary cache when it is up to date.
+
+        The first full load parses the CSV and writes the cache; later loads memory-map the cached columns.
+
+        Parameters:
+            chunksize (int, optional): If given, the file is streamed: an iterator of DataFrames with up to chunksize
+                rows each is returned instead of the whole DataFrame, for datasets larger than memory. Chunks are sliced
+                from the cache if it is up to date, and parsed from the CSV otherwise (without building the cache).
+            dtype_policy (DtypePolicy, optional): Compact dtypes applied to the data (or every chunk) once loaded.
+
+        Returns:
+            pd.DataFrame, or an iterator of pd.DataFrame chunks.
+        """
+        if dtype_policy is not None:
+            data = self.load_data(chunksize=chunksize)
+            return dtype_policy.apply(data) if chunksize is None else (dtype_policy.apply(chunk) for chunk in data)
+
+        source_key = self._source_key() if self.use_cache else None
+        if source_key is not None and source_key['sha256'] is not None:
+            columns = self._load_cache()
+            if chunksize is not None:
+                return self._cache_chunks(columns, chunksize)
+            return pd.DataFrame(columns, copy=False)
+
+        df = pd.read_csv(self.DATASETS_DIR + self.DATA_RETRIEVED, delimiter=",", chunksize=chunksize)
+        if source_key is not None and chunksize is None:
+            source_key['sha256'] = self._file_hash(self.DATASETS_DIR + self.DATA_RETRIEVED)
+            self.build_cache(df, source_key)
         return df
 
+    @staticmethod
+    def _file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.cache_dir, CACHE_MANIFEST)) as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get('format_version') == CACHE_FORMAT_VERSION else None
+
+    def _source_key(self):
+        """
+        Returns the size, modification time and, if the cache matches them, the sha256 of the CSV.
+
+        The sha256 is None when the cache has to be (re)built.
+        """
+        stat = os.stat(self.DATASETS_DIR + self.DATA_RETRIEVED)
+        source_key = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': None}
+        manifest = self._read_manifest()
+        if manifest is None:
+            return source_key
+        if (manifest['source']['size'], manifest['source']['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            source_key['sha256'] = manifest['source']['sha256']
+        elif manifest['source']['size'] == stat.st_size:
+            # Touched or copied: the content hash decides, and the manifest remembers the new modification time
+            sha256 = self._file_hash(self.DATASETS_DIR + self.DATA_RETRIEVED)
+            if sha256 == manifest['source']['sha256']:
+                source_key['sha256'] = sha256
+                manifest['source'] = source_key
+                self._write_manifest(self.cache_dir, manifest)
+        return source_key
+
+    @staticmethod
+    def _write_manifest(cache_dir, manifest):
+        with open(os.path.join(cache_dir, CACHE_MANIFEST + '.tmp'), 'w') as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(os.path.join(cache_dir, CACHE_MANIFEST + '.tmp'), os.path.join(cache_dir, CACHE_MANIFEST))
+
+    def build_cache(self, df, source_key):
+        """
+        Writes the columnar binary cache of a dataset: one .npy file per column and a manifest.
+
+        Datasets with non-numeric columns are not cached, as their values cannot be stored as typed arrays.
+
+        Parameters:
+            df (pd.DataFrame): Dataset parsed from the CSV.
+            source_key (dict): Size, modification time and sha256 of the CSV.
+
+        Returns:
+            bool: True if the cache was written.
+        """
+        if not all(pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype) for dtype in df.dtypes):
+            print("Dataset has non-numeric columns, it is not cached: " + self.DATASETS_DIR + self.DATA_RETRIEVED)
+            return False
+
+        # Written aside and swapped in whole, so a concurrent reader never sees a partial cache
+        building_dir = self.cache_dir + f'.{os.getpid()}.tmp'
+        shutil.rmtree(building_dir, ignore_errors=True)
+        os.makedirs(building_dir)
+        columns = []
+        for position, column in enumerate(df.columns):
+            file_name = f'{position:04d}.npy'
+            np.save(os.path.join(building_dir, file_name), df[column].to_numpy())
+            columns.append({'name': column, 'dtype': str(df[column].dtype), 'file': file_name})
+        self._write_manifest(building_dir, {'format_version': CACHE_FORMAT_VERSION, 'source': source_key, 'n_rows': len(df), 'columns': columns})
+
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.rename(building_dir, self.cache_dir)
+        return True
+
+    def _load_cache(self):
+        # Copy-on-write mappings: pages are read lazily, and callers may modify the data without touching the cache
+        manifest = self._read_manifest()
+        return {column['name']: np.load(os.path.join(self.cache_dir, column['file']), mmap_mode='c').view(np.ndarray) for column in manifest['columns']}
+
+    @staticmethod
+    def _cache_chunks(columns, chunksize):
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        for start in range(0, n_rows, chunksize):
+            yield pd.DataFrame({name: values[start:start + chunksize] for name, values in columns.items()},
+                               index=pd.RangeIndex(start, min(start + chunksize, n_rows)), copy=False)
+
 # Usage example:
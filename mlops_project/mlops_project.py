@@ -4,8 +4,10 @@ import os
 
 import pandas as pd
 from load.load_data import DataRetriever
+from preprocess.preprocess_data import DtypePolicy
 # from predictor.model_predictor import ModelPredictor
 from sklearn.model_selection import train_test_split
+from train.profiling import PipelineProfiler
 from train.train_data import HousepricingDataPipeline
 
 MAIN_DIR = './mlops_project/'
@@ -22,12 +24,18 @@ NUMERICAL_FEATURES = ['CRIM', 'ZN', 'INDUS', 'NOX', 'RM', 'AGE', 'DIS', 'TAX', '
 CATEGORICAL_FEATURES = ['CHAS', 'RAD']
 SELECTED_FEATURES = ['CRIM', 'ZN', 'INDUS', 'CHAS', 'NOX', 'RM', 'AGE', 'DIS', 'RAD', 'TAX', 'PTRATIO', 'B', 'LSTAT']
 
+# float32 continuous features and target, uint8 categorical codes: about half the memory of the default dtypes
+DTYPE_POLICY = DtypePolicy(continuous=NUMERICAL_FEATURES + [TARGET], categorical=CATEGORICAL_FEATURES)
+
 SEED_SPLIT = 42
 SEED_MODEL = 102
+EVALUATION = 'oob'      # 'oob' (out-of-bag, no extra fits) or 'cv' (10-fold cross validation)
 
 TRAINED_MODEL_DIR = MAIN_DIR + 'models/'
 PIPELINE_NAME = 'random_forest'
 PIPELINE_SAVE_FILE = f'{PIPELINE_NAME}_output.pkl'
+PIPELINE_SHARED_FILE = f'{PIPELINE_NAME}_output.forest'
+PROFILE_TRACE_FILE = f'{PIPELINE_NAME}_training_trace.json'
 
 droped_rows_index_list = []
 
@@ -41,24 +49,28 @@ if __name__ == "__main__":
     result = data_retriever.retrieve_data()
 
     # Read data
-    raw_df = data_retriever.load_data()
+    raw_df = data_retriever.load_data(dtype_policy=DTYPE_POLICY)
     print(raw_df)
 
-    # House-pricing Pipeline
-    housepricing_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=SEED_MODEL)
-    housepricing_pipeline.create_pipeline()
-    df_transformed = housepricing_pipeline.PIPELINE.fit_transform(raw_df)
+    # House-pricing Pipeline, profiling time, CPU, peak memory and rows/columns of every step and training stage
+    profiler = PipelineProfiler()
+    housepricing_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=SEED_MODEL, evaluation=EVALUATION, profiler=profiler)
+    housepricing_pipeline.create_pipeline(masked=True)
+    df_transformed = housepricing_pipeline.fit_transform(raw_df)
     X_train, X_test, y_train, y_test = train_test_split(df_transformed.drop(TARGET, axis=1), df_transformed[TARGET], test_size=0.2, random_state=SEED_SPLIT)
 
     # Creating and training model
     RF_model = housepricing_pipeline.fit_random_forest(X_train=X_train, y_train=y_train)
-    RF_model.fit(X_train, y_train)
 
     # Model making a prediction on test data, and persisting the model
     # predictor = ModelPredictor(model=RF_model, X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, trained_model_dir=TRAINED_MODEL_DIR, file_save_name=PIPELINE_SAVE_FILE)
     y_pred = housepricing_pipeline.predict(X_test=X_test)
     print(housepricing_pipeline.get_evaluation_metrics(y_test=y_test))
+    print(housepricing_pipeline.engine.phase_times)
     housepricing_pipeline.persist_model(trained_model_dir=TRAINED_MODEL_DIR, file_save_name=PIPELINE_SAVE_FILE)
+    housepricing_pipeline.persist_model(trained_model_dir=TRAINED_MODEL_DIR, file_save_name=PIPELINE_SHARED_FILE, model_format='mmap')
+    print(profiler.report())
+    profiler.report().write_chrome_trace(TRAINED_MODEL_DIR + PROFILE_TRACE_FILE)
 
     # Predictions with new information
     print()
@@ -1,40 +1,120 @@
 import argparse
+import time
 
-import joblib
+import numpy as np
+
+from mlops_project.predictor.flat_forest import (FlatForest, is_forest_file,
+                                                 read_forest_file)
+from mlops_project.predictor.inference_artifact import (InferenceTransform,
+                                                        is_inference_artifact)
+
+ENGINES = ('auto', 'flat', 'sklearn')
 
 
 class ModelAPIPredictor:
     """
     A class to load a trained machine learning model and make predictions on new data.
 
+    The file may hold an inference artifact (model plus fitted preprocessing, see HousepricingDataPipeline.persist_model),
+    in which case raw features are scaled with the fused transform before reaching the model,
+    or a bare model, which receives the features as given.
+
+    A forest file (see HousepricingDataPipeline.persist_model with model_format='mmap' or 'compact') is memory-mapped
+    instead: its node arrays are shared read-only by every process serving it, and it is always scored by the flattened
+    engine. Compressed files (joblib or forest) are decompressed into the memory of the process on load.
+
+    Trees can be evaluated by sklearn or by the flattened array engine (FlatForest), which gives the same results
+    with much less per-call overhead on small batches; 'auto' picks the flattened engine up to flat_max_rows rows.
+
     Parameters:
         trained_model_path (str): Path to the trained model file (joblib format).
+        engine (str): Tree evaluation engine, one of 'auto', 'flat' or 'sklearn'. Default is 'auto'.
+        flat_max_rows (int): Largest batch scored by the flattened engine when engine is 'auto'.
+
+    Attributes:
+        model (RandomForest model): The trained model, None when serving a forest file.
+        transform (InferenceTransform): Fused preprocessing applied to raw features, None for a bare model.
+        flat_forest (FlatForest): Flattened copy of the model trees, None if engine is 'sklearn'.
 
     Methods:
         predict(new_data):
             Makes predictions on the provided new_data using the loaded trained model.
     """
 
-    def __init__(self, model_path):
+    def __init__(self, model_path, engine='auto', flat_max_rows=256):
         """
         Initializes the ModelPredictor instance.
 
         Parameters:
             model_path (str): Path to the trained model file (joblib format).
+            engine (str): Tree evaluation engine, one of 'auto', 'flat' or 'sklearn'.
+            flat_max_rows (int): Largest batch scored by the flattened engine when engine is 'auto'.
         """
-        self.model = joblib.load(model_path)
-
-    def predict(self, new_data):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}.")
+        self.engine = engine
+        self.flat_max_rows = flat_max_rows
+
+        if is_forest_file(model_path):
+            self._load_forest_file(model_path)
+            return
+
+        # Imported here: joblib (and sklearn, when unpickling) is only needed for joblib artifacts, not forest files
+        import joblib
+        loaded = joblib.load(model_path)
+        if is_inference_artifact(loaded):
+            self.model = loaded['model']
+            self.transform = InferenceTransform.from_artifact(loaded)
+        else:
+            self.model = loaded
+            self.transform = None
+        self.flat_forest = FlatForest.from_estimator(self.model) if engine != 'sklearn' else None
+
+    def _load_forest_file(self, model_path):
+        if self.engine == 'sklearn':
+            raise ValueError("A forest file can only be scored with the 'flat' engine.")
+        content = read_forest_file(model_path, mmap=True)
+        self.engine = 'flat'
+        self.model = None
+        self.flat_forest = content['forest']
+        features = content['metadata'].get('features')
+        if features is not None:
+            self.transform = InferenceTransform(features, content['arrays']['mean'], content['arrays']['scale'])
+        else:
+            self.transform = None
+
+    def predict(self, new_data, timings=None):
         """
         Makes predictions on the provided new_data using the loaded model.
 
         Parameters:
-            new_data: The data on which to make predictions.
+            new_data: The raw features on which to make predictions, shape (n_rows, n_features).
+            timings (dict, optional): If given, receives the seconds spent assembling the feature matrix
+                ('feature_assembly', conversion and scaling) and evaluating the trees ('tree_evaluation').
 
         Returns:
             Predicted outputs from the model.
         """
-        return self.model.predict(new_data)
+        start = time.perf_counter()
+        if self.transform is not None:
+            new_data = self.transform.transform(new_data)
+        else:
+            new_data = np.asarray(new_data, dtype=np.float64)
+        assembled = time.perf_counter()
+        if self.use_flat_engine(new_data.shape[0]):
+            predictions = self.flat_forest.predict(new_data)
+        else:
+            predictions = self.model.predict(new_data)
+        if timings is not None:
+            timings['feature_assembly'] = assembled - start
+            timings['tree_evaluation'] = time.perf_counter() - assembled
+        return predictions
+
+    def use_flat_engine(self, n_rows):
+        """
+        Tells whether a batch of n_rows rows is scored by the flattened engine.
+        """
+        return self.engine == 'flat' or (self.engine == 'auto' and n_rows <= self.flat_max_rows)
 
 
 if __name__ == "__main__":
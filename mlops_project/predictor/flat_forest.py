@@ -0,0 +1,327 @@
+import bz2
+import json
+import lzma
+import os
+import struct
+import zlib
+
+import numpy as np
+
+FOREST_FILE_MAGIC = b'HPFOREST'
+FOREST_FILE_EXTENSION = '.forest'
+FOREST_FILE_VERSION = 2
+# Codecs the data section of a forest file can be compressed with (a compressed file is read into memory, not mapped)
+COMPRESSION_CODECS = {'zlib': zlib, 'lzma': lzma, 'bz2': bz2}
+# Every array starts at a multiple of this offset, so mapped pages can be used without copying
+FOREST_FILE_ALIGNMENT = 64
+
+# Node arrays of a FlatForest, in the order they are written
+FOREST_ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots', 'missing_go_to_left']
+
+
+class FlatForest:
+    """
+    Array-based inference engine for a fitted tree ensemble (RandomForestRegressor).
+
+    The nodes of all trees are concatenated into contiguous arrays addressed by one global node index,
+    and leaves point to themselves. A batch is scored with a level-synchronous traversal: every step
+    moves all (row, tree) pairs one level down at once, so the whole forest is evaluated with a few
+    numpy operations per tree level instead of one python call per tree.
+
+    Results are bit-compatible with sklearn: features are rounded to float32 as sklearn trees do, and
+    tree outputs are accumulated in estimator order before dividing by the number of trees.
+
+    Parameters:
+        feature (np.ndarray): Feature index tested at every node (0 on leaves).
+        threshold (np.ndarray): Split threshold of every node; rows with feature value <= threshold go left.
+        left (np.ndarray): Global index of the left child of every node (the node itself on leaves).
+        right (np.ndarray): Global index of the right child of every node (the node itself on leaves).
+        value (np.ndarray): Prediction stored on every node.
+        roots (np.ndarray): Global index of the root node of every tree.
+        max_depth (int): Depth of the deepest tree, i.e. number of traversal steps.
+        n_features (int): Number of features expected.
+        missing_go_to_left (np.ndarray, optional): Whether missing values go to the left child at every node.
+
+    Methods:
+        from_estimator(model): Flattens a fitted RandomForestRegressor (or any ensemble of regression trees).
+        compact(): Returns a copy with float32 thresholds and values, and the narrowest integer indices.
+        predict(X): Predicts a (n_rows, n_features) matrix.
+    """
+
+    # Rows scored together; bounds the (rows x trees) index matrix so it stays in cache
+    CHUNK_ROWS = 4096
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features, missing_go_to_left=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.missing_go_to_left = missing_go_to_left
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        arrays = [self.feature, self.threshold, self.left, self.right, self.value, self.roots]
+        if self.missing_go_to_left is not None:
+            arrays.append(self.missing_go_to_left)
+        return sum(array.nbytes for array in arrays)
+
+    @classmethod
+    def from_estimator(cls, model):
+        """
+        Flattens the trees of a fitted ensemble into global node arrays.
+
+        Parameters:
+            model (RandomForestRegressor): Fitted single-output tree ensemble.
+
+        Returns:
+            FlatForest: The flattened forest.
+        """
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError("Only single-output regression forests can be flattened.")
+
+        sizes = np.array([tree.node_count for tree in trees], dtype=np.intp)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+
+        feature, threshold, left, right, value, missing = [], [], [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            node_index = np.arange(tree.node_count, dtype=np.intp) + offset
+            is_leaf = tree.children_left == -1
+            feature.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            threshold.append(tree.threshold.astype(np.float64))
+            left.append(np.where(is_leaf, node_index, tree.children_left + offset).astype(np.intp))
+            right.append(np.where(is_leaf, node_index, tree.children_right + offset).astype(np.intp))
+            value.append(tree.value[:, 0, 0].astype(np.float64))
+            missing.append(np.asarray(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count)), dtype=bool))
+
+        return cls(
+            feature=np.concatenate(feature),
+            threshold=np.concatenate(threshold),
+            left=np.concatenate(left),
+            right=np.concatenate(right),
+            value=np.concatenate(value),
+            roots=offsets,
+            max_depth=max(tree.max_depth for tree in trees),
+            n_features=model.n_features_in_,
+            missing_go_to_left=np.concatenate(missing),
+        )
+
+    def compact(self):
+        """
+        Returns a copy of the forest in compact dtypes, about half the size:
+            - thresholds as float32, rounded toward -inf. Features are compared as float32, and for a float32 x,
+              x <= t holds exactly when x <= (largest float32 <= t), so every row reaches the same leaves.
+            - leaf values as float32, the only source of prediction drift (relative error below 6e-8 per leaf).
+            - feature and node indices as the narrowest unsigned integers holding them (uint8, uint16 or uint32).
+            - missing value directions dropped when no node sends missing values left.
+
+        Returns:
+            FlatForest: The compact forest.
+        """
+        threshold = self.threshold.astype(np.float32)
+        rounded_up = threshold.astype(np.float64) > self.threshold
+        threshold[rounded_up] = np.nextafter(threshold[rounded_up], np.float32(-np.inf))
+
+        node_dtype = np.min_scalar_type(max(self.n_nodes - 1, 0))
+        missing_go_to_left = self.missing_go_to_left
+        if missing_go_to_left is not None and not missing_go_to_left.any():
+            missing_go_to_left = None
+        return FlatForest(
+            feature=self.feature.astype(np.min_scalar_type(max(self.n_features - 1, 0))),
+            threshold=threshold,
+            left=self.left.astype(node_dtype),
+            right=self.right.astype(node_dtype),
+            value=self.value.astype(np.float32),
+            roots=self.roots.astype(node_dtype),
+            max_depth=self.max_depth,
+            n_features=self.n_features,
+            missing_go_to_left=missing_go_to_left,
+        )
+
+    def apply(self, X):
+        """
+        Returns the global index of the leaf reached by every row in every tree.
+
+        Parameters:
+            X (array-like): Features, shape (n_rows, n_features).
+
+        Returns:
+            np.ndarray: Leaf indices, shape (n_rows, n_trees).
+        """
+        X = self._check_X(X)
+        leaves = np.empty((X.shape[0], self.n_trees), dtype=np.intp)
+        for start in range(0, X.shape[0], self.CHUNK_ROWS):
+            leaves[start:start + self.CHUNK_ROWS] = self._apply(X[start:start + self.CHUNK_ROWS])
+        return leaves
+
+    def _check_X(self, X):
+        # sklearn trees compare float32 feature values against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a matrix with {self.n_features} feature columns, got shape {X.shape}.")
+        return X
+
+    def _apply(self, X):
+        n_rows = X.shape[0]
+        # Position of the first feature of every row in the flattened matrix
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * self.n_features)[:, np.newaxis]
+        X_flat = X.ravel()
+        has_missing = self.missing_go_to_left is not None and np.isnan(X_flat).any()
+
+        # Node indices are widened once, so compact (narrow) index arrays are gathered without conversions
+        nodes = np.broadcast_to(self.roots.astype(np.intp), (n_rows, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = X_flat.take(row_offsets + self.feature.take(nodes))
+            go_left = x <= self.threshold.take(nodes)
+            if has_missing:
+                go_left |= np.isnan(x) & self.missing_go_to_left.take(nodes)
+            nodes = np.where(go_left, self.left.take(nodes), self.right.take(nodes)).astype(np.intp, copy=False)
+        return nodes
+
+    def predict(self, X):
+        """
+        Predicts every row with every tree and averages the tree outputs.
+
+        Parameters:
+            X (array-like): Features, shape (n_rows, n_features).
+
+        Returns:
+            np.ndarray: Predictions, shape (n_rows,).
+        """
+        leaves = self.apply(X)
+        tree_values = self.value.take(leaves)
+
+        # Accumulated tree by tree, in estimator order, to reproduce sklearn's floating point result
+        prediction = np.zeros(tree_values.shape[0], dtype=np.float64)
+        for tree in range(self.n_trees):
+            prediction += tree_values[:, tree]
+        prediction /= self.n_trees
+        return prediction
+
+
+def _aligned(n_bytes):
+    return -(-n_bytes // FOREST_FILE_ALIGNMENT) * FOREST_FILE_ALIGNMENT
+
+
+def write_forest_file(path, forest, metadata=None, arrays=None, compression=None):
+    """
+    Persists a FlatForest as raw, aligned little-endian numpy buffers that readers can memory-map.
+
+    Layout: magic bytes, header length (uint64), JSON header describing every array (dtype, shape, offset),
+    then the array buffers, each starting at a multiple of FOREST_FILE_ALIGNMENT bytes.
+    The file is written to a temporary name and moved into place, so processes that mapped the previous
+    file keep reading a consistent (old) version.
+
+    Arrays keep the dtypes of the forest, so a compact forest (see FlatForest.compact) is stored compact.
+
+    Parameters:
+        path (str): Destination file.
+        forest (FlatForest): Forest to persist.
+        metadata (dict, optional): JSON-serializable information stored in the header.
+        arrays (dict of str to np.ndarray, optional): Additional arrays stored next to the forest (e.g. scaler parameters).
+        compression (str, optional): Codec of COMPRESSION_CODECS the data section is compressed with. A compressed
+            file is smaller, but readers decompress it into private memory instead of mapping it.
+    """
+    if compression is not None and compression not in COMPRESSION_CODECS:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {list(COMPRESSION_CODECS)}.")
+    buffers = {name: getattr(forest, name) for name in FOREST_ARRAYS if getattr(forest, name) is not None}
+    for name, array in (arrays or {}).items():
+        buffers['extra.' + name] = array
+
+    header = {
+        'format_version': FOREST_FILE_VERSION,
+        'max_depth': forest.max_depth,
+        'n_features': forest.n_features,
+        'metadata': metadata or {},
+        'compression': compression,
+        'arrays': {},
+    }
+    buffers = {name: np.ascontiguousarray(array, dtype=np.asarray(array).dtype.newbyteorder('<')) for name, array in buffers.items()}
+
+    # Array offsets are relative to the data section, which starts right after the (padded) header
+    offset = 0
+    for name, array in buffers.items():
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += _aligned(array.nbytes)
+    header_bytes = json.dumps(header).encode()
+    data_start = _aligned(len(FOREST_FILE_MAGIC) + 8 + len(header_bytes))
+    header_bytes = header_bytes.ljust(data_start - len(FOREST_FILE_MAGIC) - 8)
+
+    data = b''.join(array.tobytes() + bytes(_aligned(array.nbytes) - array.nbytes) for array in buffers.values())
+    if compression is not None:
+        data = COMPRESSION_CODECS[compression].compress(data)
+
+    with open(path + '.tmp', 'wb') as file:
+        file.write(FOREST_FILE_MAGIC)
+        file.write(struct.pack('<Q', len(header_bytes)))
+        file.write(header_bytes)
+        file.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def read_forest_file(path, mmap=True):
+    """
+    Opens a file written by write_forest_file.
+
+    With mmap=True the arrays are read-only views on a shared memory map of the file: loading is near-instant,
+    and processes mapping the same file share the same physical pages. Compressed files are always decompressed
+    into private memory.
+
+    Parameters:
+        path (str): File to open.
+        mmap (bool): Memory-map the file instead of reading it into private memory (uncompressed files only).
+
+    Returns:
+        dict: 'forest' (FlatForest), 'metadata' (dict) and 'arrays' (dict of additional arrays).
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(FOREST_FILE_MAGIC)) != FOREST_FILE_MAGIC:
+            raise ValueError(f"{path} is not a forest file.")
+        header_size = struct.unpack('<Q', file.read(8))[0]
+        header = json.loads(file.read(header_size))
+    data_start = len(FOREST_FILE_MAGIC) + 8 + header_size
+    if header['format_version'] > FOREST_FILE_VERSION:
+        raise ValueError(f"Unsupported forest file version {header['format_version']}.")
+
+    compression = header.get('compression')
+    if compression is not None:
+        with open(path, 'rb') as file:
+            file.seek(data_start)
+            buffer = np.frombuffer(COMPRESSION_CODECS[compression].decompress(file.read()), dtype=np.uint8)
+        data_start = 0
+    elif mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    else:
+        with open(path, 'rb') as file:
+            buffer = np.frombuffer(file.read(), dtype=np.uint8)
+
+    arrays = {}
+    for name, description in header['arrays'].items():
+        dtype = np.dtype(description['dtype'])
+        count = int(np.prod(description['shape'], dtype=np.int64))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + description['offset']).reshape(description['shape'])
+
+    forest = FlatForest(max_depth=header['max_depth'], n_features=header['n_features'],
+                        **{name: arrays.get(name) for name in FOREST_ARRAYS})
+    extra = {name[len('extra.'):]: array for name, array in arrays.items() if name.startswith('extra.')}
+    return {'forest': forest, 'metadata': header['metadata'], 'arrays': extra}
+
+
+def is_forest_file(path):
+    """
+    Tells whether path holds a forest file, by its magic bytes.
+    """
+    with open(path, 'rb') as file:
+        return file.read(len(FOREST_FILE_MAGIC)) == FOREST_FILE_MAGIC
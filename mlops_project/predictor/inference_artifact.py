@@ -0,0 +1,97 @@
+import numpy as np
+
+ARTIFACT_FORMAT = 'housepricing-inference'
+ARTIFACT_FORMAT_VERSION = 1
+
+
+def build_inference_artifact(model, features, mean, scale, outlier_bounds=None):
+    """
+    Bundles the trained model with the fitted preprocessing state needed to score raw features.
+
+    Only plain python and numpy objects are stored next to the model, so the artifact can be loaded
+    without importing the preprocessing modules.
+
+    Parameters:
+        model (RandomForest model): The fitted model.
+        features (list of str): Feature names, in the column order the model was trained with.
+        mean (array-like): Mean learned by the scaler for every feature, in the same order.
+        scale (array-like): Scale (standard deviation) learned by the scaler for every feature, in the same order.
+        outlier_bounds (dict, optional): Outlier bounds learned during training ('features', 'n', 'lower' and 'upper'),
+            reused when the model is retrained with new rows.
+
+    Returns:
+        dict: The inference artifact.
+    """
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'features': list(features),
+        'mean': np.asarray(mean, dtype=np.float64),
+        'scale': np.asarray(scale, dtype=np.float64),
+        'model': model,
+    }
+    if outlier_bounds is not None:
+        artifact['outlier_bounds'] = {
+            'features': list(outlier_bounds['features']),
+            'n': int(outlier_bounds['n']),
+            'lower': np.asarray(outlier_bounds['lower'], dtype=np.float64),
+            'upper': np.asarray(outlier_bounds['upper'], dtype=np.float64),
+        }
+    return artifact
+
+
+def is_inference_artifact(obj):
+    """
+    Tells an inference artifact apart from a bare persisted model.
+    """
+    return isinstance(obj, dict) and obj.get('format') == ARTIFACT_FORMAT
+
+
+class InferenceTransform:
+    """
+    Preprocessing of an inference artifact collapsed into a single affine step.
+
+    Standard scaling (X - mean) / scale is folded into X * weight + bias, computed once at load time,
+    so scoring a batch is one elementwise multiply-add on a numpy matrix, without pandas.
+
+    Parameters:
+        features (list of str): Feature names, in the column order the model expects.
+        mean (array-like): Mean learned by the scaler for every feature.
+        scale (array-like): Scale learned by the scaler for every feature.
+
+    Attributes:
+        features (list of str): Feature names, in the column order the model expects.
+        weight (np.ndarray): Per-feature multiplier (1 / scale).
+        bias (np.ndarray): Per-feature offset (-mean / scale).
+
+    Methods:
+        from_artifact(artifact): Creates the transform from an inference artifact.
+        transform(X): Applies the fused scaling to a (n_rows, n_features) matrix.
+    """
+
+    def __init__(self, features, mean, scale):
+        self.features = list(features)
+        scale = np.asarray(scale, dtype=np.float64)
+        self.weight = 1.0 / scale
+        self.bias = -np.asarray(mean, dtype=np.float64) / scale
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls(artifact['features'], artifact['mean'], artifact['scale'])
+
+    def transform(self, X):
+        """
+        Applies the fused scaling.
+
+        Parameters:
+            X (array-like): Raw features, shape (n_rows, n_features), columns in the order of 'features'.
+
+        Returns:
+            np.ndarray: Scaled features, float64.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.features):
+            raise ValueError(f"Expected a matrix with {len(self.features)} feature columns, got shape {X.shape}.")
+        X_transformed = np.multiply(X, self.weight)
+        X_transformed += self.bias
+        return X_transformed
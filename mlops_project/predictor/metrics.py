@@ -0,0 +1,280 @@
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _process_start_time():
+    # Unix time the process started, from /proc on Linux (process start in clock ticks after boot), else now
+    try:
+        with open('/proc/self/stat') as file:
+            start_ticks = int(file.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat') as file:
+            boot_time = next(int(line.split()[1]) for line in file if line.startswith('btime'))
+        return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+PROCESS_START_TIME = _process_start_time()
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    value = float(value)
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class _Metric:
+    # Values are kept in per-thread shards: a thread only ever writes its own shard, so updates need no lock
+    # (a shard is created, under the lock, the first time a thread updates the metric). Scrapes add the shards up.
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._shards = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _add(self, amount, labels):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            values = shard[labels] = [0.0]
+        values[0] += amount
+
+    def _merged(self):
+        with self._lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            for labels, values in list(shard.items()):
+                total = merged.setdefault(labels, [0.0] * len(values))
+                for position, value in enumerate(values):
+                    total[position] += value
+        return merged
+
+    def samples(self):
+        """
+        Current value of every label combination: read from function() if the metric has one, else added up from the shards.
+        """
+        if self.function is None:
+            return {labels: values[0] for labels, values in self._merged().items()}
+        value = self.function()
+        if value is None:
+            return {}
+        return value if isinstance(value, dict) else {(): value}
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        for labels, value in sorted(self.samples().items()):
+            if value is not None:
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter, optionally labelled, e.g. number of requests or rows predicted.
+
+    A counter kept elsewhere (e.g. the prediction cache hits) is exposed with a function read at scrape time,
+    which returns a number, or a dict from label value tuples to numbers for a labelled counter.
+
+    Methods:
+        inc(amount, *labels): Adds amount to the counter of the label values.
+    """
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1.0, *labels):
+        self._add(amount, labels)
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down: updated with inc/dec (e.g. requests in flight), or read from a function at scrape time
+    (e.g. model size or memory), which costs nothing on the request path.
+
+    Methods:
+        inc(amount, *labels), dec(amount, *labels): Moves the gauge of the label values.
+    """
+
+    metric_type = 'gauge'
+
+    def inc(self, amount=1.0, *labels):
+        self._add(amount, labels)
+
+    def dec(self, amount=1.0, *labels):
+        self._add(-amount, labels)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values (e.g. latencies in seconds) in cumulative buckets, with their sum and count.
+
+    Methods:
+        observe(value, *labels): Records a value for the label values.
+    """
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            # Per bucket counts (the last one is +Inf), then sum and count
+            values = shard[labels] = [0.0] * (len(self.buckets) + 3)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        for labels, values in sorted(self._merged().items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), values):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames + ('le',), labels + (_format_value(float(bound)),))
+                lines.append(f'{self.name}_bucket{bucket_labels} {_format_value(cumulative)}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(values[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(values[-1])}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Set of metrics exposed in the Prometheus text format (version 0.0.4), without any external client library.
+
+    Methods:
+        counter(name, documentation, labelnames, function), gauge(...), histogram(name, documentation, labelnames, buckets):
+            Create and register a metric.
+        render(): Returns every metric in the text format.
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), function=None):
+        return self._register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def process_memory():
+    """
+    Resident and virtual memory of the current process in bytes, from /proc (Linux), or the peak resident memory
+    reported by getrusage elsewhere.
+
+    Returns:
+        dict: 'resident_bytes' and 'virtual_bytes' (None when unknown).
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            virtual_pages, resident_pages = file.read().split()[:2]
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        return {'resident_bytes': int(resident_pages) * page_size, 'virtual_bytes': int(virtual_pages) * page_size}
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        return {'resident_bytes': max_rss if sys.platform == 'darwin' else max_rss * 1024, 'virtual_bytes': None}
+    except (ImportError, OSError):
+        return {'resident_bytes': None, 'virtual_bytes': None}
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording the latency, status and concurrency of every HTTP request.
+
+    Requests are labelled with the path template of the route that handled them (e.g. '/jobs/{job_id}'), or
+    'unmatched', so the number of label values stays bounded. The time the request arrived is stored in its
+    state ('request_start'), for endpoints to measure how long parsing and validation took before they ran.
+
+    Parameters:
+        app: The ASGI application.
+        requests_total (Counter): Requests by method, endpoint and status code.
+        request_duration (Histogram): Request latency in seconds by method and endpoint.
+        requests_in_flight (Gauge): Requests being handled.
+    """
+
+    def __init__(self, app, requests_total, request_duration, requests_in_flight):
+        self.app = app
+        self.requests_total = requests_total
+        self.request_duration = request_duration
+        self.requests_in_flight = requests_in_flight
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        scope.setdefault('state', {})['request_start'] = start
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        self.requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.requests_in_flight.dec()
+            route = scope.get('route')
+            endpoint = getattr(route, 'path', None) or 'unmatched'
+            self.request_duration.observe(time.perf_counter() - start, scope['method'], endpoint)
+            self.requests_total.inc(1, scope['method'], endpoint, str(status[0]))
@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    An asyncio request coalescer that groups single-row predictions into one vectorized model call.
+
+    Rows submitted concurrently are queued and collected until max_batch_size rows are waiting or
+    max_wait_ms milliseconds have passed since the first row of the batch arrived. The batch is then
+    stacked into one matrix, predicted with a single call (in a worker thread, so the event loop keeps
+    accepting requests) and every waiting request receives its own result.
+
+    Parameters:
+        predict_fn (callable): Function taking a (n_rows, n_features) matrix and returning n_rows predictions.
+        max_batch_size (int): Maximum number of rows predicted together.
+        max_wait_ms (float): Maximum time, in milliseconds, the first row of a batch waits for more rows.
+
+    Attributes:
+        predict_fn (callable): Function used to predict every batch.
+        max_batch_size (int): Maximum number of rows predicted together.
+        max_wait_ms (float): Maximum time the first row of a batch waits for more rows.
+
+    Methods:
+        predict(row): Queues one row and waits for its prediction.
+        metrics(): Returns batch fill and queueing statistics.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=2.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+        self.batches = 0
+        self.rows = 0
+        self.batch_sizes = {}
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    def _ensure_worker(self):
+        # The queue and the worker task belong to the running event loop; they are (re)created if it changes
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def predict(self, row):
+        """
+        Queues one row and waits until the batch it belongs to has been predicted.
+
+        Parameters:
+            row (list of float): Feature values of one observation, in model order.
+
+        Returns:
+            tuple: Prediction for the row, and seconds the row spent queued before its batch was dispatched.
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((row, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        # Blocks for the first row, then gathers more until the batch is full or the wait expires
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            dispatched_at = time.perf_counter()
+            queue_times = [dispatched_at - enqueued_at for _, _, enqueued_at in batch]
+            self._record(len(batch), queue_times)
+
+            try:
+                X = np.array([row for row, _, _ in batch], dtype=np.float64)
+                predictions = await self._loop.run_in_executor(None, self.predict_fn, X)
+            except Exception as error:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            for (_, future, _), prediction, queue_time in zip(batch, predictions, queue_times):
+                if not future.done():            # The client may have gone away while waiting
+                    future.set_result((prediction, queue_time))
+
+    def _record(self, batch_size, queue_times):
+        self.batches += 1
+        self.rows += batch_size
+        self.batch_sizes[batch_size] = self.batch_sizes.get(batch_size, 0) + 1
+        self.queue_time_total += sum(queue_times)
+        self.queue_time_max = max(self.queue_time_max, max(queue_times))
+
+    def metrics(self):
+        """
+        Returns batch fill and queueing statistics accumulated since startup.
+
+        Returns:
+            dict: Configuration, number of batches and rows, mean batch size and fill ratio,
+                batch size distribution and mean/max time requests spent queued (ms).
+        """
+        mean_batch_size = self.rows / self.batches if self.batches else 0.0
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': mean_batch_size,
+            'mean_batch_fill': mean_batch_size / self.max_batch_size,
+            'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            'mean_queue_time_ms': 1000 * self.queue_time_total / self.rows if self.rows else 0.0,
+            'max_queue_time_ms': 1000 * self.queue_time_max,
+        }
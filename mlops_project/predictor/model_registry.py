@@ -0,0 +1,192 @@
+import hashlib
+import os
+import threading
+import time
+
+from mlops_project.predictor.api_predict import ModelAPIPredictor
+
+
+class ModelRegistry:
+    """
+    A process-wide registry that loads the trained model once and serves every request from memory.
+
+    The registry watches the model artifact on disk and swaps in a newly persisted model atomically:
+    the replacement is fully loaded before the active reference is switched, so requests already
+    holding the previous predictor finish with it undisturbed.
+
+    Parameters:
+        model_path (str): Path to the trained model file (joblib format).
+        poll_interval (float): Seconds between checks of the artifact when the watcher is running.
+        predictor_options (dict, optional): Keyword arguments passed to ModelAPIPredictor (e.g. engine).
+        warmup (callable, optional): Called with every newly loaded predictor before it is swapped in, e.g. to run
+            a first prediction so the first request does not pay for lazy initializations.
+
+    Attributes:
+        model_path (str): Path to the trained model file being served.
+        poll_interval (float): Seconds between checks of the artifact.
+        reloads (int): Number of times a new model version has been swapped in.
+        last_error (str): Last error raised while (re)loading the artifact, None if the last load succeeded.
+
+    Methods:
+        load(): Loads the artifact and makes it the active model.
+        get(): Returns the active predictor, loading it first if needed.
+        version: Version of the active model.
+        reload_if_changed(): Reloads the artifact only if its content changed since the last load.
+        start_watcher(): Starts a daemon thread that calls reload_if_changed() every poll_interval seconds.
+        stop_watcher(): Stops the watcher thread.
+        status(): Returns a dictionary with the active model version and load telemetry.
+    """
+
+    def __init__(self, model_path, poll_interval=5.0, predictor_options=None, warmup=None):
+        self.model_path = model_path
+        self.poll_interval = poll_interval
+        self.predictor_options = predictor_options or {}
+        self.warmup = warmup
+        self.reloads = 0
+        self.last_error = None
+
+        self._active = None                 # (predictor, info) tuple, replaced as a whole on every swap
+        self._stat = None                   # (mtime_ns, size) of the artifact last loaded
+        self._load_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher = None
+
+    @staticmethod
+    def _file_hash(path):
+        # Content hash of the artifact, used as model version
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _stat_key(self):
+        stat = os.stat(self.model_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        """
+        Loads the artifact from model_path and makes it the active model.
+
+        Returns:
+            ModelAPIPredictor: The predictor just loaded.
+        """
+        with self._load_lock:
+            return self._load()
+
+    def _load(self):
+        stat_key = self._stat_key()
+        version = self._file_hash(self.model_path)[:12]
+
+        start = time.perf_counter()
+        predictor = ModelAPIPredictor(self.model_path, **self.predictor_options)
+        load_time = time.perf_counter() - start
+
+        warmup_time = None
+        if self.warmup is not None:
+            start = time.perf_counter()
+            self.warmup(predictor)
+            warmup_time = time.perf_counter() - start
+
+        info = {
+            'model_path': self.model_path,
+            'version': version,
+            'size_bytes': stat_key[1],
+            'load_time_s': load_time,
+            'warmup_time_s': warmup_time,
+            'engine': predictor.engine,
+            'loaded_at': time.time(),
+        }
+        if self._active is not None:
+            self.reloads += 1
+        self._active = (predictor, info)     # Single reference assignment: the swap is atomic
+        self._stat = stat_key
+        self.last_error = None
+        return predictor
+
+    def get(self):
+        """
+        Returns the active predictor, loading the artifact first if nothing has been loaded yet.
+
+        Returns:
+            ModelAPIPredictor: The predictor currently serving requests.
+        """
+        active = self._active
+        if active is None:
+            with self._load_lock:
+                if self._active is None:
+                    self._load()
+            active = self._active
+        return active[0]
+
+    @property
+    def version(self):
+        """
+        Version (content hash prefix) of the active model, loading it first if nothing has been loaded yet.
+        """
+        self.get()
+        return self._active[1]['version']
+
+    def reload_if_changed(self):
+        """
+        Reloads the artifact if it changed on disk since the last load.
+
+        The cheap (mtime, size) check runs first; the content hash is only computed when it differs,
+        so touching the file without changing it does not trigger a reload.
+        If the new artifact cannot be loaded (e.g. still being written) the current model stays active.
+
+        Returns:
+            bool: True if a new model version was swapped in.
+        """
+        with self._load_lock:
+            try:
+                stat_key = self._stat_key()
+                if self._active is not None and stat_key == self._stat:
+                    return False
+                if self._active is not None and self._file_hash(self.model_path)[:12] == self._active[1]['version']:
+                    self._stat = stat_key
+                    return False
+                self._load()
+                return True
+            except Exception as error:
+                self.last_error = repr(error)
+                print("Model could not be reloaded from " + self.model_path + ": " + self.last_error)
+                return False
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.reload_if_changed()
+
+    def start_watcher(self):
+        """
+        Starts a daemon thread that checks the artifact every poll_interval seconds.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=self._watch, name='model-registry-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """
+        Stops the watcher thread, if running.
+        """
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def status(self):
+        """
+        Returns the active model version and load telemetry.
+
+        Returns:
+            dict: Model path, version (content hash prefix), artifact size, load and warmup time, load timestamp,
+                number of reloads and last load error.
+        """
+        active = self._active
+        info = dict(active[1]) if active is not None else {'model_path': self.model_path, 'version': None}
+        info['loaded'] = active is not None
+        info['reloads'] = self.reloads
+        info['last_error'] = self.last_error
+        return info
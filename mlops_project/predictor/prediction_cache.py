@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    In-process LRU cache of single-row predictions, with time-to-live and model version invalidation.
+
+    Rows are keyed on their canonicalized feature vector, optionally quantized to a number of decimals so that
+    values differing only by float noise share an entry. Every lookup carries the version of the model serving
+    the request; when it changes, the whole cache is dropped, so a hot-reloaded model never serves stale values.
+
+    Parameters:
+        maxsize (int): Maximum number of cached rows; the least recently used row is evicted beyond it.
+        ttl (float): Seconds an entry stays valid. None keeps entries until they are evicted.
+        decimals (int, optional): Number of decimals features are rounded to when building keys. None keeps exact values.
+
+    Attributes:
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups not found in the cache (or expired).
+        evictions (int): Entries removed to stay within maxsize.
+        expirations (int): Entries removed because their TTL passed.
+        invalidations (int): Times the cache was dropped because the model version changed.
+
+    Methods:
+        get(row, version): Returns the cached prediction for row, or None.
+        put(row, version, prediction): Stores the prediction for row.
+        clear(): Drops every entry.
+        stats(): Returns size, configuration and counters.
+    """
+
+    def __init__(self, maxsize=10000, ttl=3600.0, decimals=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.decimals = decimals
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        self._entries = OrderedDict()       # key -> (prediction, expires_at), least recently used first
+        self._version = None
+        self._lock = threading.Lock()
+
+    def key(self, row):
+        """
+        Canonical key of a feature vector: python floats, optionally rounded, with -0.0 folded into 0.0.
+        """
+        if self.decimals is None:
+            return tuple(float(value) + 0.0 for value in row)
+        return tuple(round(float(value), self.decimals) + 0.0 for value in row)
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, row, version):
+        """
+        Returns the cached prediction for row, or None if it is not cached (or expired).
+
+        Parameters:
+            row (list of float): Feature values, in model order.
+            version (str): Version of the model currently serving; a different version than the cached one drops the cache.
+        """
+        key = self.key(row)
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, row, version, prediction):
+        """
+        Stores the prediction for row, unless it was made by a model version the cache no longer holds.
+
+        Parameters:
+            row (list of float): Feature values, in model order.
+            version (str): Version of the model that made the prediction.
+            prediction (float): Predicted value.
+        """
+        if self.maxsize <= 0:
+            return
+        key = self.key(row)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (prediction, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns size, configuration and counters.
+
+        Returns:
+            dict: Current size, maxsize, ttl, decimals, model version cached, hit ratio and counters.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'decimals': self.decimals,
+            'version': self._version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
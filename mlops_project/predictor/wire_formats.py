@@ -0,0 +1,142 @@
+import json
+
+import numpy as np
+
+# Media types of prediction requests and responses, besides the default JSON of the API models
+JSON = 'application/json'
+# Request: one JSON array per feature, e.g. {"crim": [0.1, 0.2], "zn": [18.0, 0.0], ...}
+COLUMNS_JSON = 'application/vnd.housepricing.columns+json'
+# Request: row-major matrix of little-endian float32, n_features values per row. Response: one float32 per row
+FLOAT32 = 'application/vnd.housepricing.float32'
+OCTET_STREAM = 'application/octet-stream'
+# Response: {"n_rows": n, "version": "...", "predictions": [...]}, the predictions as a plain array of numbers
+PREDICTIONS_JSON = 'application/vnd.housepricing.predictions+json'
+
+# Media types decoded by decode_features, and encodings offered by encode_predictions (the first one is the default)
+REQUEST_MEDIA_TYPES = (COLUMNS_JSON, FLOAT32, OCTET_STREAM)
+RESPONSE_MEDIA_TYPES = (JSON, PREDICTIONS_JSON, FLOAT32, OCTET_STREAM)
+
+
+def media_type(content_type):
+    """
+    Media type of a Content-Type header, without parameters (e.g. '; charset=utf-8'), lowercase. JSON when missing.
+    """
+    if not content_type:
+        return JSON
+    return content_type.split(';', 1)[0].strip().lower()
+
+
+def negotiate(accept, offers=RESPONSE_MEDIA_TYPES):
+    """
+    Picks the response media type for an Accept header.
+
+    The quality ('q' parameter) of an offer is the one of the most specific range matching it (exact type, then
+    'type/*', then '*/*'). The offer with the highest quality wins; ties go to an offer named explicitly, then to the
+    order of offers. Wildcards only match the first (default) offer: other encodings must be named explicitly.
+    A missing header accepts anything.
+
+    Parameters:
+        accept (str, optional): Accept header of the request.
+        offers (list of str): Media types the endpoint can answer with, preferred first.
+
+    Returns:
+        str: The media type chosen, or None if the client accepts none of the offers.
+    """
+    if not accept:
+        return offers[0]
+    ranges = []
+    for item in accept.split(','):
+        media_range, *parameters = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_range:
+            ranges.append((media_range.lower(), quality))
+
+    best, best_key = None, None
+    for position, offer in enumerate(offers):
+        # The quality of an offer is the one of the most specific range matching it
+        matches = [(2 if media_range == offer else 1 if media_range == offer.split('/')[0] + '/*' else 0, quality)
+                   for media_range, quality in ranges if media_range in (offer, offer.split('/')[0] + '/*', '*/*')]
+        if not matches:
+            continue
+        specificity, quality = max(matches)
+        if position > 0 and specificity < 2:
+            continue
+        # Ties go to an offer named explicitly, then to the preferred one
+        key = (quality, specificity, -position)
+        if quality > 0 and (best_key is None or key > best_key):
+            best, best_key = offer, key
+    return best
+
+
+def decode_features(body, content_type, features):
+    """
+    Decodes a batch of rows sent in one of REQUEST_MEDIA_TYPES, without building a python object per value.
+
+    Parameters:
+        body (bytes): Request body.
+        content_type (str): Media type of the body (see media_type).
+        features (list of str): Feature names, in model order (the keys of a columnar body).
+
+    Returns:
+        np.ndarray: Feature matrix, shape (n_rows, n_features), float64.
+
+    Raises:
+        ValueError: If the body is malformed, or holds values that are not finite numbers.
+    """
+    if content_type == COLUMNS_JSON:
+        try:
+            columns = json.loads(body)
+        except ValueError as error:
+            raise ValueError(f"Invalid JSON: {error}")
+        if not isinstance(columns, dict):
+            raise ValueError("Expected a JSON object with one array per feature.")
+        missing = [feature for feature in features if feature not in columns]
+        if missing:
+            raise ValueError(f"Missing feature columns: {missing}")
+        values = [np.asarray(columns[feature]) for feature in features]
+        # Numbers only, as the JSON of the API models: strings ("1") and booleans are not converted
+        if any(column.dtype.kind not in 'iuf' and column.size for column in values):
+            raise ValueError("Feature columns must be arrays of numbers.")
+        if any(column.ndim != 1 for column in values) or len({len(column) for column in values}) > 1:
+            raise ValueError("All feature columns must be arrays of the same length.")
+        X = np.column_stack(values).astype(np.float64) if values[0].size else np.empty((0, len(features)))
+
+    elif content_type in (FLOAT32, OCTET_STREAM):
+        row_bytes = 4 * len(features)
+        if len(body) % row_bytes:
+            raise ValueError(f"Body of {len(body)} bytes is not a whole number of rows of {len(features)} float32 values.")
+        X = np.frombuffer(body, dtype='<f4').reshape(-1, len(features)).astype(np.float64)
+
+    else:
+        raise ValueError(f"Unsupported media type '{content_type}'.")
+
+    if not np.isfinite(X).all():
+        raise ValueError("Feature values must be finite numbers (no NaN or infinity).")
+    return X
+
+
+def encode_predictions(predictions, content_type, version=None):
+    """
+    Encodes predictions in PREDICTIONS_JSON or FLOAT32 (OCTET_STREAM).
+
+    Parameters:
+        predictions (np.ndarray): One prediction per row.
+        content_type (str): Media type of the response.
+        version (str, optional): Version of the model that made the predictions (PREDICTIONS_JSON only).
+
+    Returns:
+        bytes: Response body.
+    """
+    predictions = np.asarray(predictions, dtype=np.float64).ravel()
+    if content_type == PREDICTIONS_JSON:
+        return json.dumps({'n_rows': len(predictions), 'version': version, 'predictions': predictions.tolist()}).encode()
+    if content_type in (FLOAT32, OCTET_STREAM):
+        return predictions.astype('<f4').tobytes()
+    raise ValueError(f"Unsupported media type '{content_type}'.")
@@ -6,6 +6,309 @@ from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.preprocessing import StandardScaler
 
 
+def feature_matrix(X, columns):
+    """
+    Returns columns of a DataFrame as a matrix, in the narrowest float type that holds them exactly:
+    float32 when every column is float32 or a small integer (e.g. after a DtypePolicy), float64 otherwise.
+    """
+    return X[list(columns)].to_numpy(dtype=np.result_type(np.float32, *X[list(columns)].dtypes))
+
+
+class DtypePolicy:
+    """
+    Compact dtypes for the dataset, applied when it is loaded and kept through the preprocessing transformers.
+
+    Continuous columns are stored as float32, the precision trees split on, and categorical columns with small integer
+    codes as the smallest unsigned integer holding them (e.g. uint8 for CHAS and RAD). Missing value indicators are
+    uint8 (see MissingIndicator). Converting float64 to float32 rounds values; the conversion is checked and refused if
+    any value moves more than 'tolerance' (relative), e.g. values beyond the float32 range.
+
+    Parameters:
+        continuous (list): Columns stored as float32.
+        categorical (list): Columns stored as small unsigned integers. Columns with missing values or non-integer
+            values are stored as float32 instead, which holds small integers exactly.
+        tolerance (float): Maximum relative rounding error allowed for continuous columns. Default is 1e-6.
+
+    Attributes:
+        max_error_ (float): Largest relative rounding error of the last apply.
+
+    Methods:
+        apply(df): Returns the DataFrame with the compact dtypes.
+    """
+
+    def __init__(self, continuous, categorical=None, tolerance=1e-6):
+        self.continuous = list(continuous)
+        self.categorical = list(categorical or [])
+        self.tolerance = tolerance
+
+    def apply(self, df):
+        """
+        Returns the DataFrame with the compact dtypes (columns not in the policy are unchanged).
+
+        Raises:
+            ValueError: If the rounding error of a continuous column exceeds the tolerance.
+        """
+        columns = {}
+        self.max_error_ = 0.0
+        for column in self.continuous:
+            if column not in df.columns:
+                continue
+            values = df[column].to_numpy(dtype=np.float64)
+            # Values beyond the float32 range become infinite, and are refused below with the rounding error
+            with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+                compact = values.astype(np.float32)
+                error = np.abs(compact - values) / np.abs(values)
+            error = np.nanmax(np.where(values == 0, np.abs(compact), error), initial=0.0)
+            if not error <= self.tolerance:
+                raise ValueError(f"Column '{column}' cannot be stored as float32: relative rounding error {error:.3g} exceeds {self.tolerance:.3g}.")
+            self.max_error_ = max(self.max_error_, float(error))
+            columns[column] = compact
+        for column in self.categorical:
+            if column not in df.columns:
+                continue
+            values = df[column].to_numpy(dtype=np.float64)
+            if np.isnan(values).any() or (values != np.round(values)).any() or (values < 0).any():
+                with np.errstate(over='ignore'):
+                    compact = values.astype(np.float32)
+                if np.isinf(compact[np.isfinite(values)]).any():
+                    raise ValueError(f"Column '{column}' cannot be stored as float32: values exceed the float32 range.")
+                columns[column] = compact
+            else:
+                columns[column] = values.astype(np.min_scalar_type(int(values.max(initial=0))))
+        return df.assign(**columns)
+
+
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch of a single numeric variable (KLL compactors).
+
+    Values are buffered in a hierarchy of compactors: level h holds items that each stand for 2**h values. When a
+    level exceeds its capacity it is sorted and every other item (from a random offset) is promoted to the next level,
+    so memory stays O(k log(n / k)) whatever the number of values seen. Two sketches of different chunks or workers
+    can be merged into the sketch of the union.
+
+    While no more than k values have been added nothing is compacted and quantiles are exact, computed as np.quantile
+    does (linear interpolation). Once compacted, the rank error of a quantile is about 1.7 / k of the number of values.
+    As with np.quantile, a variable with any missing (NaN) value has NaN quantiles.
+
+    Parameters:
+        k (int): Capacity of the largest compactor, governs accuracy and memory. Default is 4096.
+        random_state (int): Seed of the compaction offsets, so sketches are reproducible.
+
+    Attributes:
+        n (int): Number of values added (missing values included).
+        has_nan (bool): Whether any missing value was added.
+
+    Methods:
+        update(values): Adds an array of values.
+        merge(other): Adds the values summarized by another sketch.
+        quantile(q): Returns the q quantile(s).
+        exact: Whether the sketch still holds every value.
+    """
+
+    CAPACITY_DECAY = 2 / 3
+
+    def __init__(self, k=4096, random_state=0):
+        if k < 8:
+            raise ValueError("k must be at least 8.")
+        self.k = k
+        self.n = 0
+        self.has_nan = False
+        self._levels = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(random_state)
+
+    @property
+    def exact(self):
+        return len(self._levels) == 1
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(2, int(np.ceil(self.k * self.CAPACITY_DECAY ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0, dtype=np.float64))
+                items = np.sort(items)
+                # An odd item out stays at this level; the others are halved and promoted with double weight
+                kept, items = (items[:1], items[1:]) if len(items) % 2 else (items[:0], items)
+                promoted = items[self._rng.integers(2)::2]
+                self._levels[level] = kept
+                self._levels[level + 1] = np.concatenate([self._levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        """
+        Adds an array of values.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.n += len(values)
+        missing = np.isnan(values)
+        if missing.any():
+            self.has_nan = True
+            values = values[~missing]
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """
+        Adds the values summarized by another sketch (with the same k).
+        """
+        if other.k != self.k:
+            raise ValueError("Only sketches with the same k can be merged.")
+        self.n += other.n
+        self.has_nan = self.has_nan or other.has_nan
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other._levels):
+            self._levels[level] = np.concatenate([self._levels[level], items])
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Returns the q quantile(s), 0 <= q <= 1.
+
+        Parameters:
+            q (float or array-like of float): Quantile(s) to compute.
+
+        Returns:
+            float or np.ndarray: The quantile(s), NaN if missing values were added.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if self.has_nan:
+            return np.full(q.shape, np.nan)[()]
+        if self.exact:
+            return np.quantile(self._levels[0], q)
+
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(level_items), 2.0 ** level) for level, level_items in enumerate(self._levels)])
+        order = np.argsort(items, kind='stable')
+        items, weights = items[order], weights[order]
+        # Every item stands for the ranks around it: its center rank, on the 0..n-1 scale np.quantile uses
+        centers = (np.cumsum(weights) - weights / 2) * (self.n - 1) / weights.sum()
+        return np.interp(q * (self.n - 1), centers, items)[()]
+
+
+class MaskedFrame:
+    """
+    Carrier passed between the transformers of a mask-based pipeline, instead of rebuilding the DataFrame at every stage.
+
+    Filtering stages only narrow a boolean row mask, and missing indicators are kept as one isna matrix instead of
+    '_nan' columns. The original data is never copied: rows are selected and scaled once, by the last stage.
+
+    Parameters:
+        data (pd.DataFrame): Input data, shared (not copied) by every stage.
+        mask (np.ndarray of bool, optional): Rows still selected. Default is every row.
+        missing (np.ndarray of bool, optional): Missing value indicators, shape (n_rows, len(missing_variables)).
+        missing_variables (list, optional): Variables the columns of 'missing' refer to.
+
+    Attributes:
+        data (pd.DataFrame): Input data.
+        mask (np.ndarray of bool): Rows still selected.
+        missing (np.ndarray of bool): Missing value indicators, None until MissingIndicator runs.
+        missing_variables (list): Variables the columns of 'missing' refer to.
+
+    Methods:
+        values(columns): Returns the columns of every row as a float matrix (see feature_matrix), converted once and shared.
+        selected(columns): Returns the columns of the selected rows as a float matrix.
+        select(keep): Returns a carrier with the rows of the mask narrowed to 'keep'.
+        with_missing(variables): Returns a carrier with the isna matrix of the variables.
+    """
+
+    def __init__(self, data, mask=None, missing=None, missing_variables=None, _values=None):
+        self.data = data
+        self.mask = np.ones(len(data), dtype=bool) if mask is None else mask
+        self.missing = missing
+        self.missing_variables = missing_variables
+        self._values = {} if _values is None else _values      # Shared by every carrier derived from the same data
+
+    def __len__(self):
+        return int(self.mask.sum())
+
+    def values(self, columns):
+        key = tuple(columns)
+        if key not in self._values:
+            self._values[key] = feature_matrix(self.data, columns)
+        return self._values[key]
+
+    def selected(self, columns):
+        return self.values(columns)[self.mask]
+
+    def select(self, keep):
+        return MaskedFrame(self.data, self.mask & keep, self.missing, self.missing_variables, self._values)
+
+    def with_missing(self, variables):
+        missing = self.data[variables].isna().to_numpy()
+        return MaskedFrame(self.data, self.mask, missing, list(variables), self._values)
+
+
+class RowMask(BaseEstimator, TransformerMixin):
+    """
+    Custom scikit-learn transformer that starts a mask-based pipeline, wrapping the input DataFrame into a MaskedFrame.
+
+    The following transformers (MissingIndicator, IQR_DropOutliers, DropMissing and Standard_Scaler) recognize the
+    carrier: they narrow its row mask instead of copying and dropping rows, and Standard_Scaler returns the selected
+    rows scaled, the same DataFrame the default pipeline returns.
+
+    Methods:
+        fit(X, y=None):
+            This method does not perform any actual training or fitting.
+            It returns the transformer instance itself.
+
+        transform(X):
+            Wraps X into a MaskedFrame selecting every row.
+
+    Example usage:
+    ```
+    from sklearn.pipeline import Pipeline
+
+    pipeline = Pipeline([
+        ('row_mask', RowMask()),
+        ('missing_indicator', MissingIndicator(variables=['age', 'income'])),
+        ('drop_missing', DropMissing()),
+        ('scaler', Standard_Scaler(features=['age', 'income'], target='class')),
+    ])
+
+    X_transformed = pipeline.fit_transform(X)
+    ```
+    """
+
+    def fit(self, X, y=None):
+        """
+        This method does not perform any actual training or fitting.
+
+        Returns:
+            self (RowMask): The transformer instance.
+        """
+        return self
+
+    def partial_fit(self, X, y=None):
+        """
+        Streaming counterpart of fit, called with every chunk of the data. Nothing is learned.
+
+        Returns:
+            self (RowMask): The transformer instance.
+        """
+        return self
+
+    def transform(self, X):
+        """
+        Wraps X into a MaskedFrame selecting every row.
+
+        Parameters:
+            X (pd.DataFrame): Input data.
+
+        Returns:
+            MaskedFrame: Carrier of the input data.
+        """
+        return MaskedFrame(X)
+
+
 class MissingIndicator(BaseEstimator, TransformerMixin):
     """
     Custom scikit-learn transformer to create indicator features for missing values in specified variables.
@@ -69,19 +372,31 @@ class MissingIndicator(BaseEstimator, TransformerMixin):
         """
         return self
 
+    def partial_fit(self, X, y=None):
+        """
+        Streaming counterpart of fit, called with every chunk of the data. Nothing is learned.
+
+        Returns:
+            self (MissingIndicator): The transformer instance.
+        """
+        return self
+
     def transform(self, X):
         """
         Creates indicator features for missing values in the specified variables and returns the modified DataFrame.
 
         Parameters:
-            X (pd.DataFrame): Input data to be transformed.
+            X (pd.DataFrame or MaskedFrame): Input data to be transformed.
 
         Returns:
             X_transformed (pd.DataFrame): Transformed DataFrame with additional indicator features for missing values.
         """
+        if isinstance(X, MaskedFrame):
+            return X.with_missing(self.variables)     # One isna matrix instead of a column per variable
+
         X = X.copy()
         for var in self.variables:
-            X[f'{var}_nan'] = X[var].isnull().astype(int) * 1
+            X[f'{var}_nan'] = X[var].isnull().astype(np.uint8)
 
         return X
 
@@ -97,15 +412,23 @@ class IQR_DropOutliers (BaseEstimator, TransformerMixin):
 
     Attributes:
         features (list): List of features on which to obtain outliers.
+        lower_bounds_ (np.ndarray): Lowest value that is not an outlier (Q1 - 1.5 * IQR), for every feature.
+        upper_bounds_ (np.ndarray): Highest value that is not an outlier (Q3 + 1.5 * IQR), for every feature.
+        sketches_ (list of QuantileSketch): Quantile sketch of every feature, when fitted with partial_fit.
 
     Methods:
         fit(X, y=None):
-            This method does not perform any actual training or fitting.
+            Learns the quartile bounds of every feature, with a single quantile computation over the feature matrix.
             It returns the transformer instance itself.
 
         transform(X):
-            Finds outliers
-            Creates indicator features for missing values in the specified variables and returns the modified DataFrame.
+            Drops the records with more than n features outside the fitted bounds and returns the modified DataFrame.
+
+        partial_fit(X, y=None):
+            Adds a chunk of the data to streaming quantile sketches, for data that does not fit in memory.
+
+        from_bounds(features, n, lower_bounds, upper_bounds):
+            Creates a fitted transformer from bounds learned previously (e.g. persisted with a model).
 
     Example usage:
     ```
@@ -142,45 +465,79 @@ class IQR_DropOutliers (BaseEstimator, TransformerMixin):
 
         self.n = n
 
+    @classmethod
+    def from_bounds(cls, features, n, lower_bounds, upper_bounds):
+        """
+        Creates a fitted transformer from bounds learned previously, so they are reused instead of recomputed.
+
+        Returns:
+            IQR_DropOutliers: The fitted transformer.
+        """
+        iqr_dropoutliers = cls(features=list(features), n=n)
+        iqr_dropoutliers.lower_bounds_ = np.asarray(lower_bounds, dtype=np.float64)
+        iqr_dropoutliers.upper_bounds_ = np.asarray(upper_bounds, dtype=np.float64)
+        return iqr_dropoutliers
+
     def fit(self, X, y=None):
         """
-        This method does not perform any actual training or fitting.
-        It returns the transformer instance itself.
+        Learns the Tukey bounds of every feature: 1st and 3rd quartiles of all features come from one vectorized call.
 
         Parameters:
-            X (pd.DataFrame): Input data to be transformed. Not used in this method.
+            X (pd.DataFrame or MaskedFrame): Input data used to learn the bounds.
 
         Returns:
             self (IQR_DropOutliers): The transformer instance.
         """
+        if isinstance(X, MaskedFrame):
+            values = X.selected(self.features)
+        else:
+            values = feature_matrix(X, self.features)
+        Q1, Q3 = np.quantile(values, [0.25, 0.75], axis=0)              # 1st and 3rd quartiles of every feature
+        outlier_step = 1.5 * (Q3 - Q1)                                  # Outlier step from the interquartile range (IQR)
+        self.lower_bounds_ = Q1 - outlier_step
+        self.upper_bounds_ = Q3 + outlier_step
         return self
 
-    def transform(self, X):
+    def partial_fit(self, X, y=None):
         """
-        identifies outliers in the list of features to drop them from input dataframe and returns the modified dataframe.
+        Streaming counterpart of fit: adds a chunk of the data to one mergeable quantile sketch per feature, and updates
+        the bounds from the sketches. The bounds equal those of fit on the concatenated chunks while the sketches are exact.
 
         Parameters:
-            X (pd.DataFrame): Input data to be transformed.
+            X (pd.DataFrame or MaskedFrame): Chunk of the input data.
 
         Returns:
-            X_transformed (pd.DataFrame): Transformed DataFrame without outliers.
+            self (IQR_DropOutliers): The transformer instance.
         """
+        values = X.selected(self.features) if isinstance(X, MaskedFrame) else feature_matrix(X, self.features)
+        if not hasattr(self, 'sketches_'):
+            self.sketches_ = [QuantileSketch() for _ in self.features]
+        for sketch, column in zip(self.sketches_, values.T):
+            sketch.update(column)
+
+        Q1, Q3 = np.array([sketch.quantile([0.25, 0.75]) for sketch in self.sketches_]).T
+        outlier_step = 1.5 * (Q3 - Q1)
+        self.lower_bounds_ = Q1 - outlier_step
+        self.upper_bounds_ = Q3 + outlier_step
+        return self
 
-        outliers_index_list = []
-        for feature in self.features:
-            Q1 = np.percentile(X[feature], 25)      # 1st quartile (25%)
-            Q3 = np.percentile(X[feature], 75)      # 3rd quartile (75%)
-            IQR = Q3 - Q1                           # Interquartile range (IQR)
-            outlier_step = 1.5 * IQR                # Outlier step for the current feature
-            outlier_index_list = X[(X[feature] < Q1 - outlier_step) | (X[feature] > Q3 + outlier_step)].index   # Determining a list of indices of outliers
-            outliers_index_list.extend(outlier_index_list)                                                      # appending the list of outliers
+    def transform(self, X):
+        """
+        identifies outliers in the list of features with the fitted bounds to drop them from input dataframe and returns the modified dataframe.
 
-        # Selecting observations containing more than n outliers
-        outlier_index_counts = Counter(outliers_index_list)
-        outlieres_list = list(k for k, v in outlier_index_counts.items() if v > self.n)
+        Parameters:
+            X (pd.DataFrame or MaskedFrame): Input data to be transformed.
 
-        # Droping outliers found
-        X = X.drop(outlieres_list, axis=0).reset_index(drop=True)
+        Returns:
+            X_transformed (pd.DataFrame): Transformed DataFrame without outliers.
+        """
+        values = X.values(self.features) if isinstance(X, MaskedFrame) else feature_matrix(X, self.features)
+
+        # Number of features out of bounds in every record, selecting the ones with at most n outliers
+        outlier_counts = ((values < self.lower_bounds_) | (values > self.upper_bounds_)).sum(axis=1)
+        if isinstance(X, MaskedFrame):
+            return X.select(outlier_counts <= self.n)
+        X = X[outlier_counts <= self.n].reset_index(drop=True)
 
         return X
 
@@ -193,7 +550,7 @@ class DropMissing (BaseEstimator, TransformerMixin):
         This transformer does not need parameters.
 
     Attributes:
-        This transformer does not need attributes.
+        nans_list (list): Index of the records dropped by the last call to transform.
 
     Methods:
         fit(X):
@@ -245,6 +602,15 @@ class DropMissing (BaseEstimator, TransformerMixin):
         """
         return self
 
+    def partial_fit(self, X, y=None):
+        """
+        Streaming counterpart of fit, called with every chunk of the data. Nothing is learned.
+
+        Returns:
+            self (DropMissing): The transformer instance.
+        """
+        return self
+
     def transform(self, X):
         """
         Based on missing values indicators identifies records with NA values to drop them from input dataframe and returns the modified dataframe.
@@ -255,6 +621,12 @@ class DropMissing (BaseEstimator, TransformerMixin):
         Returns:
             X_transformed (pd.DataFrame): Transformed DataFrame without missing values records and whitout missing indicator variables.
         """
+        if isinstance(X, MaskedFrame):
+            if X.missing is None:
+                return X
+            complete = ~X.missing.any(axis=1)
+            self.nans_list = list(np.flatnonzero(X.mask & ~complete))
+            return X.select(complete)
 
         nans_index_list = []
         nan_columns = [col for col in X.columns if 'nan' in col]
@@ -266,7 +638,6 @@ class DropMissing (BaseEstimator, TransformerMixin):
         # Selecting observations containing missing values
         nan_index_counts = Counter(nans_index_list)
         self.nans_list = list(k for k, v in nan_index_counts.items() if v > 0)
-        print(self.nans_list)
 
         # Droping records with missing found
         X = X.drop(self.nans_list, axis=0).reset_index(drop=True)
@@ -365,14 +736,18 @@ class Standard_Scaler(BaseEstimator, TransformerMixin):
     Attributes:
         features (list): List of column names (features) to perform StandardScaler.
         target (str): Name of the target feature which is not going to be transformed.
+        standard_scaler (StandardScaler): Scaler fitted on the features, holds the learned mean and scale.
 
     Methods:
         fit(X, y=None):
-            This method does not perform any actual training or fitting.
+            Learns the mean and scale of every feature.
             It returns the transformer instance itself.
 
+        partial_fit(X, y=None):
+            Updates the mean and scale of every feature with a chunk of the data.
+
         transform(X):
-            Transforms features using StandardScaler, except on target feature.
+            Transforms features using the fitted StandardScaler, except on target feature.
             Returns the modified DataFrame.
 
     Example usage:
@@ -405,34 +780,65 @@ class Standard_Scaler(BaseEstimator, TransformerMixin):
         self.features = [features] if not isinstance(features, list) else features
         self.target = target
 
-    def fit(self, X):
+    def fit(self, X, y=None):
         """
-        This method does not perform any actual training or fitting.
-        It returns the transformer instance itself.
+        Learns the mean and scale of the specified features, so the same scaling is reused at inference time.
 
         Parameters:
-            X (pd.DataFrame): Input data to be transformed.
+            X (pd.DataFrame or MaskedFrame): Input data used to fit the scaler.
+
+        Returns:
+            self (Standard_Scaler): The transformer instance.
+        """
+        self.standard_scaler = StandardScaler()
+        if isinstance(X, MaskedFrame):
+            self.standard_scaler.fit(X.selected(self.features))
+        else:
+            self.standard_scaler.fit(X[self.features])
+        return self
+
+    def partial_fit(self, X, y=None):
+        """
+        Streaming counterpart of fit: updates the mean and variance of the features with a chunk of the data
+        (incremental algorithm of StandardScaler.partial_fit).
+
+        Parameters:
+            X (pd.DataFrame or MaskedFrame): Chunk of the input data.
 
         Returns:
             self (Standard_Scaler): The transformer instance.
         """
+        if not hasattr(self, 'standard_scaler'):
+            self.standard_scaler = StandardScaler()
+        values = X.selected(self.features) if isinstance(X, MaskedFrame) else feature_matrix(X, self.features)
+        if len(values):
+            self.standard_scaler.partial_fit(values)
         return self
 
     def transform(self, X):
         """
-        Performs Standard_Scaler for the specified features and returns the modified DataFrame.
+        Performs Standard_Scaler for the specified features with the fitted mean and scale, and returns the modified DataFrame.
 
         Parameters:
-            X (pd.DataFrame): Input data to be transformed.
+            X (pd.DataFrame or MaskedFrame): Input data to be transformed. The target feature is kept unchanged if present.
+                A MaskedFrame is turned back into a DataFrame holding its selected rows.
 
         Returns:
             X_transformed (pd.DataFrame): Transformed DataFrame.
         """
+        if isinstance(X, MaskedFrame):
+            # Selected rows are materialized once, and scaled in place
+            X_features_transformed = pd.DataFrame(self.standard_scaler.transform(X.selected(self.features), copy=False), columns=self.features)
+            if self.target in X.data.columns:
+                X_features_transformed[self.target] = X.data[self.target].to_numpy()[X.mask]
+            return X_features_transformed
 
-        self.standard_scaler = StandardScaler()
         X = X.copy()
-        X_features_transformed = pd.DataFrame(self.standard_scaler.fit_transform(X[self.features]))
+        X_features_transformed = pd.DataFrame(self.standard_scaler.transform(X[self.features]), index=X.index)
         X_features_transformed.columns = self.features
-        X = pd.concat([X_features_transformed, X[self.target]], axis=1)
+        if self.target in X.columns:
+            X = pd.concat([X_features_transformed, X[self.target]], axis=1)
+        else:
+            X = X_features_transformed
 
         return X
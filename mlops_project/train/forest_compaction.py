@@ -0,0 +1,231 @@
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+from predictor.flat_forest import FlatForest
+from sklearn import metrics
+
+# Markers sklearn trees use on leaves (sklearn.tree._tree.TREE_LEAF and TREE_UNDEFINED)
+TREE_LEAF = -1
+TREE_UNDEFINED = -2
+
+COMPACTION_METRICS = ('rmse', 'r2')
+
+
+def truncate_tree(estimator, max_depth):
+    """
+    Returns a copy of a fitted regression tree cut at max_depth.
+
+    Nodes at max_depth become leaves predicting the mean target of the training samples that reached them (the value
+    sklearn already stores on every node), and the nodes below them are removed, so the tree is smaller as well as
+    shallower. Trees no deeper than max_depth are returned as they are.
+
+    Parameters:
+        estimator (DecisionTreeRegressor): Fitted tree, e.g. one of the estimators_ of a RandomForestRegressor.
+        max_depth (int, optional): Depth of the truncated tree, None keeps the whole tree.
+
+    Returns:
+        DecisionTreeRegressor: The truncated tree.
+    """
+    state = estimator.tree_.__getstate__()
+    if max_depth is None or state['max_depth'] <= max_depth:
+        return estimator
+    nodes = state['nodes']
+    left, right = nodes['left_child'], nodes['right_child']
+
+    # Nodes down to max_depth, level by level from the root
+    depth = np.full(len(nodes), -1, dtype=np.intp)
+    level = np.array([0], dtype=np.intp)
+    for current_depth in range(max_depth + 1):
+        depth[level] = current_depth
+        internal = level[left[level] != TREE_LEAF]
+        level = np.concatenate([left[internal], right[internal]])
+
+    # Kept in their original (depth-first) order, and renumbered
+    kept = np.flatnonzero(depth >= 0)
+    new_index = np.full(len(nodes), TREE_LEAF, dtype=np.intp)
+    new_index[kept] = np.arange(len(kept))
+    new_nodes = nodes[kept].copy()
+    is_internal = new_nodes['left_child'] != TREE_LEAF
+    cut = is_internal & (depth[kept] == max_depth)
+    internal = is_internal & ~cut
+    new_nodes['left_child'][internal] = new_index[new_nodes['left_child'][internal]]
+    new_nodes['right_child'][internal] = new_index[new_nodes['right_child'][internal]]
+    new_nodes['left_child'][cut] = TREE_LEAF
+    new_nodes['right_child'][cut] = TREE_LEAF
+    new_nodes['feature'][cut] = TREE_UNDEFINED
+    new_nodes['threshold'][cut] = TREE_UNDEFINED
+
+    truncated = copy.deepcopy(estimator)
+    truncated.tree_.__setstate__(dict(state, max_depth=max_depth, node_count=len(kept), nodes=new_nodes, values=state['values'][kept]))
+    return truncated
+
+
+def _score(metric, y_true, y_pred):
+    if metric == 'rmse':
+        return float(np.sqrt(metrics.mean_squared_error(y_true, y_pred)))
+    return float(metrics.r2_score(y_true, y_pred))
+
+
+def _latency_ms(forest, X, repeat):
+    # Median time of the flattened engine, which serves single rows and small batches
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        forest.predict(X)
+        latencies.append(time.perf_counter() - start)
+    return 1000 * float(np.median(latencies))
+
+
+class ForestCompactor:
+    """
+    Compacts a fitted Random Forest: selects the fewest (optionally depth-truncated) trees whose average stays within
+    a tolerance of the validation accuracy of the whole forest.
+
+    For every depth in max_depths, every tree is truncated to that depth and the trees are ordered greedily on part of
+    the validation rows: starting from an empty ensemble, the tree that most improves the error of the average is added
+    next. The shortest prefix of that order within tolerance of the whole forest on the remaining rows is kept. Among
+    the depths that reach the tolerance, the compacted forest with the lowest inference cost is kept, i.e. the fewest
+    trees x levels evaluated per row by the flattened engine.
+
+    Trees are selected on the validation set, so it must not be the data used to fit the forest, and the final accuracy
+    of the compacted forest should be measured on other data (e.g. the test set).
+
+    Parameters:
+        tolerance (float): Accuracy that may be lost. With metric 'rmse', the relative increase of the validation RMSE
+            (0.01 = 1% higher); with metric 'r2', the absolute decrease of the validation R2 (0.01 = 0.01 lower).
+        metric (str): 'rmse' or 'r2'.
+        max_depths (list of int): Depths the trees may be truncated to; None keeps them whole. Default is (None,).
+        selection_size (float): Fraction of the validation rows the trees are ordered on; the number of trees kept is
+            the smallest within tolerance on the other rows.
+        random_state (int): Seed of the split of the validation rows.
+        repeat (int): Timed runs of the latency measurements (the median is reported).
+
+    Attributes:
+        candidates_ (DataFrame): One row per depth tried, with the number of trees selected, whether it reached the
+            tolerance, its validation RMSE and R2, and its cost.
+        selected_trees_ (list of int): Indices of the trees kept, in the order they were selected.
+        max_depth_ (int): Depth the kept trees were truncated to, None if they are whole.
+        model_ (RandomForestRegressor): The compacted forest.
+        report_ (DataFrame): The full and the compacted forest: trees, nodes, depth, validation RMSE and R2, size of
+            the flattened node arrays, single-row and batch latency of the flattened engine, and the percentage saved
+            ('saved %' row).
+
+    Methods:
+        fit(model, X_val, y_val): Compacts the forest and returns the report.
+    """
+
+    def __init__(self, tolerance=0.01, metric='rmse', max_depths=(None,), selection_size=0.5, random_state=None, repeat=20):
+        if metric not in COMPACTION_METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {list(COMPACTION_METRICS)}.")
+        if tolerance < 0:
+            raise ValueError("tolerance must be positive.")
+        self.tolerance = tolerance
+        self.metric = metric
+        self.max_depths = list(max_depths)
+        self.selection_size = selection_size
+        self.random_state = random_state
+        self.repeat = repeat
+
+    def _within_tolerance(self, score, full_score):
+        if self.metric == 'rmse':
+            return score <= full_score * (1 + self.tolerance)
+        return score >= full_score - self.tolerance
+
+    def _order(self, tree_predictions, y):
+        # Greedy forward selection: the sum of the selected trees' predictions is kept, and every remaining tree is
+        # tried as the next one at once, as a column of the (rows x trees) matrix
+        order, remaining = [], np.arange(tree_predictions.shape[1])
+        total = np.zeros(len(y))
+        while len(remaining):
+            averages = (total[:, np.newaxis] + tree_predictions[:, remaining]) / (len(order) + 1)
+            best = remaining[np.argmin(((averages - y[:, np.newaxis]) ** 2).sum(axis=0))]
+            order.append(int(best))
+            remaining = remaining[remaining != best]
+            total += tree_predictions[:, best]
+        return order
+
+    def _select(self, tree_predictions, y_val, full_predictions):
+        # Trees are ordered on part of the validation rows, and the number kept is chosen on the others: choosing
+        # both on the same rows overfits them, a handful of trees can match the whole forest there and not elsewhere
+        rng = np.random.default_rng(self.random_state)
+        rows = rng.permutation(len(y_val))
+        n_order = min(max(1, int(round(self.selection_size * len(y_val)))), len(y_val) - 1)
+        order = self._order(tree_predictions[rows[:n_order]], y_val[rows[:n_order]])
+
+        stop = rows[n_order:]
+        full_score = _score(self.metric, y_val[stop], full_predictions[stop])
+        averages = np.cumsum(tree_predictions[stop][:, order], axis=1) / np.arange(1, len(order) + 1)
+        within = np.array([self._within_tolerance(_score(self.metric, y_val[stop], averages[:, n]), full_score) for n in range(len(order))])
+        # Kept from the point where adding more trees stays within tolerance, not at a lucky dip of a few trees:
+        # within[n] is the prefix of n + 1 trees, the first one after the last prefix out of tolerance is kept
+        if not within[-1]:
+            return order, False
+        n_trees = len(within) - int(np.argmin(within[::-1])) + 1 if not within.all() else 1
+        return order[:n_trees], True
+
+    def fit(self, model, X_val, y_val):
+        """
+        Compacts the forest.
+
+        Parameters:
+            model (RandomForestRegressor): Fitted forest. It is not modified.
+            X_val (pandas.DataFrame or numpy.ndarray): Preprocessed validation features, not used to fit the model.
+            y_val (pandas.Series or numpy.ndarray): Validation target.
+
+        Returns:
+            report_ (DataFrame): The full and the compacted forest compared.
+        """
+        X_val = np.ascontiguousarray(X_val, dtype=np.float32)
+        y_val = np.asarray(y_val, dtype=np.float64)
+        full_predictions = np.mean([estimator.predict(X_val) for estimator in model.estimators_], axis=0)
+
+        candidates, best = [], None
+        for max_depth in self.max_depths:
+            trees = [truncate_tree(estimator, max_depth) for estimator in model.estimators_]
+            tree_predictions = np.column_stack([tree.predict(X_val) for tree in trees])
+            selected, feasible = self._select(tree_predictions, y_val, full_predictions)
+            y_pred = tree_predictions[:, selected].mean(axis=1)
+            depth = max(trees[index].tree_.max_depth for index in selected)
+            candidate = {'max_depth': max_depth, 'n_trees': len(selected), 'within_tolerance': feasible,
+                         'val_rmse': _score('rmse', y_val, y_pred), 'val_r2': _score('r2', y_val, y_pred),
+                         'cost': len(selected) * depth}
+            candidates.append(candidate)
+            if feasible and (best is None or candidate['cost'] < best[0]['cost']):
+                best = (candidate, selected, trees)
+
+        self.candidates_ = pd.DataFrame(candidates)
+        if best is None:
+            # Only truncated trees were tried and none reached the tolerance: the forest is kept whole
+            best = ({'max_depth': None}, list(range(len(model.estimators_))), model.estimators_)
+        candidate, self.selected_trees_, trees = best
+        self.max_depth_ = candidate['max_depth']
+
+        # Out-of-bag estimates of the whole forest do not apply to the compacted one
+        self.model_ = copy.copy(model)
+        for attribute in ('oob_score_', 'oob_prediction_'):
+            self.model_.__dict__.pop(attribute, None)
+        self.model_.estimators_ = [trees[index] for index in self.selected_trees_]
+        self.model_.set_params(n_estimators=len(self.model_.estimators_))
+
+        rows = [self._describe('full', model, X_val, y_val), self._describe('compacted', self.model_, X_val, y_val)]
+        self.report_ = pd.DataFrame(rows).set_index('model')
+        for column in ('n_trees', 'n_nodes', 'forest_bytes', 'predict_latency_ms', 'batch_latency_ms'):
+            self.report_.loc['saved %', column] = 100 * (1 - self.report_.loc['compacted', column] / self.report_.loc['full', column])
+        return self.report_
+
+    def _describe(self, name, model, X_val, y_val):
+        forest = FlatForest.from_estimator(model)
+        y_pred = forest.predict(X_val)
+        return {
+            'model': name,
+            'n_trees': forest.n_trees,
+            'n_nodes': forest.n_nodes,
+            'max_depth': forest.max_depth,
+            'val_rmse': _score('rmse', y_val, y_pred),
+            'val_r2': _score('r2', y_val, y_pred),
+            'forest_bytes': forest.nbytes,
+            'predict_latency_ms': _latency_ms(forest, X_val[:1], self.repeat),
+            'batch_latency_ms': _latency_ms(forest, X_val, max(1, self.repeat // 4)),
+        }
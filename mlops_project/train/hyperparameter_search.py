@@ -0,0 +1,134 @@
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn import metrics
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import ParameterGrid, train_test_split
+
+
+def _grow_and_score(candidate, n_estimators, X_fit, y_fit, X_val, y_val):
+    # Adds trees to the candidate's forest (warm start) up to n_estimators, then scores it on the validation set
+    model = candidate['model']
+    model.set_params(n_estimators=n_estimators)
+    start = time.perf_counter()
+    model.fit(X_fit, y_fit)
+    candidate['fit_time_s'] += time.perf_counter() - start
+
+    y_pred = model.predict(X_val)
+    latencies = []
+    for _ in range(5):
+        start = time.perf_counter()
+        model.predict(X_val[:1])
+        latencies.append(time.perf_counter() - start)
+
+    candidate['n_estimators'] = n_estimators
+    candidate['predict_latency_ms'] = 1000 * float(np.median(latencies))
+    candidate['val_r2'] = metrics.r2_score(y_val, y_pred)
+    candidate['val_rmse'] = float(np.sqrt(metrics.mean_squared_error(y_val, y_pred)))
+    return candidate
+
+
+class SuccessiveHalvingSearch:
+    """
+    Successive halving search of Random Forest hyperparameters, growing forests with warm start.
+
+    Every configuration of the grid starts with min_estimators trees. After each rung only the best
+    1/factor configurations (by validation R2) are kept, and their forests grow factor times larger by
+    adding trees to the ones already fitted (warm_start) instead of refitting from scratch. Candidates of
+    a rung are fitted concurrently in threads sharing one preprocessed dataset.
+
+    Parameters:
+        param_grid (dict or list of dicts): RandomForestRegressor parameters to try, as in sklearn's ParameterGrid.
+            'n_estimators' is the budget managed by the search and must not be included.
+        min_estimators (int): Number of trees of every configuration at the first rung.
+        max_estimators (int): Maximum number of trees of a configuration.
+        factor (int): Fraction of candidates kept (1/factor) and growth of the forests at every rung.
+        validation_size (float): Fraction of the training data held out to rank candidates.
+        random_state (int): Seed for the validation split and the forests.
+        n_workers (int, optional): Number of candidates fitted concurrently. Default is the number of CPUs.
+
+    Attributes:
+        leaderboard_ (DataFrame): One row per configuration with the rung it reached, its number of trees,
+            cumulative fit time, single-row predict latency and validation accuracy, best first.
+        history_ (DataFrame): One row per configuration and rung.
+        best_params_ (dict): Parameters (including n_estimators) of the best configuration of the last rung.
+        best_model_ (RandomForestRegressor): Forest of the best configuration.
+
+    Methods:
+        fit(X, y): Runs the search and returns the leaderboard.
+    """
+
+    def __init__(self, param_grid, min_estimators=10, max_estimators=200, factor=3, validation_size=0.2, random_state=None, n_workers=None):
+        if factor < 2:
+            raise ValueError("factor must be at least 2.")
+        self.param_grid = param_grid
+        self.min_estimators = min_estimators
+        self.max_estimators = max_estimators
+        self.factor = factor
+        self.validation_size = validation_size
+        self.random_state = random_state
+        self.n_workers = n_workers or os.cpu_count() or 1
+
+    def fit(self, X, y):
+        """
+        Runs the search.
+
+        Parameters:
+            X (pandas.DataFrame or numpy.ndarray): Preprocessed training features.
+            y (pandas.Series or numpy.ndarray): Training target.
+
+        Returns:
+            leaderboard_ (DataFrame): Configurations ranked, best first.
+        """
+        # One float32 copy of the data, read by every candidate
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        y = np.ascontiguousarray(y, dtype=np.float64)
+        X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=self.validation_size, random_state=self.random_state)
+
+        candidates = []
+        for params in ParameterGrid(self.param_grid):
+            if 'n_estimators' in params:
+                raise ValueError("'n_estimators' is the resource of the search and cannot be part of param_grid.")
+            model = RandomForestRegressor(**params, warm_start=True, random_state=self.random_state, n_jobs=1)
+            candidates.append({'params': params, 'model': model, 'fit_time_s': 0.0})
+
+        history = []
+        alive = candidates
+        n_estimators = self.min_estimators
+        rung = 0
+        parallel = Parallel(n_jobs=self.n_workers, backend='threading')
+        while True:
+            alive = parallel(delayed(_grow_and_score)(candidate, n_estimators, X_fit, y_fit, X_val, y_val) for candidate in alive)
+            for candidate in alive:
+                candidate['rung'] = rung
+                history.append(self._row(candidate))
+
+            alive = sorted(alive, key=lambda candidate: candidate['val_r2'], reverse=True)
+            if len(alive) == 1 or n_estimators >= self.max_estimators:
+                break
+            alive = alive[:max(1, math.ceil(len(alive) / self.factor))]
+            n_estimators = min(n_estimators * self.factor, self.max_estimators)
+            rung += 1
+
+        self.history_ = pd.DataFrame(history)
+        leaderboard = pd.DataFrame([self._row(candidate) for candidate in candidates])
+        self.leaderboard_ = leaderboard.sort_values(['rung', 'val_r2'], ascending=[False, False]).reset_index(drop=True)
+        self.best_model_ = alive[0]['model']
+        self.best_params_ = dict(alive[0]['params'], n_estimators=alive[0]['n_estimators'])
+        return self.leaderboard_
+
+    @staticmethod
+    def _row(candidate):
+        return {
+            'params': candidate['params'],
+            'rung': candidate['rung'],
+            'n_estimators': candidate['n_estimators'],
+            'fit_time_s': candidate['fit_time_s'],
+            'predict_latency_ms': candidate['predict_latency_ms'],
+            'val_r2': candidate['val_r2'],
+            'val_rmse': candidate['val_rmse'],
+        }
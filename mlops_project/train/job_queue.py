@@ -0,0 +1,249 @@
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+EXECUTORS = ('processes', 'threads')
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a training job when its cancellation was requested.
+    """
+
+
+def run_training_job(job_id, spec, progress, cancelled):
+    """
+    Trains a model from the dataset, as mlops_project.py does, and persists it to spec['output_path'].
+
+    Runs in a worker of the job queue. Progress is reported through the shared 'progress' mapping, and the
+    'cancelled' mapping is checked between phases.
+
+    Parameters:
+        job_id (str): Identifier of the job.
+        spec (dict): Training specification: data_path, features, target, n, seed_model, seed_split, test_size,
+            evaluation, model_params, n_workers, output_path and model_format.
+        progress (dict-like): Mapping job_id -> (fraction done, current phase), shared with the queue.
+        cancelled (dict-like): Mapping job_id -> True for jobs whose cancellation was requested.
+
+    Returns:
+        dict: Evaluation scores, phase times and path of the persisted model.
+    """
+    # Imported here: the queue itself is light, only workers need the training stack
+    from load.load_data import DataRetriever
+    from sklearn.model_selection import train_test_split
+    from train.train_data import HousepricingDataPipeline
+    from train.training_engine import TrainingEngine
+
+    def step(fraction, phase):
+        if cancelled.get(job_id):
+            raise JobCancelled(f"Job {job_id} was cancelled.")
+        progress[job_id] = (fraction, phase)
+
+    step(0.0, 'loading data')
+    datasets_dir, data_file = os.path.split(spec['data_path'])
+    raw_df = DataRetriever([datasets_dir + os.sep, None, None, data_file]).load_data()
+
+    step(0.1, 'preprocessing')
+    housepricing_pipeline = HousepricingDataPipeline(features=spec['features'], target=spec['target'], n=spec['n'], seed_model=spec['seed_model'],
+                                                     engine=TrainingEngine(executor='threads', n_workers=spec['n_workers']),
+                                                     evaluation=spec['evaluation'], model_params=spec['model_params'])
+    housepricing_pipeline.create_pipeline()
+    df_transformed = housepricing_pipeline.PIPELINE.fit_transform(raw_df)
+    X_train, X_test, y_train, y_test = train_test_split(df_transformed.drop(spec['target'], axis=1), df_transformed[spec['target']],
+                                                        test_size=spec['test_size'], random_state=spec['seed_split'])
+
+    step(0.3, 'training')
+    housepricing_pipeline.fit_random_forest(X_train=X_train, y_train=y_train)
+
+    step(0.6, 'evaluating')
+    housepricing_pipeline.predict(X_test=X_test)
+    scores_df = housepricing_pipeline.get_evaluation_metrics(y_test=y_test)
+
+    step(0.9, 'persisting')
+    output_dir, output_file = os.path.split(spec['output_path'])
+    housepricing_pipeline.persist_model(trained_model_dir=output_dir + os.sep, file_save_name=output_file, model_format=spec['model_format'])
+
+    progress[job_id] = (1.0, 'done')
+    return {
+        'scores': scores_df.to_dict(orient='records')[0],
+        'phase_times': housepricing_pipeline.engine.phase_times,
+        'artifact_path': spec['output_path'],
+    }
+
+
+class TrainingJobQueue:
+    """
+    Runs training jobs in the background, out of the request path, with a bounded number of concurrent jobs.
+
+    Submitted jobs wait in the executor queue until one of max_concurrent_jobs workers is free. With the
+    'processes' executor each job runs in a separate process, so CPU-heavy training does not compete for the
+    GIL with the process that submitted it (e.g. the API); 'threads' runs jobs locally in the same process.
+    Every job has an id, a status ('queued', 'running', 'succeeded', 'failed' or 'cancelled') and a progress
+    fraction. Queued jobs are cancelled immediately; running jobs stop at their next phase boundary.
+
+    Parameters:
+        max_concurrent_jobs (int): Maximum number of jobs running at the same time.
+        executor (str): 'processes' or 'threads'. Default is 'processes'.
+        on_success (callable, optional): Called with the job dictionary when a job succeeds, e.g. to publish its model.
+        max_finished_jobs (int): Number of finished jobs kept, the oldest ones are forgotten beyond it. Default is 100.
+
+    Methods:
+        submit(spec): Queues a training job and returns its id.
+        get(job_id): Returns the status of a job.
+        list(): Returns the status of every job.
+        cancel(job_id): Requests the cancellation of a job.
+        shutdown(): Stops the workers, cancelling queued jobs.
+    """
+
+    def __init__(self, max_concurrent_jobs=1, executor='processes', on_success=None, max_finished_jobs=100):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor '{executor}', expected one of {list(EXECUTORS)}.")
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.executor = executor
+        self.on_success = on_success
+        self.max_finished_jobs = max_finished_jobs
+
+        self._jobs = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._manager = None
+        self._progress = None
+        self._cancelled = None
+
+    def _start(self):
+        # Workers (and the manager process sharing progress with them) start with the first job
+        if self._pool is not None:
+            return
+        if self.executor == 'processes':
+            context = multiprocessing.get_context('spawn')
+            self._manager = context.Manager()
+            self._progress = self._manager.dict()
+            self._cancelled = self._manager.dict()
+            self._pool = ProcessPoolExecutor(max_workers=self.max_concurrent_jobs, mp_context=context)
+        else:
+            self._progress = {}
+            self._cancelled = {}
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent_jobs, thread_name_prefix='training-job')
+
+    def submit(self, spec):
+        """
+        Queues a training job.
+
+        Parameters:
+            spec (dict): Training specification, see run_training_job. '{job_id}' in output_path is replaced by the job id.
+
+        Returns:
+            str: Id of the job.
+        """
+        job_id = uuid.uuid4().hex
+        spec = dict(spec, output_path=spec['output_path'].format(job_id=job_id))
+        with self._lock:
+            self._start()
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'spec': spec,
+                'submitted_at': time.time(),
+                'finished_at': None,
+                'result': None,
+                'error': None,
+            }
+            future = self._pool.submit(run_training_job, job_id, spec, self._progress, self._cancelled)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda future: self._finish(job_id, future))
+        return job_id
+
+    def _finish(self, job_id, future):
+        job = self._jobs[job_id]
+        try:
+            self._record_outcome(job, future)
+        finally:
+            job['finished_at'] = time.time()
+            self._prune()
+
+    def _record_outcome(self, job, future):
+        if future.cancelled():
+            job['status'] = 'cancelled'
+            return
+        error = future.exception()
+        if isinstance(error, JobCancelled):
+            job['status'] = 'cancelled'
+        elif error is not None:
+            job['status'] = 'failed'
+            job['error'] = ''.join(traceback.format_exception_only(type(error), error)).strip()
+        else:
+            job['result'] = future.result()
+            job['status'] = 'succeeded'
+            if self.on_success is not None:
+                try:
+                    self.on_success(dict(job))
+                except Exception as error:
+                    job['status'] = 'failed'
+                    job['error'] = "Model could not be published: " + repr(error)
+
+    def _prune(self):
+        # Forgets the oldest finished jobs beyond max_finished_jobs, so a long-running API does not grow forever
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job['status'] in FINISHED_STATUSES]
+            for job_id in finished[:max(len(finished) - self.max_finished_jobs, 0)]:
+                del self._jobs[job_id]
+                self._futures.pop(job_id, None)
+                self._progress.pop(job_id, None)
+                self._cancelled.pop(job_id, None)
+
+    def get(self, job_id):
+        """
+        Returns the status of a job, or None if the id is unknown.
+
+        Returns:
+            dict: id, status, progress (fraction), phase, timestamps, result and error.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job = dict(job)
+        fraction, phase = self._progress.get(job_id, (0.0, None)) if self._progress is not None else (0.0, None)
+        if job['status'] == 'queued' and phase is not None:
+            job['status'] = 'running'
+        job['progress'] = fraction
+        job['phase'] = phase
+        return job
+
+    def list(self):
+        """
+        Returns the status of every job, in submission order.
+        """
+        return [self.get(job_id) for job_id in list(self._jobs)]
+
+    def cancel(self, job_id):
+        """
+        Requests the cancellation of a job.
+
+        Returns:
+            bool: False if the job is unknown or already finished.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return False
+        self._cancelled[job_id] = True
+        self._futures[job_id].cancel()          # Only succeeds while the job is still queued
+        return True
+
+    def shutdown(self, wait=False):
+        """
+        Stops the workers, cancelling queued jobs.
+        """
+        if self._pool is not None:
+            for job_id in list(self._jobs):
+                self.cancel(job_id)
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
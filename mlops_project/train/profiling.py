@@ -0,0 +1,276 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+PROFILED_METHODS = ('fit', 'partial_fit', 'transform', 'fit_transform')
+
+
+def data_shape(data):
+    """
+    Rows and columns of the data a stage receives or returns, or (None, None) if it is not tabular.
+
+    A MaskedFrame counts its selected rows and the columns of the DataFrame it carries.
+    """
+    if hasattr(data, 'mask') and hasattr(data, 'data'):
+        return len(data), data.data.shape[1]
+    shape = getattr(data, 'shape', None)
+    if shape is None or len(shape) == 0:
+        return None, None
+    return int(shape[0]), (int(shape[1]) if len(shape) > 1 else 1)
+
+
+class ProfileReport:
+    """
+    Stages recorded by a PipelineProfiler.
+
+    Parameters:
+        stages (list of dict): One entry per call, in the order calls finished, with the stage 'name', its 'parent' stage,
+            'start_s' (seconds since the profiler was created), 'wall_s', 'cpu_s', 'peak_memory_bytes' (None when memory
+            is not traced), 'rows_in', 'cols_in', 'rows_out', 'cols_out' and the 'thread' it ran in.
+
+    Attributes:
+        stages (list of dict): Recorded calls.
+
+    Methods:
+        summary(): Returns the calls aggregated by stage.
+        to_frame(): Returns the recorded calls as a DataFrame.
+        write_chrome_trace(path): Writes the calls as a Chrome trace (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def summary(self):
+        """
+        Aggregates the calls of every stage, in the order stages first started.
+
+        Returns:
+            list of dict: Stage 'name', number of 'calls', total 'wall_s' and 'cpu_s', maximum 'peak_memory_bytes',
+                and total rows in and out (the columns of the last call).
+        """
+        summary = {}
+        for stage in sorted(self.stages, key=lambda stage: stage['start_s']):
+            entry = summary.setdefault(stage['name'], {'name': stage['name'], 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_memory_bytes': None,
+                                                       'rows_in': None, 'cols_in': None, 'rows_out': None, 'cols_out': None})
+            entry['calls'] += 1
+            entry['wall_s'] += stage['wall_s']
+            entry['cpu_s'] += stage['cpu_s']
+            if stage['peak_memory_bytes'] is not None:
+                entry['peak_memory_bytes'] = max(entry['peak_memory_bytes'] or 0, stage['peak_memory_bytes'])
+            for key in ('rows_in', 'rows_out'):
+                if stage[key] is not None:
+                    entry[key] = (entry[key] or 0) + stage[key]
+            for key in ('cols_in', 'cols_out'):
+                if stage[key] is not None:
+                    entry[key] = stage[key]
+        return list(summary.values())
+
+    def to_frame(self):
+        return pd.DataFrame(self.stages)
+
+    def write_chrome_trace(self, path):
+        """
+        Writes the recorded calls in the Chrome trace event format, one complete event per call, nested by time.
+        """
+        events = [{'name': stage['name'], 'cat': 'training', 'ph': 'X', 'pid': os.getpid(), 'tid': stage['thread'],
+                   'ts': stage['start_s'] * 1e6, 'dur': stage['wall_s'] * 1e6,
+                   'args': {key: stage[key] for key in ('cpu_s', 'peak_memory_bytes', 'rows_in', 'cols_in', 'rows_out', 'cols_out')}}
+                  for stage in self.stages]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    def __str__(self):
+        lines = [f"{'stage':<40} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} {'rows in':>10} {'rows out':>10} {'cols':>9}"]
+        for entry in self.summary():
+            peak = f"{entry['peak_memory_bytes'] / 2**20:.1f}" if entry['peak_memory_bytes'] is not None else '-'
+            columns = f"{entry['cols_in'] if entry['cols_in'] is not None else '-'}>{entry['cols_out'] if entry['cols_out'] is not None else '-'}"
+            lines.append(f"{entry['name']:<40} {entry['calls']:>6} {entry['wall_s']:>9.3f} {entry['cpu_s']:>9.3f} {peak:>9} "
+                         f"{entry['rows_in'] if entry['rows_in'] is not None else '-':>10} {entry['rows_out'] if entry['rows_out'] is not None else '-':>10} {columns:>9}")
+        return '\n'.join(lines)
+
+
+class _ProfiledMethod:
+    # Replaces a method of a pipeline step while it is instrumented. A class rather than a closure, so the step can
+    # still be pickled or cloned by joblib.
+
+    def __init__(self, profiler, stage, method):
+        self.profiler = profiler
+        self.stage = stage
+        self.method = method
+
+    def __call__(self, X, *args, **kwargs):
+        with self.profiler.profile(self.stage, X) as record:
+            result = self.method(X, *args, **kwargs)
+            record.output(result)
+        return result
+
+
+class _StageRecord:
+    # Handle of the stage being profiled, used to attach the output size
+
+    def __init__(self):
+        self.rows_out, self.cols_out = None, None
+
+    def output(self, data):
+        self.rows_out, self.cols_out = data_shape(data)
+
+
+class PipelineProfiler:
+    """
+    Records wall time, CPU time, peak memory and rows/columns in and out of training stages.
+
+    Stages are recorded by the profile(stage, data) context manager, by pipeline steps while instrumented(pipeline)
+    is active (every fit, partial_fit, transform and fit_transform call of a step, named '<step>.<method>'), and by
+    HousepricingDataPipeline methods when the profiler is passed to it.
+
+    Peak memory is the highest memory allocated by Python and numpy during the stage, above what was allocated when
+    it started, measured with tracemalloc. Tracing slows allocations down, so it can be turned off. tracemalloc is
+    process wide: peaks are only meaningful when stages of a single pipeline run at a time.
+
+    Parameters:
+        trace_memory (bool): If True, peak memory of every stage is measured. Default is True.
+
+    Attributes:
+        stages (list of dict): Recorded calls (see ProfileReport).
+
+    Methods:
+        profile(stage, data): Context manager recording one call of a stage.
+        instrumented(pipeline): Context manager profiling every step of an sklearn Pipeline.
+        instrument(pipeline), restore(pipeline): Start and stop profiling the steps of a pipeline.
+        report(): Returns the ProfileReport of the calls recorded so far.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # Recorded stages are kept, the lock and the stacks of running stages are not
+        state = self.__dict__.copy()
+        del state['_lock'], state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def profile(self, stage, data=None):
+        """
+        Records one call of a stage.
+
+        Parameters:
+            stage (str): Name of the stage.
+            data (optional): Input of the stage, whose rows and columns are recorded.
+
+        Yields:
+            Handle whose output(data) method records the rows and columns the stage returns.
+        """
+        stack = self._stack()
+        trace_memory = self.trace_memory
+        frame = {'name': stage, 'peak': 0}
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                frame['started_tracing'] = True
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # The peak reached so far belongs to the enclosing stage, before it is reset for this one
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['base'] = frame['peak'] = current
+        stack.append(frame)
+        record = _StageRecord()
+        rows_in, cols_in = data_shape(data)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+            stack.pop()
+            peak_memory = None
+            if trace_memory:
+                frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                peak_memory = frame['peak'] - frame['base']
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], frame['peak'])
+                if frame.get('started_tracing'):
+                    tracemalloc.stop()
+            with self._lock:
+                self.stages.append({'name': stage, 'parent': stack[-1]['name'] if stack else None, 'start_s': start - self._origin,
+                                    'wall_s': wall, 'cpu_s': cpu, 'peak_memory_bytes': peak_memory,
+                                    'rows_in': rows_in, 'cols_in': cols_in, 'rows_out': record.rows_out, 'cols_out': record.cols_out,
+                                    'thread': threading.get_ident()})
+
+    def instrument(self, pipeline):
+        """
+        Profiles every step of an sklearn Pipeline, until restore(pipeline) is called.
+
+        Returns:
+            Pipeline: The same pipeline.
+        """
+        for name, step in pipeline.steps:
+            if step is None or step == 'passthrough':
+                continue
+            for method in PROFILED_METHODS:
+                if hasattr(step, method) and not isinstance(getattr(step, method), _ProfiledMethod):
+                    setattr(step, method, _ProfiledMethod(self, f'{name}.{method}', getattr(step, method)))
+        return pipeline
+
+    def restore(self, pipeline):
+        """
+        Stops profiling the steps of a pipeline instrumented with instrument(pipeline).
+        """
+        for name, step in pipeline.steps:
+            for method in PROFILED_METHODS:
+                if isinstance(getattr(step, '__dict__', {}).get(method), _ProfiledMethod):
+                    del step.__dict__[method]
+        return pipeline
+
+    @contextmanager
+    def instrumented(self, pipeline):
+        self.instrument(pipeline)
+        try:
+            yield pipeline
+        finally:
+            self.restore(pipeline)
+
+    def report(self):
+        with self._lock:
+            return ProfileReport(list(self.stages))
+
+
+def profiled(stage):
+    """
+    Decorator recording the calls of a method with the 'profiler' of its instance, when it has one.
+
+    The input size is taken from the first tabular positional argument, and the output size from the result.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, 'profiler', None)
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            data = next((value for value in list(args) + list(kwargs.values()) if data_shape(value)[0] is not None), None)
+            with profiler.profile(stage, data) as record:
+                result = method(self, *args, **kwargs)
+                record.output(result)
+            return result
+        return wrapper
+    return decorator
@@ -1,15 +1,66 @@
+import numbers
 import os
+import warnings
+from contextlib import nullcontext
 from pathlib import Path
 
 import joblib
 import numpy as np
 import pandas as pd
+from predictor.flat_forest import (COMPRESSION_CODECS, FlatForest,
+                                   is_forest_file, write_forest_file)
+from predictor.inference_artifact import (ARTIFACT_FORMAT, InferenceTransform,
+                                          build_inference_artifact,
+                                          is_inference_artifact)
 from preprocess.preprocess_data import (DropMissing, IQR_DropOutliers,
-                                        MissingIndicator, Standard_Scaler)
+                                        MaskedFrame, MissingIndicator, RowMask,
+                                        Standard_Scaler, feature_matrix)
 from sklearn import metrics
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import cross_val_score
 from sklearn.pipeline import Pipeline
+from train.forest_compaction import ForestCompactor
+from train.hyperparameter_search import SuccessiveHalvingSearch
+from train.profiling import profiled
+from train.training_engine import TrainingEngine
+
+# Set by fit_random_forest itself: they cannot be part of model_params
+RESERVED_MODEL_PARAMS = ('random_state', 'oob_score')
+
+
+def check_model_params(model_params, n_features=1):
+    """
+    Checks RandomForestRegressor parameters before they are used to train, e.g. in a background job.
+
+    Names are checked with set_params, and values by fitting a single tree on a single dummy row. The number of trees
+    and an integer max_samples are checked beforehand and reduced for that fit, which stays instantaneous.
+
+    Parameters:
+        model_params (dict): Parameters, on top of n_estimators=100.
+        n_features (int): Number of features the forest is trained on (e.g. the length of monotonic_cst).
+
+    Raises:
+        ValueError: If a parameter is unknown, reserved (RESERVED_MODEL_PARAMS) or has an invalid value.
+    """
+    reserved = sorted(set(model_params) & set(RESERVED_MODEL_PARAMS))
+    if reserved:
+        raise ValueError(f"Random Forest parameters {reserved} are set by the pipeline.")
+    model = RandomForestRegressor().set_params(**model_params)
+    if not _is_positive_integer(model.n_estimators):
+        raise ValueError(f"n_estimators must be a positive integer, got {model.n_estimators!r}.")
+    dummy_params = {'n_estimators': 1}
+    if _is_positive_integer(model.max_samples):
+        dummy_params['max_samples'] = 1
+    try:
+        # Warnings about fitting on a single row do not apply to the real data
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model.set_params(**dummy_params).fit(np.zeros((1, n_features)), np.ones(1))
+    except (TypeError, ValueError) as error:
+        raise ValueError(str(error))
+
+
+def _is_positive_integer(value):
+    return isinstance(value, numbers.Integral) and not isinstance(value, bool) and value >= 1
 
 
 class HousepricingDataPipeline:
@@ -30,22 +81,52 @@ class HousepricingDataPipeline:
         trained_model_dir (str): String with the path to store the trained model.
         file_save_name (str): String with the name of the model to be stored.
         scores_df (DataFrame): Dataframe with evaluation metrics.
+        engine (TrainingEngine): Executor used to build trees and run cross validation folds in parallel.
+        evaluation (str): How the generalization R2 is estimated: 'oob' uses the out-of-bag samples of the forest's own
+            bootstrap (no extra fits), 'cv' runs 10-fold cross validation (10 extra fits).
+        model_params (dict): RandomForestRegressor parameters used by fit_random_forest, on top of n_estimators=100.
+        search (SuccessiveHalvingSearch): Last hyperparameter search run by search_hyperparameters.
+        compactor (ForestCompactor): Last compaction run by compact_forest.
+        profiler (PipelineProfiler): If set, records time, memory and data sizes of every pipeline step and method call.
 
     Methods:
-        create_pipeline(): Creates and returns the House-pricing data processing pipeline.
+        create_pipeline(masked=False): Creates and returns the House-pricing data processing pipeline.
+        fit_transform(df): Fits the pipeline and transforms the data, profiling every step when a profiler is set.
+        fit_transform_chunks(): Fits and applies the pipeline streaming the data in chunks, into an on-disk matrix.
         fit_random_forest(): Creates Random Forest model fit and returns it.
+        compact_forest(): Keeps the fewest (optionally truncated) trees within an accuracy tolerance of the whole forest.
+        get_inference_artifact(): Bundles the model with the fitted preprocessing needed to score raw features.
+        load_model(): Loads a model persisted by persist_model.
+        update_model(): Grows the forest with trees fit on new labelled rows only.
     """
 
-    def __init__(self, features, target, n, seed_model):
+    EVALUATION_METHODS = {'oob': 'Out-of-bag', 'cv': '10-fold CV'}
+
+    def __init__(self, features, target, n, seed_model, engine=None, evaluation='oob', model_params=None, profiler=None):
+        if evaluation not in self.EVALUATION_METHODS:
+            raise ValueError(f"Unknown evaluation '{evaluation}', expected one of {list(self.EVALUATION_METHODS)}.")
         self.FEATURES = features
         self.TARGET = target
         self.n = n
         self.SEED_MODEL = seed_model
+        self.engine = engine if engine is not None else TrainingEngine()
+        self.evaluation = evaluation
+        check_model_params(model_params or {}, n_features=len(features) if features is not None else 1)
+        self.model_params = model_params or {}
+        self.profiler = profiler
+
+    def _instrumented(self):
+        # Profiles the steps of the pipeline within a block, if a profiler is set
+        return self.profiler.instrumented(self.PIPELINE) if self.profiler is not None else nullcontext(self.PIPELINE)
 
-    def create_pipeline(self):
+    def create_pipeline(self, masked=False):
         """
         Creates and returns the House-pricing data processing pipeline.
 
+        Parameters:
+            masked (bool): If True, stages share one row mask and missing value matrix (MaskedFrame) instead of copying
+                and dropping rows of the DataFrame; rows are selected and scaled once, by the scaler. The output is the same.
+
         Returns:
             Pipeline: A scikit-learn pipeline for data processing and modeling.
         """
@@ -59,8 +140,103 @@ class HousepricingDataPipeline:
                 # ('scaler', StandardScaler())
             ]
         )
+        if masked:
+            self.PIPELINE.steps.insert(0, ('row_mask', RowMask()))
         return self.PIPELINE
 
+    @profiled('pipeline.fit_transform')
+    def fit_transform(self, df):
+        """
+        Fits the data processing pipeline and transforms the data (PIPELINE.fit_transform), recording every step
+        with the profiler, if set.
+
+        Parameters:
+            df (pd.DataFrame): Raw data, features and target.
+
+        Returns:
+            df_transformed (DataFrame): Preprocessed features and target.
+        """
+        with self._instrumented():
+            return self.PIPELINE.fit_transform(df)
+
+    @profiled('pipeline.fit_transform_chunks')
+    def fit_transform_chunks(self, load_chunks, matrix_path, block_rows=65536):
+        """
+        Streaming counterpart of PIPELINE.fit_transform, for datasets that do not fit in memory.
+
+        The data is read twice, chunk by chunk, and never held in memory as a whole:
+            1. Outlier bounds are learned with IQR_DropOutliers.partial_fit (mergeable quantile sketches).
+            2. Every chunk is filtered (outliers and missing values), the scaler mean and variance are updated with
+               Standard_Scaler.partial_fit, and the selected raw rows are appended to an on-disk .npy matrix.
+        The matrix is then scaled in place, block by block, with the fitted scaler.
+
+        Parameters:
+            load_chunks (callable): Returns a new iterator of DataFrame chunks on every call,
+                e.g. lambda: data_retriever.load_data(chunksize=100000).
+            matrix_path (str): Path of the .npy training matrix written (features, then target).
+            block_rows (int): Number of rows of the matrix scaled at a time.
+
+        Returns:
+            df_transformed (DataFrame): Scaled features and target, backed by the memory-mapped matrix.
+        """
+        with self._instrumented():
+            return self._fit_transform_chunks(load_chunks, matrix_path, block_rows)
+
+    def _fit_transform_chunks(self, load_chunks, matrix_path, block_rows):
+        names = [name for name, _ in self.PIPELINE.steps]
+        scaler = self.PIPELINE.named_steps['scaler']
+
+        def transform_until(chunk, stop):
+            # Runs a chunk through the (already fitted or stateless) steps before 'stop'
+            for name, step in self.PIPELINE.steps[:names.index(stop)]:
+                chunk = step.transform(chunk)
+            return chunk
+
+        # 1st pass: outlier bounds, and the dtype of the matrix (see feature_matrix), known before it is written
+        columns = self.FEATURES + [self.TARGET]
+        dtype = np.dtype(np.float32)
+        with self.engine.timed('preprocess_outlier_bounds'):
+            iqr_dropoutliers = self.PIPELINE.named_steps['iqr_dropoutliers']
+            for key in ('sketches_', 'lower_bounds_', 'upper_bounds_'):
+                iqr_dropoutliers.__dict__.pop(key, None)
+            for chunk in load_chunks():
+                chunk = transform_until(chunk, 'iqr_dropoutliers')
+                iqr_dropoutliers.partial_fit(chunk)
+                dtype = np.result_type(dtype, *(chunk.data if isinstance(chunk, MaskedFrame) else chunk)[columns].dtypes)
+
+        # 2nd pass: selected rows written to disk, scaler statistics
+        with self.engine.timed('preprocess_write_matrix'):
+            scaler.__dict__.pop('standard_scaler', None)
+            header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (0, len(columns))}
+            n_rows = 0
+            with open(matrix_path + '.tmp', 'wb') as file:
+                np.lib.format.write_array_header_1_0(file, header)
+                header_size = file.tell()
+                for chunk in load_chunks():
+                    chunk = transform_until(chunk, 'scaler')
+                    scaler.partial_fit(chunk)
+                    rows = chunk.selected(columns) if isinstance(chunk, MaskedFrame) else feature_matrix(chunk, columns)
+                    # A chunk may hold narrower columns than others (e.g. integer codes without missing values)
+                    file.write(np.ascontiguousarray(rows, dtype=dtype).tobytes())
+                    n_rows += len(rows)
+                # The header leaves room for the shape to grow, so the final one fits in the same bytes
+                file.seek(0)
+                np.lib.format.write_array_header_1_0(file, dict(header, shape=(n_rows, len(columns))))
+                if file.tell() != header_size:
+                    raise ValueError(f"The header of {matrix_path} could not be updated in place.")
+            os.replace(matrix_path + '.tmp', matrix_path)
+
+        # Scaling in place, with the statistics of every selected row
+        with self.engine.timed('preprocess_scale_matrix'):
+            matrix = np.load(matrix_path, mmap_mode='r+')
+            for start in range(0, n_rows, block_rows):
+                matrix[start:start + block_rows, :-1] = scaler.standard_scaler.transform(matrix[start:start + block_rows, :-1])
+            matrix.flush()
+
+        self.matrix = matrix
+        return pd.DataFrame(matrix, columns=columns, copy=False)
+
+    @profiled('fit_random_forest')
     def fit_random_forest(self, X_train, y_train):
         """
         Fit a Random Forest model using the predefined data preprocessing pipeline.
@@ -74,47 +250,253 @@ class HousepricingDataPipeline:
         """
         self.X_train = X_train
         self.y_train = y_train
-        self.model = RandomForestRegressor(n_estimators=100, random_state=self.SEED_MODEL)
-        self.model.fit(self.X_train, self.y_train)
+        # Out-of-bag predictions are gathered while fitting, from the bootstrap samples already drawn
+        params = dict({'n_estimators': 100}, **self.model_params)
+        self.model = RandomForestRegressor(**params, random_state=self.SEED_MODEL, oob_score=(self.evaluation == 'oob'))
+        self.engine.fit(self.model, self.X_train, self.y_train)
         return self.model
 
+    @profiled('search_hyperparameters')
+    def search_hyperparameters(self, X_train, y_train, param_grid, **search_options):
+        """
+        Searches Random Forest hyperparameters with successive halving, and keeps the best ones for fit_random_forest.
+
+        Parameters:
+            X_train (pandas.DataFrame or numpy.ndarray): The preprocessed training input data.
+            y_train (pandas.Series or numpy.ndarray): The target values for training.
+            param_grid (dict or list of dicts): Parameters to try (without n_estimators, which is the search budget).
+            **search_options: Options of SuccessiveHalvingSearch (min_estimators, max_estimators, factor, ...).
+
+        Returns:
+            leaderboard (DataFrame): Configurations ranked, with fit time, predict latency and validation accuracy.
+        """
+        search_options.setdefault('random_state', self.SEED_MODEL)
+        search_options.setdefault('n_workers', self.engine.n_workers)
+        self.search = SuccessiveHalvingSearch(param_grid, **search_options)
+        with self.engine.timed('hyperparameter_search'):
+            leaderboard = self.search.fit(X_train, y_train)
+        self.model_params = self.search.best_params_
+        return leaderboard
+
+    @profiled('compact_forest')
+    def compact_forest(self, X_val, y_val, tolerance=0.01, metric='rmse', max_depths=(None,)):
+        """
+        Replaces the trained forest with the fewest trees, optionally truncated, whose validation accuracy stays within
+        a tolerance of the whole forest's (see ForestCompactor). Predictions get cheaper in proportion to the trees x
+        levels removed, and persist_model then writes the compacted forest, in any format. The compacted forest has no
+        out-of-bag estimate, so get_evaluation_metrics cross validates it instead.
+
+        Parameters:
+            X_val (pandas.DataFrame or numpy.ndarray): Preprocessed validation features, not used to fit the model.
+            y_val (pandas.Series or numpy.ndarray): Validation target.
+            tolerance (float): Relative increase of the validation RMSE (metric 'rmse') or absolute decrease of the
+                validation R2 (metric 'r2') accepted.
+            metric (str): 'rmse' or 'r2'.
+            max_depths (list of int): Depths the trees may be truncated to; None keeps them whole.
+
+        Returns:
+            report (DataFrame): Trees, nodes, validation accuracy, memory and latency of the full and compacted forest.
+        """
+        self.compactor = ForestCompactor(tolerance=tolerance, metric=metric, max_depths=max_depths, random_state=self.SEED_MODEL)
+        with self.engine.timed('forest_compaction'):
+            report = self.compactor.fit(self.model, X_val, y_val)
+        self.model = self.compactor.model_
+        return report
+
+    @profiled('predict')
     def predict(self, X_test):
         self.X_test = X_test
-        self.y_pred = self.model.predict(self.X_test)
+        with self.engine.timed('predict'):
+            self.y_pred = self.model.predict(self.X_test)
         return self.y_pred
 
+    @profiled('get_evaluation_metrics')
     def get_evaluation_metrics(self, y_test):
+        """
+        Evaluates the trained model on the test set, and estimates its generalization R2 on the training set.
+
+        R2, Adjusted R2 and RMSE are computed on the test set. The 'Cross Validated R2 Score' comes from the method
+        named in the 'Generalization Method' column: the out-of-bag score of the forest, or the mean of a 10-fold
+        cross validation. Forests without an out-of-bag estimate (updated or compacted) are cross validated.
+
+        Parameters:
+            y_test (pandas.Series or numpy.ndarray): Target values of the test set.
+
+        Returns:
+            scores_df (DataFrame): Dataframe with evaluation metrics.
+        """
         self.y_test = y_test
-        cv_score = cross_val_score(estimator=self.model, X=self.X_train, y=self.y_train, cv=10)
-
-        # Calculating Adjusted R-squared
-        r2 = self.model.score(self.X_test, self.y_test)
-        # Number of observations is the shape along axis 0
-        n = self.X_test.shape[0]
-        # Number of features (predictors, p) is the shape along axis 1
-        p = self.X_test.shape[1]
-        # Adjusted R-squared formula
-        adjusted_r2 = 1 - (1 - r2) * (n - 1) / (n - p - 1)
-        RMSE = np.sqrt(metrics.mean_squared_error(self.y_test, self.y_pred))
-        R2 = self.model.score(self.X_test, self.y_test)
-        CV_R2 = cv_score.mean()
+        evaluation = self.evaluation
+        if evaluation == 'oob' and not hasattr(self.model, 'oob_score_'):
+            # Updated (update_model) and compacted (compact_forest) forests have no out-of-bag estimate
+            evaluation = 'cv'
+        if evaluation == 'oob':
+            CV_R2 = self.model.oob_score_
+        else:
+            CV_R2 = self.engine.cross_val_score(self.model, X=self.X_train, y=self.y_train, cv=10).mean()
+
+        with self.engine.timed('evaluation'):
+            # R-squared on the test set, from the predictions already made
+            R2 = metrics.r2_score(self.y_test, self.y_pred)
+            # Number of observations is the shape along axis 0
+            n = self.X_test.shape[0]
+            # Number of features (predictors, p) is the shape along axis 1
+            p = self.X_test.shape[1]
+            # Adjusted R-squared formula
+            adjusted_r2 = 1 - (1 - R2) * (n - 1) / (n - p - 1)
+            RMSE = np.sqrt(metrics.mean_squared_error(self.y_test, self.y_pred))
 
         self.scores_df = pd.DataFrame(data=[[R2, adjusted_r2, CV_R2, RMSE]], columns=['R2 Score', 'Adjusted R2 Score', 'Cross Validated R2 Score', 'RMSE'])
         self.scores_df.insert(0, 'Model', 'Random Forest')
+        self.scores_df.insert(4, 'Generalization Method', self.EVALUATION_METHODS[evaluation])
 
         return self.scores_df
 
-    def persist_model(self, trained_model_dir, file_save_name):
-        # Saves the model recently trained
+    def get_inference_artifact(self):
+        """
+        Bundles the trained model with the fitted preprocessing state (scaler mean/scale, outlier bounds and column order),
+        so raw features can be scored without the data processing pipeline.
+
+        Returns:
+            dict: The inference artifact.
+        """
+        if not hasattr(self, 'X_train') and hasattr(self, 'inference_artifact'):
+            # Model loaded with load_model: its preprocessing comes from the loaded artifact
+            return build_inference_artifact(model=self.model, features=self.inference_artifact['features'],
+                                            mean=self.inference_artifact['mean'], scale=self.inference_artifact['scale'],
+                                            outlier_bounds=self.inference_artifact.get('outlier_bounds'))
+
+        scaler = self.PIPELINE.named_steps['scaler']
+        features = list(self.X_train.columns)
+        if features != list(scaler.features):
+            raise ValueError(f"Model features {features} do not match the scaled features {list(scaler.features)}.")
+
+        outlier_bounds = None
+        iqr_dropoutliers = self.PIPELINE.named_steps.get('iqr_dropoutliers')
+        if iqr_dropoutliers is not None and hasattr(iqr_dropoutliers, 'lower_bounds_'):
+            outlier_bounds = {'features': iqr_dropoutliers.features, 'n': iqr_dropoutliers.n,
+                              'lower': iqr_dropoutliers.lower_bounds_, 'upper': iqr_dropoutliers.upper_bounds_}
+
+        return build_inference_artifact(model=self.model, features=features,
+                                        mean=scaler.standard_scaler.mean_, scale=scaler.standard_scaler.scale_,
+                                        outlier_bounds=outlier_bounds)
+
+    @profiled('persist_model')
+    def persist_model(self, trained_model_dir, file_save_name, model_format='joblib', compression=None):
+        """
+        Saves the model recently trained, together with the fitted preprocessing needed to serve it.
+
+        Every format and compression is loaded transparently by ModelAPIPredictor. Their size, load time and prediction
+        drift are measured by benchmarks/benchmark_suite.py.
+
+        Parameters:
+            trained_model_dir (str): Directory where the model is stored.
+            file_save_name (str): Name of the model file.
+            model_format (str): 'joblib' pickles the inference artifact (the sklearn model can be reloaded, e.g. to retrain it).
+                'mmap' writes the flattened trees as raw aligned arrays (a '.forest' file) that API workers memory-map
+                and share, instead of each one unpickling its own copy.
+                'compact' writes a '.forest' file with float32 thresholds and leaf values and narrow integer indices
+                (see FlatForest.compact): about a third of the size, same tree paths, leaf values rounded to float32.
+            compression (str, optional): 'zlib', 'lzma' or 'bz2'. Smaller files, but forest files are then decompressed
+                into the memory of every process instead of being memory-mapped and shared.
+        """
+        if model_format not in ('joblib', 'mmap', 'compact'):
+            raise ValueError(f"Unknown model format '{model_format}', expected 'joblib', 'mmap' or 'compact'.")
+        if compression is not None and compression not in COMPRESSION_CODECS:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {list(COMPRESSION_CODECS)}.")
 
         if not os.path.isdir(trained_model_dir):   # Searches for the default models folder
             os.mkdir(Path(trained_model_dir))
         if os.path.isdir(trained_model_dir):
-            joblib.dump(self.model, trained_model_dir + file_save_name)
+            artifact = self.get_inference_artifact()
+            if model_format in ('mmap', 'compact'):
+                metadata = {'format': ARTIFACT_FORMAT, 'features': artifact['features']}
+                arrays = {'mean': artifact['mean'], 'scale': artifact['scale']}
+                if 'outlier_bounds' in artifact:
+                    metadata['outlier_features'] = artifact['outlier_bounds']['features']
+                    metadata['outlier_n'] = artifact['outlier_bounds']['n']
+                    arrays['outlier_lower'] = artifact['outlier_bounds']['lower']
+                    arrays['outlier_upper'] = artifact['outlier_bounds']['upper']
+                forest = FlatForest.from_estimator(self.model)
+                if model_format == 'compact':
+                    forest = forest.compact()
+                write_forest_file(trained_model_dir + file_save_name, forest, metadata=metadata, arrays=arrays, compression=compression)
+            else:
+                # Writes to a temporary file first, so a serving process watching the file never reads a partial model
+                joblib.dump(artifact, trained_model_dir + file_save_name + '.tmp', compress=(compression, 3) if compression else 0)
+                os.replace(trained_model_dir + file_save_name + '.tmp', trained_model_dir + file_save_name)
 
         print()
         print("Model stored in: " + trained_model_dir + file_save_name)
 
+    @profiled('load_model')
+    def load_model(self, trained_model_dir, file_save_name):
+        """
+        Loads a model persisted by persist_model (joblib format), with its fitted preprocessing, e.g. to update it.
+
+        Parameters:
+            trained_model_dir (str): Directory where the model is stored.
+            file_save_name (str): Name of the model file.
+
+        Returns:
+            random_forest (RandomForest model): The loaded model.
+        """
+        if is_forest_file(trained_model_dir + file_save_name):
+            raise ValueError(f"{trained_model_dir + file_save_name} holds flattened trees only, load the joblib model instead.")
+        artifact = joblib.load(trained_model_dir + file_save_name)
+        if not is_inference_artifact(artifact):
+            raise ValueError(f"{trained_model_dir + file_save_name} is not an inference artifact written by persist_model.")
+        self.inference_artifact = artifact
+        self.model = artifact['model']
+        return self.model
+
+    @profiled('update_model')
+    def update_model(self, new_data, n_new_estimators=10, max_estimators=None):
+        """
+        Updates the trained model incrementally with new labelled rows.
+
+        New trees are fit on the new rows only (warm start) and added to the forest, so the cost is proportional
+        to the new data instead of the whole history. Rows with missing values are dropped, as well as outliers according
+        to the bounds learned when the model was trained, and features are scaled with the fitted preprocessing.
+
+        Parameters:
+            new_data (pd.DataFrame): New rows with the raw features and the target.
+            n_new_estimators (int): Number of trees fit on the new rows.
+            max_estimators (int, optional): If the forest grows beyond this size, its oldest trees are retired.
+
+        Returns:
+            random_forest (RandomForest model): The updated model.
+        """
+        if n_new_estimators < 1:
+            raise ValueError("n_new_estimators must be at least 1.")
+        if max_estimators is not None and max_estimators < 1:
+            raise ValueError("max_estimators must be at least 1.")
+        artifact = self.get_inference_artifact()
+        new_data = new_data.dropna(subset=artifact['features'] + [self.TARGET])
+        if 'outlier_bounds' in artifact:
+            outlier_bounds = artifact['outlier_bounds']
+            new_data = IQR_DropOutliers.from_bounds(outlier_bounds['features'], outlier_bounds['n'],
+                                                    outlier_bounds['lower'], outlier_bounds['upper']).transform(new_data)
+        if new_data.empty:
+            raise ValueError("There are no complete rows without outliers to update the model with.")
+        # Named columns, as the forest was fit on: a bare matrix would reset its feature_names_in_
+        X_new = pd.DataFrame(InferenceTransform.from_artifact(artifact).transform(new_data[artifact['features']].to_numpy()), columns=artifact['features'])
+        y_new = new_data[self.TARGET].to_numpy()
+
+        # Out-of-bag estimates of the previous trees do not apply to the new rows
+        for attribute in ('oob_score_', 'oob_prediction_'):
+            if hasattr(self.model, attribute):
+                delattr(self.model, attribute)
+        self.model.set_params(warm_start=True, oob_score=False, n_estimators=len(self.model.estimators_) + n_new_estimators)
+        self.engine.fit(self.model, X_new, y_new)
+        self.model.set_params(warm_start=False)
+
+        if max_estimators is not None and len(self.model.estimators_) > max_estimators:
+            self.model.estimators_ = self.model.estimators_[-max_estimators:]
+            self.model.set_params(n_estimators=max_estimators)
+
+        return self.model
+
     def make_prediction(self, X_values, selected_features, features=None):
         """
         Makes predictions with the model trained with values provided
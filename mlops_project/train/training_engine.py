@@ -0,0 +1,108 @@
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import KFold
+
+EXECUTORS = {'threads': 'threading', 'processes': 'loky'}
+
+
+def _fit_and_score_fold(model, X, y, train_index, test_index):
+    # Fits a fresh copy of the model on one fold and returns its R2 score on the held out part
+    fold_model = clone(model)
+    fold_model.fit(X[train_index], y[train_index])
+    return fold_model.score(X[test_index], y[test_index])
+
+
+class TrainingEngine:
+    """
+    Executes model training and cross validation with a configurable parallel executor.
+
+    Tree building is parallelized inside the forest (n_jobs). Cross validation folds run concurrently,
+    each one fitting a single-threaded forest. The training matrix is converted once to a contiguous float32
+    array (the precision trees work with) and shared by all folds: threads read it directly, and worker processes
+    receive it as a read-only memory map instead of a pickled copy.
+
+    Parameters:
+        executor (str): 'threads' or 'processes'. Default is 'threads'.
+        n_workers (int, optional): Number of workers. Default is the number of CPUs.
+
+    Attributes:
+        executor (str): Executor used for cross validation folds.
+        n_workers (int): Number of workers.
+        phase_times (dict): Wall-clock seconds spent in every phase ('fit', 'cross_validation', 'evaluation', ...).
+
+    Methods:
+        fit(model, X, y): Fits the model building trees in parallel.
+        cross_val_score(model, X, y, cv): Returns the R2 score of every fold, computed concurrently.
+        timed(phase): Context manager adding the time spent in a block to phase_times.
+    """
+
+    def __init__(self, executor='threads', n_workers=None):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor '{executor}', expected one of {list(EXECUTORS)}.")
+        self.executor = executor
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.phase_times = {}
+
+    @contextmanager
+    def timed(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[phase] = self.phase_times.get(phase, 0.0) + time.perf_counter() - start
+
+    @staticmethod
+    def as_matrix(X, y):
+        """
+        Converts training data once to the contiguous arrays shared by every worker.
+        """
+        return np.ascontiguousarray(X, dtype=np.float32), np.ascontiguousarray(y, dtype=np.float64)
+
+    def fit(self, model, X, y):
+        """
+        Fits the model, building its trees with n_workers threads.
+
+        The model's own n_jobs setting is restored afterwards, so the persisted model does not
+        spawn workers when serving small batches.
+
+        Returns:
+            The fitted model.
+        """
+        n_jobs = model.get_params().get('n_jobs')
+        with self.timed('fit'):
+            model.set_params(n_jobs=self.n_workers)
+            try:
+                model.fit(X, y)
+            finally:
+                model.set_params(n_jobs=n_jobs)
+        return model
+
+    def cross_val_score(self, model, X, y, cv=10):
+        """
+        Computes the R2 score of every fold of a K-fold split, running the folds concurrently.
+
+        Folds and scores are the same as sklearn's cross_val_score(estimator=model, X=X, y=y, cv=cv).
+
+        Parameters:
+            model: Estimator to evaluate (not modified).
+            X (array-like): Training features.
+            y (array-like): Training target.
+            cv (int): Number of folds.
+
+        Returns:
+            np.ndarray: Score of every fold.
+        """
+        with self.timed('cross_validation'):
+            X, y = self.as_matrix(X, y)
+            fold_model = clone(model).set_params(n_jobs=1) if 'n_jobs' in model.get_params() else clone(model)
+            folds = KFold(n_splits=cv).split(X)
+
+            # max_nbytes=0 makes process workers memory-map X and y instead of receiving copies
+            parallel = Parallel(n_jobs=min(self.n_workers, cv), backend=EXECUTORS[self.executor], max_nbytes=0, mmap_mode='r')
+            scores = parallel(delayed(_fit_and_score_fold)(fold_model, X, y, train_index, test_index) for train_index, test_index in folds)
+        return np.array(scores)
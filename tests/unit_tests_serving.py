@@ -0,0 +1,430 @@
+"""Tests for the serving components of 'mlops_project'."""
+
+import asyncio
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from mlops_project.predictor.api_predict import ModelAPIPredictor
+from mlops_project.predictor.flat_forest import FlatForest
+from mlops_project.predictor.metrics import MetricsRegistry
+from mlops_project.predictor.micro_batcher import MicroBatcher
+from mlops_project.predictor.model_registry import ModelRegistry
+from mlops_project.predictor.prediction_cache import PredictionCache
+from mlops_project.predictor.wire_formats import (COLUMNS_JSON, FLOAT32,
+                                                  PREDICTIONS_JSON, negotiate)
+
+FEATURES = ['CRIM', 'ZN', 'INDUS', 'CHAS', 'NOX', 'RM', 'AGE', 'DIS', 'RAD', 'TAX', 'PTRATIO', 'B', 'LSTAT']
+TARGET = 'MEDV'
+
+
+def train_small_forest(n_estimators=5, random_state=0):
+    """
+    Trains a small Random Forest on the project dataset, fast enough for unit tests.
+    """
+    df = pd.read_csv('./mlops_project/data/data.csv')
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state)
+    model.fit(df[FEATURES].to_numpy(), df[TARGET].to_numpy())
+    return model, df[FEATURES].to_numpy()
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    model, _ = train_small_forest()
+    path = str(tmp_path / 'random_forest_output.pkl')
+    joblib.dump(model, path)
+    return path
+
+
+def test_model_registry_loads_once(model_file):
+    """
+    Test that the registry loads the artifact once and serves the same predictor afterwards.
+    """
+    registry = ModelRegistry(model_file)
+    predictor = registry.get()
+
+    assert registry.get() is predictor, "The registry must serve the model loaded at startup."
+    assert registry.reload_if_changed() is False, "An unchanged artifact must not be reloaded."
+
+    status = registry.status()
+    assert status['loaded'] is True
+    assert status['load_time_s'] >= 0
+    assert len(status['version']) == 12
+
+
+def test_model_registry_hot_reload(model_file):
+    """
+    Test that a newly persisted model is swapped in, while the previous predictor keeps working.
+    """
+    registry = ModelRegistry(model_file)
+    old_predictor = registry.get()
+    old_version = registry.status()['version']
+
+    new_model, X = train_small_forest(random_state=1)
+    joblib.dump(new_model, model_file + '.tmp')
+    os.replace(model_file + '.tmp', model_file)
+
+    assert registry.reload_if_changed() is True
+    assert registry.status()['version'] != old_version
+    assert registry.status()['reloads'] == 1
+    assert registry.get() is not old_predictor
+    assert np.array_equal(registry.get().predict(X[:3]), new_model.predict(X[:3]))
+
+    # In-flight requests holding the previous predictor are not affected by the swap
+    assert old_predictor.predict(X[:3]).shape == (3,)
+
+
+def test_model_registry_keeps_model_on_failed_reload(model_file):
+    """
+    Test that a broken artifact does not replace the model being served.
+    """
+    registry = ModelRegistry(model_file)
+    predictor = registry.get()
+
+    with open(model_file, 'wb') as file:
+        file.write(b'not a model')
+
+    assert registry.reload_if_changed() is False
+    assert registry.get() is predictor
+    assert registry.status()['last_error'] is not None
+
+
+def test_predict_endpoint_uses_registry(model_file, monkeypatch):
+    """
+    Test that the '/predict' endpoint serves predictions from the registry model.
+    """
+    from fastapi.testclient import TestClient
+
+    import api.main as main
+
+    monkeypatch.setattr(main, 'registry', ModelRegistry(model_file))
+    client = TestClient(main.app)
+    payload = {"crim": 0.06905, "zn": 0.0, "indus": 2.18, "chas": 0, "nox": 0.458, "rm": 7.147, "age": 54.2,
+               "dis": 6.0622, "rad": 3, "tax": 222.0, "ptratio": 18.7, "b": 396.90, "lstat": 5.33}
+
+    response = client.post('/predict', json=payload)
+    assert response.status_code == 200
+    assert response.json().startswith('Resultado predicción:')
+
+    response = client.get('/model')
+    assert response.json()['version'] == main.registry.status()['version']
+
+    # A repeated request is answered from the prediction cache
+    hits = main.cache.stats()['hits']
+    assert client.post('/predict', json=payload).json() == client.post('/predict', json=payload).json()
+    assert main.cache.stats()['hits'] >= hits + 1
+
+
+def test_predict_batch_endpoint(model_file, monkeypatch):
+    """
+    Test that '/predict/batch' returns one prediction per row, equal for records and columnar layouts,
+    and that the configured size limit is enforced.
+    """
+    from fastapi.testclient import TestClient
+
+    import api.main as main
+    from api.models.models import FEATURES
+
+    monkeypatch.setattr(main, 'registry', ModelRegistry(model_file))
+    client = TestClient(main.app)
+    df = pd.read_csv('./mlops_project/data/data.csv').head(20)
+    records = [dict(zip(FEATURES, row)) for row in df[[feature.upper() for feature in FEATURES]].to_numpy().tolist()]
+    columns = {feature: [record[feature] for record in records] for feature in FEATURES}
+
+    response = client.post('/predict/batch', json={'records': records})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['n_rows'] == 20
+    assert [item['row'] for item in body['predictions']] == list(range(20))
+    expected = main.registry.get().predict(df[[feature.upper() for feature in FEATURES]].to_numpy())
+    assert np.allclose([item['prediction'] for item in body['predictions']], expected)
+
+    response = client.post('/predict/batch', json={'columns': columns})
+    assert response.json() == body
+
+    assert client.post('/predict/batch', json={'records': records, 'columns': columns}).status_code == 422
+
+    monkeypatch.setattr(main, 'MAX_BATCH_SIZE', 10)
+    assert client.post('/predict/batch', json={'records': records}).status_code == 413
+
+
+def test_prediction_wire_formats(model_file, monkeypatch):
+    """
+    Test that prediction endpoints decode columnar JSON and packed float32 bodies, and answer in the media type
+    negotiated with the Accept header, JSON staying the default.
+    """
+    from fastapi.testclient import TestClient
+
+    import api.main as main
+    from api.models.models import FEATURES
+
+    monkeypatch.setattr(main, 'registry', ModelRegistry(model_file))
+    client = TestClient(main.app)
+    X = pd.read_csv('./mlops_project/data/data.csv').dropna()[[feature.upper() for feature in FEATURES]].head(20).to_numpy()
+    expected = main.registry.get().predict(X)
+
+    columns = {feature: X[:, position].tolist() for position, feature in enumerate(FEATURES)}
+    response = client.post('/predict/batch', content=json.dumps(columns),
+                           headers={'Content-Type': COLUMNS_JSON, 'Accept': PREDICTIONS_JSON})
+    assert response.status_code == 200 and response.headers['content-type'] == PREDICTIONS_JSON
+    assert response.json()['n_rows'] == 20 and response.json()['version'] == main.registry.version
+    assert np.array_equal(response.json()['predictions'], expected)
+
+    response = client.post('/predict/batch', content=X.astype('<f4').tobytes(), headers={'Content-Type': FLOAT32, 'Accept': FLOAT32})
+    assert response.status_code == 200 and len(response.content) == 4 * 20
+    assert np.allclose(np.frombuffer(response.content, dtype='<f4'), main.registry.get().predict(X.astype(np.float32)), rtol=1e-6)
+
+    # The default JSON answers of both endpoints are unchanged
+    response = client.post('/predict/batch', content=X.astype('<f4').tobytes(), headers={'Content-Type': 'application/octet-stream'})
+    assert response.json()['n_rows'] == 20 and 'prediction' in response.json()['predictions'][0]
+    record = dict(zip(FEATURES, [0.06905, 0.0, 2.18, 0, 0.458, 7.147, 54.2, 6.0622, 3, 222.0, 18.7, 396.90, 5.33]))
+    assert client.post('/predict', json=record, headers={'Accept': 'text/html,*/*;q=0.8'}).json().startswith('Resultado predicción:')
+    response = client.post('/predict', json=record, headers={'Accept': PREDICTIONS_JSON})
+    assert response.json()['n_rows'] == 1 and len(response.json()['predictions']) == 1
+
+    assert client.post('/predict/batch', content=b'\x00' * 10, headers={'Content-Type': FLOAT32}).status_code == 422
+    assert client.post('/predict/batch', content=json.dumps({'crim': [1.0]}), headers={'Content-Type': COLUMNS_JSON}).status_code == 422
+    for value in [np.inf, np.nan]:
+        rows = np.repeat(X, 15, axis=0)     # 300 rows, past the flattened engine, up to sklearn
+        rows[0, 0] = value
+        assert client.post('/predict/batch', content=rows.astype('<f4').tobytes(), headers={'Content-Type': FLOAT32}).status_code == 422
+        assert client.post('/predict/batch', content=rows[:2].astype('<f4').tobytes(), headers={'Content-Type': FLOAT32}).status_code == 422
+    for column in [['1', '2'], [float('nan'), 1.0], [True, False]]:
+        body = json.dumps(dict({feature: [1.0, 2.0] for feature in FEATURES}, crim=column))
+        assert client.post('/predict/batch', content=body, headers={'Content-Type': COLUMNS_JSON}).status_code == 422
+    assert client.post('/predict/batch', content='crim,zn', headers={'Content-Type': 'text/csv'}).status_code == 415
+    for accept in ['text/plain', 'text/html', f'text/html, {FLOAT32};q=0']:
+        assert client.post('/predict', json=record, headers={'Accept': accept}).json().startswith('Resultado predicción:')
+        assert client.post('/predict/batch', content=X.astype('<f4').tobytes(), headers={'Content-Type': FLOAT32, 'Accept': accept}).json()['n_rows'] == 20
+    assert client.post('/predict/batch', json={'records': [{'crim': 1.0}]}).json()['detail'][0]['loc'][:2] == ['body', 'records']
+
+    assert negotiate(f'{FLOAT32};q=0.5, {PREDICTIONS_JSON}') == PREDICTIONS_JSON
+    assert negotiate('application/*') == 'application/json' and negotiate(None) == 'application/json'
+    assert negotiate('application/json;q=0, */*') is None
+    assert negotiate(f'{FLOAT32}, */*') == FLOAT32 and negotiate(f'{FLOAT32};q=0.5, */*') == 'application/json'
+
+
+def test_metrics_registry_merges_thread_shards():
+    """
+    Test that counters and histograms updated from several threads add up, and render in the Prometheus text format.
+    """
+    import threading
+
+    metrics = MetricsRegistry()
+    requests = metrics.counter('requests_total', 'Requests.', ('endpoint',))
+    latency = metrics.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+    metrics.gauge('model_size_bytes', 'Model size.', function=lambda: 2048)
+
+    def work():
+        for value in (0.05, 0.5, 5.0) * 1000:
+            requests.inc(1, '/predict')
+            latency.observe(value)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    text = metrics.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{endpoint="/predict"} 12000' in text
+    assert 'latency_seconds_bucket{le="0.1"} 4000' in text
+    assert 'latency_seconds_bucket{le="1"} 8000' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 12000' in text
+    assert 'latency_seconds_count 12000' in text
+    assert 'model_size_bytes 2048' in text
+
+
+def test_metrics_endpoint(model_file, monkeypatch):
+    """
+    Test that '/metrics' reports request latency, rows predicted, predict stage timings, model and process telemetry.
+    """
+    from fastapi.testclient import TestClient
+
+    import api.main as main
+
+    monkeypatch.setattr(main, 'registry', ModelRegistry(model_file))
+    client = TestClient(main.app)
+    payload = {"crim": 0.06905, "zn": 0.0, "indus": 2.18, "chas": 0, "nox": 0.458, "rm": 7.147, "age": 54.2,
+               "dis": 6.0622, "rad": 3, "tax": 222.0, "ptratio": 18.7, "b": 396.90, "lstat": 5.33}
+    rows = main.predicted_rows_total.samples().get(('/predict/batch',), 0)
+    assert client.post('/predict', json=payload).status_code == 200
+    assert client.post('/predict/batch', json={'records': [payload] * 3}).status_code == 200
+    assert client.get('/jobs/unknown').status_code == 404
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    text = response.text
+    assert 'http_requests_total{method="POST",endpoint="/predict",status="200"}' in text
+    assert 'http_requests_total{method="GET",endpoint="/jobs/{job_id}",status="404"}' in text
+    assert 'http_request_duration_seconds_count{method="POST",endpoint="/predict/batch"}' in text
+    assert f'housepricing_predicted_rows_total{{endpoint="/predict/batch"}} {int(rows) + 3}' in text
+    for stage in ('validation', 'feature_assembly', 'tree_evaluation'):
+        assert f'housepricing_predict_stage_seconds_count{{endpoint="/predict/batch",stage="{stage}"}}' in text
+    assert f'housepricing_model_size_bytes {os.path.getsize(model_file)}' in text
+    assert 'housepricing_model_load_seconds ' in text and 'housepricing_prediction_cache_misses_total ' in text
+    assert 'process_resident_memory_bytes ' in text
+
+
+def test_serving_import_is_lean_and_ready_after_warmup(model_file, monkeypatch):
+    """
+    Test that importing the API does not load pandas, sklearn or the training modules, and that '/ready'
+    reports ready only once the model is loaded and warmed up at startup.
+    """
+    import subprocess
+    import sys
+
+    from fastapi.testclient import TestClient
+
+    import api.main as main
+
+    code = "import sys, api.main; print([name for name in ('pandas', 'sklearn', 'joblib', 'train.train_data') if name in sys.modules])"
+    assert subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.strip() == '[]'
+
+    warmed_up = []
+    monkeypatch.setattr(main, 'registry', ModelRegistry(model_file, warmup=lambda predictor: warmed_up.append(predictor)))
+    monkeypatch.setitem(main.startup, 'ready', False)
+    client = TestClient(main.app)
+    response = client.get('/ready')
+    assert response.status_code == 503 and response.json()['ready'] is False
+
+    with TestClient(main.app) as client:
+        response = client.get('/ready')
+        assert response.status_code == 200
+        assert response.json()['ready'] is True
+        assert response.json()['version'] == main.registry.version
+        assert response.json()['warmup_time_s'] >= 0 and response.json()['startup_time_s'] > 0
+        assert warmed_up == [main.registry.get()]
+
+
+def test_micro_batcher_coalesces_concurrent_rows():
+    """
+    Test that concurrent single-row requests are predicted together and each gets its own result.
+    """
+    model, X = train_small_forest()
+    batch_sizes = []
+
+    def predict_fn(matrix):
+        batch_sizes.append(matrix.shape[0])
+        return model.predict(matrix)
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=8, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(*[batcher.predict(row) for row in X[:20].tolist()])
+
+    results = asyncio.run(run())
+
+    assert np.allclose([prediction for prediction, _ in results], model.predict(X[:20]))
+    assert all(queue_time >= 0 for _, queue_time in results)
+    assert max(batch_sizes) == 8 and sum(batch_sizes) == 20, "Rows must be grouped in batches of at most 8 rows."
+
+    metrics = batcher.metrics()
+    assert metrics['rows'] == 20
+    assert metrics['batches'] == len(batch_sizes)
+    assert 0 < metrics['mean_batch_fill'] <= 1
+
+
+def test_micro_batcher_propagates_errors():
+    """
+    Test that a failing model call is raised to every request of the batch.
+    """
+    def predict_fn(matrix):
+        raise ValueError("broken model")
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, max_wait_ms=10)
+
+    async def run():
+        return await asyncio.gather(*[batcher.predict([0.0] * 13) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_flat_forest_matches_sklearn():
+    """
+    Test that the flattened engine reproduces sklearn predictions bit for bit, missing values included.
+    """
+    model, X = train_small_forest(n_estimators=20)
+    rng = np.random.default_rng(0)
+    X = X + rng.normal(scale=0.5, size=X.shape)
+    X[::7, 3] = np.nan
+
+    flat_forest = FlatForest.from_estimator(model)
+
+    assert flat_forest.n_trees == 20
+    assert np.array_equal(flat_forest.predict(X), model.predict(X))
+    assert np.array_equal(flat_forest.predict(X[:1]), model.predict(X[:1]))
+
+
+def test_predictor_engine_switch(model_file):
+    """
+    Test that 'auto' uses the flattened engine only for batches up to flat_max_rows rows.
+    """
+    predictor = ModelAPIPredictor(model_file, engine='auto', flat_max_rows=10)
+    assert predictor.use_flat_engine(10) is True
+    assert predictor.use_flat_engine(11) is False
+
+    predictor = ModelAPIPredictor(model_file, engine='sklearn')
+    assert predictor.flat_forest is None and predictor.use_flat_engine(1) is False
+
+    with pytest.raises(ValueError):
+        ModelAPIPredictor(model_file, engine='gpu')
+
+
+def test_prediction_cache_lru_ttl_and_version():
+    """
+    Test LRU eviction, quantized keys, TTL expiry and invalidation on model version change.
+    """
+    cache = PredictionCache(maxsize=2, ttl=None, decimals=2)
+    assert cache.get([1.0, 2.0], 'v1') is None
+    cache.put([1.0, 2.0], 'v1', 10.0)
+    cache.put([3.0, 4.0], 'v1', 20.0)
+
+    assert cache.get([1.001, 2.0], 'v1') == 10.0, "Quantized keys must match values within the rounding."
+    cache.put([5.0, 6.0], 'v1', 30.0)
+    assert cache.get([3.0, 4.0], 'v1') is None, "The least recently used row must be evicted."
+    assert cache.stats()['evictions'] == 1
+
+    assert cache.get([1.0, 2.0], 'v2') is None, "A new model version must drop cached predictions."
+    assert cache.stats()['size'] == 0 and cache.stats()['invalidations'] == 1
+
+    cache = PredictionCache(maxsize=10, ttl=0.0)
+    cache.get([1.0], 'v1')
+    cache.put([1.0], 'v1', 10.0)
+    assert cache.get([1.0], 'v1') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_load_test_harness_against_local_server(model_file, tmp_path):
+    """
+    Test that the load-testing harness starts the API, replays payloads and summarizes latency and errors.
+    """
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+    from load_test import LocalServer, PayloadSampler, compare, run_scenarios
+
+    sampler = PayloadSampler(jitter=0.01, seed=1)
+    assert set(sampler.record()) == {feature.lower() for feature in FEATURES}
+    assert all(len(values) == 5 for values in sampler.columns(5).values())
+
+    with LocalServer(env={'MODEL_PATH': model_file}) as server:
+        closed_loop = run_scenarios(server.url, ['predict', 'predict_batch'], concurrency=4, duration=0.5, batch_size=10, warmup=2, sampler=sampler)
+        open_loop = run_scenarios(server.url, ['predict'], rate=50, duration=0.5, warmup=0, sampler=sampler)
+
+    for run in closed_loop['runs'] + open_loop['runs']:
+        assert run['requests'] > 0 and run['error_rate'] == 0.0
+        assert run['latency_ms_p50'] <= run['latency_ms_p95'] <= run['latency_ms_p99'] <= run['latency_ms_max']
+    assert closed_loop['runs'][0]['queue_ms_p50'] is not None
+    assert closed_loop['runs'][1]['throughput_rows_per_s'] == pytest.approx(10 * closed_loop['runs'][1]['throughput_rps'])
+
+    assert compare(open_loop, closed_loop) == []
+    comparison = compare(closed_loop, closed_loop)
+    assert [entry['regression'] for entry in comparison] == [False, False]
@@ -0,0 +1,686 @@
+"""Tests for the training components of 'mlops_project'."""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import cross_val_score, train_test_split
+
+from mlops_project.predictor.api_predict import ModelAPIPredictor
+
+# Training modules import their siblings as top-level packages, as when running mlops_project/mlops_project.py
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mlops_project'))
+
+from load.load_data import DataRetriever  # noqa: E402
+from preprocess.preprocess_data import (DtypePolicy, IQR_DropOutliers,  # noqa: E402
+                                        QuantileSketch, Standard_Scaler)
+from train.forest_compaction import (ForestCompactor,  # noqa: E402
+                                     truncate_tree)
+from train.profiling import PipelineProfiler  # noqa: E402
+from train.train_data import (HousepricingDataPipeline,  # noqa: E402
+                              check_model_params)
+from train.training_engine import TrainingEngine  # noqa: E402
+
+FEATURES = ['CRIM', 'ZN', 'INDUS', 'CHAS', 'NOX', 'RM', 'AGE', 'DIS', 'RAD', 'TAX', 'PTRATIO', 'B', 'LSTAT']
+TARGET = 'MEDV'
+
+
+def load_raw_data():
+    return pd.read_csv('./mlops_project/data/data.csv')
+
+
+@pytest.fixture
+def trained_pipeline():
+    """
+    House-pricing pipeline trained on the project dataset, as done by mlops_project.py.
+    """
+    housepricing_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102)
+    housepricing_pipeline.create_pipeline()
+    df_transformed = housepricing_pipeline.PIPELINE.fit_transform(load_raw_data())
+    X_train, X_test, y_train, y_test = train_test_split(df_transformed.drop(TARGET, axis=1), df_transformed[TARGET], test_size=0.2, random_state=42)
+    housepricing_pipeline.fit_random_forest(X_train=X_train, y_train=y_train)
+    housepricing_pipeline.predict(X_test=X_test)
+    housepricing_pipeline.y_test = y_test
+    return housepricing_pipeline
+
+
+def test_standard_scaler_reuses_fitted_parameters():
+    """
+    Test that Standard_Scaler scales new data with the mean and scale learned in 'fit'.
+    """
+    train = pd.DataFrame({'A': [1.0, 2.0, 3.0], 'T': [0.0, 1.0, 2.0]})
+    scaler = Standard_Scaler(features=['A'], target='T').fit(train)
+
+    transformed = scaler.transform(pd.DataFrame({'A': [2.0, 4.0]}))
+
+    assert list(transformed.columns) == ['A']
+    assert np.allclose(transformed['A'], [0.0, 2.0 / np.std([1.0, 2.0, 3.0])])
+
+
+def test_iqr_drop_outliers_uses_fitted_bounds(trained_pipeline, tmp_path):
+    """
+    Test that IQR_DropOutliers learns its bounds in 'fit', and that they are persisted and reused by update_model.
+    """
+    train = pd.DataFrame({'A': [1.0, 2.0, 3.0, 4.0, 100.0], 'B': [1.0, 2.0, 3.0, 4.0, 5.0]})
+    iqr_dropoutliers = IQR_DropOutliers(features=['A', 'B'], n=0).fit(train)
+
+    assert np.allclose(iqr_dropoutliers.lower_bounds_, [-1.0, -1.0])
+    assert np.allclose(iqr_dropoutliers.upper_bounds_, [7.0, 7.0])
+    # New data is filtered with the bounds learned on the training data, not its own quartiles
+    new = pd.DataFrame({'A': [6.0, 8.0, 9.0, np.nan], 'B': [0.0, 0.0, -2.0, 0.0]}, index=[10, 11, 12, 13])
+    assert iqr_dropoutliers.transform(new).equals(pd.DataFrame({'A': [6.0, np.nan], 'B': [0.0, 0.0]}))
+    assert len(IQR_DropOutliers(features=['A', 'B'], n=1).fit(train).transform(new)) == 3
+
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    updated_pipeline = HousepricingDataPipeline(features=None, target=TARGET, n=1, seed_model=102)
+    updated_pipeline.load_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    outlier_bounds = updated_pipeline.inference_artifact['outlier_bounds']
+    assert np.array_equal(outlier_bounds['upper'], trained_pipeline.PIPELINE.named_steps['iqr_dropoutliers'].upper_bounds_)
+
+    outliers = load_raw_data().dropna().head(5)
+    outliers[['CRIM', 'ZN']] = 1e6
+    with pytest.raises(ValueError):
+        updated_pipeline.update_model(outliers, n_new_estimators=2)
+
+
+def test_masked_pipeline_matches_default_pipeline():
+    """
+    Test that the mask-based pipeline selects and scales the same rows as the default one, without copying the input.
+    """
+    raw_df = load_raw_data()
+    raw_df.loc[[3, 7], 'CRIM'] = np.nan
+
+    default_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102).create_pipeline()
+    masked_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102).create_pipeline(masked=True)
+
+    expected = default_pipeline.fit_transform(raw_df)
+    pd.testing.assert_frame_equal(masked_pipeline.fit_transform(raw_df), expected)
+    assert np.array_equal(masked_pipeline.named_steps['iqr_dropoutliers'].upper_bounds_, default_pipeline.named_steps['iqr_dropoutliers'].upper_bounds_, equal_nan=True)
+    assert raw_df.shape == (506, 14), "The input must not be modified."
+
+    # Fitted stages applied to other data
+    def transform(pipeline, X):
+        for _, step in pipeline.steps:
+            X = step.transform(X)
+        return X
+
+    new_df = load_raw_data().tail(50)
+    pd.testing.assert_frame_equal(transform(masked_pipeline, new_df), transform(default_pipeline, new_df))
+
+
+def test_data_retriever_columnar_cache(tmp_path, monkeypatch):
+    """
+    Test that the dataset is parsed once into a columnar binary cache, and that the cache follows the CSV content.
+    """
+    import load.load_data as load_data
+
+    load_raw_data().to_csv(tmp_path / 'data.csv', index=False)
+    data_retriever = DataRetriever([str(tmp_path) + '/', None, None, 'data.csv'])
+    expected = data_retriever.load_data()
+    assert (tmp_path / 'data.csv.cache' / 'manifest.json').exists()
+
+    read_csv = load_data.pd.read_csv
+    parsed = []
+    monkeypatch.setattr(load_data.pd, 'read_csv', lambda path, **kwargs: (str(tmp_path) in path and parsed.append(path)) or read_csv(path, **kwargs))
+
+    cached = data_retriever.load_data()
+    pd.testing.assert_frame_equal(cached, expected)
+    pd.testing.assert_frame_equal(pd.concat(data_retriever.load_data(chunksize=100)), expected)
+    assert parsed == [], "An up to date cache must not parse the CSV."
+    cached.iloc[0, 0] = -1.0
+    assert data_retriever.load_data().iloc[0, 0] == expected.iloc[0, 0], "Modifying loaded data must not modify the cache."
+
+    # Same content with a new modification time: kept, after checking the hash
+    os.utime(tmp_path / 'data.csv', ns=(0, 0))
+    data_retriever.load_data()
+    assert parsed == []
+
+    # New content: rebuilt
+    load_raw_data().head(100).to_csv(tmp_path / 'data.csv', index=False)
+    assert len(data_retriever.load_data()) == 100 and len(parsed) == 1
+    assert len(data_retriever.load_data()) == 100 and len(parsed) == 1
+
+
+@pytest.mark.filterwarnings('error::RuntimeWarning')
+def test_dtype_policy_compacts_pipeline_data():
+    """
+    Test that the dtype policy halves the memory of the data and training matrix, within the rounding tolerance.
+    """
+    dtype_policy = DtypePolicy(continuous=[feature for feature in FEATURES if feature not in ('CHAS', 'RAD')] + [TARGET], categorical=['CHAS', 'RAD'])
+    raw_df = load_raw_data()
+    compact_df = dtype_policy.apply(raw_df)
+
+    assert compact_df['CHAS'].dtype == np.uint8 and compact_df['RAD'].dtype == np.uint8 and compact_df['CRIM'].dtype == np.float32
+    assert compact_df.memory_usage(index=False).sum() <= raw_df.memory_usage(index=False).sum() / 2
+    assert 0 < dtype_policy.max_error_ <= 1e-6
+    assert DtypePolicy(continuous=[], categorical=['CHAS']).apply(raw_df.assign(CHAS=np.nan))['CHAS'].dtype == np.float32
+    with pytest.raises(ValueError):
+        dtype_policy.apply(raw_df.assign(CRIM=1e40))
+    with pytest.raises(ValueError):
+        dtype_policy.apply(raw_df.assign(CHAS=np.where(raw_df['CHAS'] > 0, -1e40, np.nan)))
+
+    for masked in [False, True]:
+        expected = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102).create_pipeline(masked=masked).fit_transform(raw_df)
+        housepricing_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102)
+        df_transformed = housepricing_pipeline.create_pipeline(masked=masked).fit_transform(compact_df)
+
+        assert (df_transformed.dtypes == np.float32).all()
+        assert df_transformed.shape == expected.shape
+        assert np.allclose(df_transformed, expected, rtol=0, atol=1e-5)
+
+    indicators = housepricing_pipeline.PIPELINE.named_steps['missing_indicator'].transform(raw_df).filter(like='_nan')
+    assert (indicators.dtypes == np.uint8).all()
+
+
+def test_quantile_sketch_exact_then_approximate():
+    """
+    Test that the quantile sketch is exact on small data, accurate on large data, and mergeable.
+    """
+    rng = np.random.default_rng(0)
+    small = rng.normal(size=500)
+    sketch = QuantileSketch().update(small[:200]).update(small[200:])
+    assert sketch.exact and np.array_equal(sketch.quantile([0.25, 0.75]), np.quantile(small, [0.25, 0.75]))
+    assert np.isnan(QuantileSketch().update([1.0, np.nan]).quantile(0.5))
+
+    large = rng.lognormal(size=400000)
+    left, right = QuantileSketch(k=1024), QuantileSketch(k=1024, random_state=1)
+    for chunk in np.array_split(large[:200000], 20):
+        left.update(chunk)
+    for chunk in np.array_split(large[200000:], 20):
+        right.update(chunk)
+    merged = left.merge(right)
+    assert not merged.exact and merged.n == len(large)
+    assert sum(len(items) for items in merged._levels) < 5000
+    ranks = np.searchsorted(np.sort(large), merged.quantile([0.01, 0.25, 0.5, 0.75, 0.99])) / len(large)
+    assert np.abs(ranks - [0.01, 0.25, 0.5, 0.75, 0.99]).max() < 0.005
+
+
+@pytest.mark.parametrize('masked', [False, True])
+def test_streaming_pipeline_matches_in_memory_pipeline(masked, tmp_path):
+    """
+    Test that fitting the pipeline chunk by chunk into an on-disk matrix gives the in-memory pipeline output.
+    """
+    data_retriever = DataRetriever(['./mlops_project/data/', None, None, 'data.csv'])
+    expected = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102).create_pipeline(masked=masked).fit_transform(data_retriever.load_data())
+
+    housepricing_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102)
+    housepricing_pipeline.create_pipeline(masked=masked)
+    df_transformed = housepricing_pipeline.fit_transform_chunks(lambda: data_retriever.load_data(chunksize=50), str(tmp_path / 'matrix.npy'))
+
+    pd.testing.assert_frame_equal(df_transformed, expected, check_exact=False, rtol=1e-12)
+    assert np.shares_memory(df_transformed.to_numpy(), housepricing_pipeline.matrix), "The output must be backed by the on-disk matrix."
+    assert np.load(tmp_path / 'matrix.npy').shape == expected.shape
+
+    # Compact chunks give a float32 matrix, like the in-memory pipeline on compact data
+    dtype_policy = DtypePolicy(continuous=[feature for feature in FEATURES if feature not in ('CHAS', 'RAD')] + [TARGET], categorical=['CHAS', 'RAD'])
+    expected = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102).create_pipeline(masked=masked).fit_transform(data_retriever.load_data(dtype_policy=dtype_policy))
+    df_transformed = housepricing_pipeline.fit_transform_chunks(lambda: data_retriever.load_data(chunksize=50, dtype_policy=dtype_policy), str(tmp_path / 'compact.npy'))
+    pd.testing.assert_frame_equal(df_transformed, expected)
+    assert np.load(tmp_path / 'compact.npy').dtype == np.float32
+
+
+def test_inference_artifact_scores_raw_features(trained_pipeline, tmp_path):
+    """
+    Test that the persisted inference artifact scales raw features like the training pipeline did.
+    """
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    predictor = ModelAPIPredictor(str(tmp_path / 'model.pkl'))
+
+    assert predictor.transform.features == FEATURES
+
+    raw = load_raw_data()[FEATURES].head(25)
+    scaled = trained_pipeline.PIPELINE.named_steps['scaler'].transform(raw)
+    expected = trained_pipeline.model.predict(scaled)
+
+    assert np.allclose(predictor.predict(raw.to_numpy()), expected)
+
+
+def test_forest_file_is_memory_mapped(trained_pipeline, tmp_path):
+    """
+    Test that the 'mmap' model format is served from read-only shared mappings with the same predictions.
+    """
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.forest', model_format='mmap')
+
+    pickled = ModelAPIPredictor(str(tmp_path / 'model.pkl'), engine='flat')
+    mapped = ModelAPIPredictor(str(tmp_path / 'model.forest'))
+
+    assert mapped.model is None and mapped.engine == 'flat'
+    for array in [mapped.flat_forest.feature, mapped.flat_forest.threshold, mapped.flat_forest.value]:
+        assert isinstance(array.base, np.memmap) or isinstance(array.base.base, np.memmap)
+        assert not array.flags.writeable
+        assert array.ctypes.data % 64 == 0, "Node arrays must be aligned."
+
+    raw = load_raw_data()[FEATURES].to_numpy()
+    assert np.array_equal(mapped.predict(raw), pickled.predict(raw))
+
+    with pytest.raises(ValueError):
+        ModelAPIPredictor(str(tmp_path / 'model.forest'), engine='sklearn')
+
+
+@pytest.mark.parametrize('model_format, compression', [('joblib', 'zlib'), ('mmap', 'lzma'), ('compact', None), ('compact', 'bz2')])
+def test_compact_and_compressed_model_formats(trained_pipeline, tmp_path, model_format, compression):
+    """
+    Test that compact and compressed models are smaller, follow the same tree paths and predict within float32 rounding.
+    """
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.forest', model_format='mmap')
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.out', model_format=model_format, compression=compression)
+
+    reference = ModelAPIPredictor(str(tmp_path / 'model.pkl'), engine='flat')
+    predictor = ModelAPIPredictor(str(tmp_path / 'model.out'))
+    uncompressed = 'model.pkl' if model_format == 'joblib' else 'model.forest'
+    assert os.path.getsize(tmp_path / 'model.out') < os.path.getsize(tmp_path / uncompressed)
+
+    raw = load_raw_data()[FEATURES].to_numpy()
+    scaled = reference.transform.transform(raw)
+    assert np.array_equal(predictor.flat_forest.apply(scaled), reference.flat_forest.apply(scaled))
+    if model_format == 'compact':
+        assert predictor.flat_forest.threshold.dtype == np.float32
+        assert np.allclose(predictor.predict(raw), reference.predict(raw), rtol=1e-6, atol=0)
+    else:
+        assert np.array_equal(predictor.predict(raw), reference.predict(raw))
+
+    with pytest.raises(ValueError):
+        trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.out', compression='zip')
+
+
+@pytest.mark.parametrize('executor', ['threads', 'processes'])
+def test_training_engine_cross_validation_matches_sklearn(executor):
+    """
+    Test that concurrent folds give the same scores as sklearn's sequential cross_val_score.
+    """
+    df = load_raw_data()
+    X, y = df[FEATURES], df[TARGET]
+    model = RandomForestRegressor(n_estimators=5, random_state=102)
+    engine = TrainingEngine(executor=executor, n_workers=2)
+
+    scores = engine.cross_val_score(model, X, y, cv=4)
+
+    assert np.array_equal(scores, cross_val_score(estimator=model, X=X, y=y, cv=4))
+    assert engine.phase_times['cross_validation'] > 0
+
+
+def test_training_engine_fit_restores_n_jobs():
+    """
+    Test that the engine builds trees in parallel without leaving n_jobs set on the fitted model.
+    """
+    df = load_raw_data()
+    model = RandomForestRegressor(n_estimators=5, random_state=102)
+
+    TrainingEngine(n_workers=2).fit(model, df[FEATURES], df[TARGET])
+
+    assert model.n_jobs is None
+    assert len(model.estimators_) == 5
+
+
+def test_oob_evaluation_needs_no_extra_fits(trained_pipeline, monkeypatch):
+    """
+    Test that the default 'oob' evaluation fills the generalization score without cross validation fits,
+    and that full cross validation stays available.
+    """
+    def fail(*args, **kwargs):
+        raise AssertionError("OOB evaluation must not run cross validation.")
+
+    monkeypatch.setattr(trained_pipeline.engine, 'cross_val_score', fail)
+    scores_df = trained_pipeline.get_evaluation_metrics(y_test=trained_pipeline.y_test)
+
+    assert scores_df['Cross Validated R2 Score'][0] == trained_pipeline.model.oob_score_
+    assert scores_df['Generalization Method'][0] == 'Out-of-bag'
+    assert list(scores_df.columns) == ['Model', 'R2 Score', 'Adjusted R2 Score', 'Cross Validated R2 Score', 'Generalization Method', 'RMSE']
+
+    monkeypatch.undo()
+    trained_pipeline.evaluation = 'cv'
+    scores_df = trained_pipeline.get_evaluation_metrics(y_test=trained_pipeline.y_test)
+    assert scores_df['Generalization Method'][0] == '10-fold CV'
+    assert 0 < scores_df['Cross Validated R2 Score'][0] < 1
+
+
+def test_successive_halving_search(trained_pipeline):
+    """
+    Test that the search keeps the best third of the candidates at every rung, grows the survivors with
+    warm start, and hands the best parameters to fit_random_forest.
+    """
+    param_grid = {'max_depth': [2, 4, None], 'max_features': [0.5, 1.0], 'min_samples_leaf': [1, 5]}
+
+    leaderboard = trained_pipeline.search_hyperparameters(trained_pipeline.X_train, trained_pipeline.y_train, param_grid,
+                                                          min_estimators=2, max_estimators=18, factor=3)
+
+    assert len(leaderboard) == 12
+    assert list(leaderboard['rung'].value_counts().sort_index()) == [8, 2, 2]
+    assert leaderboard.loc[0, 'n_estimators'] == 18
+    assert {'fit_time_s', 'predict_latency_ms', 'val_r2', 'val_rmse'} <= set(leaderboard.columns)
+
+    best_model = trained_pipeline.search.best_model_
+    assert len(best_model.estimators_) == 18
+    assert trained_pipeline.model_params['n_estimators'] == 18
+
+    model = trained_pipeline.fit_random_forest(trained_pipeline.X_train, trained_pipeline.y_train)
+    assert model.n_estimators == 18 and model.max_depth == trained_pipeline.model_params['max_depth']
+
+
+def test_truncate_tree_predicts_the_node_at_max_depth(trained_pipeline):
+    """
+    Test that a truncated tree predicts the value of the node each row reaches at max_depth, and drops the nodes below.
+    """
+    tree = trained_pipeline.model.estimators_[0]
+    X = trained_pipeline.X_test.to_numpy(dtype=np.float32)
+    truncated = truncate_tree(tree, max_depth=3)
+
+    assert truncated.get_depth() == 3 and truncated.tree_.node_count < tree.tree_.node_count
+    assert tree.get_depth() > 3, "The original tree must not be modified."
+    assert truncate_tree(tree, max_depth=None) is tree
+
+    paths = tree.decision_path(X)
+    for row in range(len(X)):
+        path = np.sort(paths.indices[paths.indptr[row]:paths.indptr[row + 1]])
+        assert truncated.predict(X[row:row + 1])[0] == tree.tree_.value[path[min(3, len(path) - 1)], 0, 0]
+
+
+def test_compact_forest_keeps_fewer_trees_within_tolerance(trained_pipeline, tmp_path):
+    """
+    Test that compact_forest keeps a subset of (truncated) trees, reports the savings, and persists the smaller model.
+    """
+    full_model = trained_pipeline.model
+    report = trained_pipeline.compact_forest(trained_pipeline.X_test, trained_pipeline.y_test, tolerance=0.05, max_depths=[None, 8, 6])
+    compactor = trained_pipeline.compactor
+
+    assert len(full_model.estimators_) == 100, "The trained forest must not be modified."
+    assert trained_pipeline.model is compactor.model_
+    assert len(trained_pipeline.model.estimators_) == len(set(compactor.selected_trees_)) < 100
+    assert list(report.index) == ['full', 'compacted', 'saved %']
+    assert report.loc['compacted', 'n_nodes'] < report.loc['full', 'n_nodes']
+    assert report.loc['saved %', 'forest_bytes'] > 0
+    assert list(compactor.candidates_['max_depth'].fillna(-1)) == [-1, 8, 6]
+    if compactor.max_depth_ is not None:
+        assert trained_pipeline.model.estimators_[0].get_depth() <= compactor.max_depth_
+
+    # The compacted forest has no out-of-bag estimate, it is cross validated instead
+    trained_pipeline.predict(trained_pipeline.X_test)
+    scores = trained_pipeline.get_evaluation_metrics(trained_pipeline.y_test)
+    assert scores.loc[0, 'Generalization Method'] == '10-fold CV' and np.isfinite(scores.loc[0, 'Cross Validated R2 Score'])
+
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.forest', model_format='mmap')
+    predictor = ModelAPIPredictor(str(tmp_path / 'model.forest'))
+    raw = load_raw_data()[FEATURES].head(25)
+    scaled = trained_pipeline.PIPELINE.named_steps['scaler'].transform(raw)
+    assert predictor.flat_forest.n_trees == len(compactor.selected_trees_)
+    assert np.allclose(predictor.predict(raw.to_numpy()), trained_pipeline.model.predict(scaled))
+
+    with pytest.raises(ValueError):
+        trained_pipeline.compact_forest(trained_pipeline.X_test, trained_pipeline.y_test, metric='mae')
+
+
+@pytest.mark.parametrize('tolerance', [0.005, 0.01, 0.02, 0.05])
+def test_forest_compactor_keeps_prefix_within_tolerance(trained_pipeline, tolerance):
+    """
+    Test that the trees kept are within tolerance of the whole forest on the validation rows used to stop the selection.
+    """
+    model, X_val, y_val = trained_pipeline.model, trained_pipeline.X_test, trained_pipeline.y_test.to_numpy()
+    compactor = ForestCompactor(tolerance=tolerance, random_state=0, repeat=1)
+    compactor.fit(model, X_val, y_val)
+
+    # The rows the number of trees is chosen on, split as ForestCompactor._select does
+    rows = np.random.default_rng(0).permutation(len(y_val))
+    stop = rows[int(round(compactor.selection_size * len(y_val))):]
+    full_rmse = np.sqrt(np.mean((model.predict(X_val.iloc[stop]) - y_val[stop]) ** 2))
+    compacted_rmse = np.sqrt(np.mean((compactor.model_.predict(X_val.iloc[stop]) - y_val[stop]) ** 2))
+
+    assert compactor.candidates_['within_tolerance'].all()
+    assert len(compactor.selected_trees_) < len(model.estimators_)
+    assert compacted_rmse <= full_rmse * (1 + tolerance)
+
+
+def test_update_model_grows_and_retires_trees(trained_pipeline, tmp_path):
+    """
+    Test that an update adds trees fit on the new rows only, and retires the oldest ones beyond max_estimators.
+    """
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    updated_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102)
+    model = updated_pipeline.load_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    newest_tree = model.estimators_[-1]
+
+    new_data = load_raw_data().tail(30)
+    updated_pipeline.update_model(new_data, n_new_estimators=10)
+    assert len(model.estimators_) == 110
+    assert model.estimators_[99] is newest_tree
+    assert all(tree.tree_.n_node_samples[0] <= 30 for tree in model.estimators_[100:]), "New trees must be fit on the new rows only."
+    assert not hasattr(model, 'oob_score_') and model.warm_start is False
+    assert list(model.feature_names_in_) == FEATURES, "The forest must keep the feature names it was fit with."
+
+    updated_pipeline.update_model(new_data, n_new_estimators=5, max_estimators=100)
+    assert len(model.estimators_) == 100 and model.n_estimators == 100
+    assert model.estimators_[84] is newest_tree
+
+    for bounds in [{'n_new_estimators': 0}, {'n_new_estimators': -3}, {'max_estimators': 0}]:
+        with pytest.raises(ValueError):
+            updated_pipeline.update_model(new_data, **bounds)
+    assert len(model.estimators_) == 100
+
+    # Without an out-of-bag estimate, the updated forest is cross validated
+    trained_pipeline.update_model(new_data, n_new_estimators=5)
+    trained_pipeline.predict(trained_pipeline.X_test)
+    scores = trained_pipeline.get_evaluation_metrics(trained_pipeline.y_test)
+    assert scores.loc[0, 'Generalization Method'] == '10-fold CV' and np.isfinite(scores.loc[0, 'Cross Validated R2 Score'])
+
+    # The updated model is persisted with the preprocessing of the original training
+    updated_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    assert ModelAPIPredictor(str(tmp_path / 'model.pkl')).transform.features == FEATURES
+
+
+def test_train_new_model_endpoint(trained_pipeline, tmp_path, monkeypatch):
+    """
+    Test that '/train_new_model' grows the served model and the registry swaps in the new version.
+    """
+    from fastapi.testclient import TestClient
+
+    import api.main as main
+    from mlops_project.predictor.model_registry import ModelRegistry
+
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    model_path = str(tmp_path / 'model.pkl')
+    monkeypatch.setattr(main, 'MODEL_PATH', model_path)
+    monkeypatch.setattr(main, 'registry', ModelRegistry(model_path))
+    client = TestClient(main.app)
+    version = main.registry.version
+
+    rows = load_raw_data().tail(20)
+    records = [dict(zip([feature.lower() for feature in FEATURES] + ['medv'], row)) for row in rows[FEATURES + [TARGET]].to_numpy().tolist()]
+    response = client.post('/train_new_model', json={'records': records, 'n_new_estimators': 4})
+
+    assert response.status_code == 200
+    assert response.json()['n_estimators'] == 104
+    assert response.json()['version'] != version
+    assert len(main.registry.get().model.estimators_) == 104
+
+    version = main.registry.version
+    for bounds in [{'n_new_estimators': 0}, {'n_new_estimators': -3}, {'max_estimators': 0}]:
+        assert client.post('/train_new_model', json=dict(bounds, records=records)).status_code == 422
+    assert main.registry.version == version
+
+
+def wait_for_job(job_queue, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while job_queue.get(job_id)['status'] in ('queued', 'running'):
+        assert time.monotonic() < deadline, "Training job did not finish in time."
+        time.sleep(0.05)
+    return job_queue.get(job_id)
+
+
+@pytest.mark.parametrize('executor', ['threads', 'processes'])
+def test_training_job_queue_runs_and_cancels_jobs(executor, tmp_path):
+    """
+    Test that background jobs train and persist a model, and that a queued job can be cancelled.
+    """
+    from train.job_queue import TrainingJobQueue
+
+    published = []
+    job_queue = TrainingJobQueue(max_concurrent_jobs=1, executor=executor, on_success=published.append)
+    spec = {
+        'data_path': os.path.abspath('./mlops_project/data/data.csv'), 'features': FEATURES, 'target': TARGET, 'n': 1,
+        'seed_model': 102, 'seed_split': 42, 'test_size': 0.2, 'evaluation': 'oob', 'model_params': {'n_estimators': 5},
+        'n_workers': 1, 'output_path': str(tmp_path / '{job_id}.pkl'), 'model_format': 'joblib',
+    }
+    try:
+        job_id = job_queue.submit(spec)
+        queued_id = job_queue.submit(spec)          # Waits for the only worker
+        assert job_queue.cancel(queued_id)
+
+        job = wait_for_job(job_queue, job_id)
+        assert job['status'] == 'succeeded', job['error']
+        assert job['progress'] == 1.0
+        assert job['result']['artifact_path'] == str(tmp_path / (job_id + '.pkl'))
+        assert len(ModelAPIPredictor(job['result']['artifact_path']).model.estimators_) == 5
+        assert [job['id'] for job in published] == [job_id]
+
+        assert wait_for_job(job_queue, queued_id)['status'] == 'cancelled'
+        assert not (tmp_path / (queued_id + '.pkl')).exists()
+        assert [job['id'] for job in job_queue.list()] == [job_id, queued_id]
+    finally:
+        job_queue.shutdown(wait=True)
+
+
+def test_training_job_endpoints_publish_model(trained_pipeline, tmp_path, monkeypatch):
+    """
+    Test that a job submitted through '/jobs/train' publishes its model to the registry.
+    """
+    from fastapi.testclient import TestClient
+
+    import api.main as main
+    from mlops_project.predictor.model_registry import ModelRegistry
+    from train.job_queue import TrainingJobQueue
+
+    trained_pipeline.persist_model(trained_model_dir=str(tmp_path) + '/', file_save_name='model.pkl')
+    model_path = str(tmp_path / 'model.pkl')
+    monkeypatch.setattr(main, 'MODEL_PATH', model_path)
+    monkeypatch.setattr(main, 'registry', ModelRegistry(model_path))
+    monkeypatch.setattr(main, 'job_queue', TrainingJobQueue(executor='threads', on_success=main.publish_trained_model))
+    client = TestClient(main.app)
+    version = main.registry.version
+
+    response = client.post('/jobs/train', json={'hyperparameters': {'n_estimators': 7, 'max_depth': 8}})
+    assert response.status_code == 202
+    job_id = response.json()['id']
+
+    job = wait_for_job(main.job_queue, job_id)
+    assert job['status'] == 'succeeded', job['error']
+    assert client.get(f'/jobs/{job_id}').json()['status'] == 'succeeded'
+    assert [job['id'] for job in client.get('/jobs').json()] == [job_id]
+    assert main.registry.version != version
+    assert len(main.registry.get().model.estimators_) == 7
+
+    assert client.get('/jobs/unknown').status_code == 404
+    assert client.delete('/jobs/unknown').status_code == 404
+    assert client.post('/jobs/train', json={'evaluation': 'holdout'}).status_code == 422
+    # Unknown, reserved or invalid hyperparameters are rejected at submission, without queueing a job
+    for hyperparameters in ({'foo': 1}, {'random_state': 1}, {'oob_score': False}, {'max_depth': -2}, {'criterion': 'foo'}):
+        assert client.post('/jobs/train', json={'hyperparameters': hyperparameters}).status_code == 422
+    assert len(client.get('/jobs').json()) == 1
+    main.job_queue.shutdown(wait=True)
+
+
+def test_check_model_params_accepts_valid_forest_parameters():
+    """
+    Test that model parameters are checked with the public estimator API, without rejecting values that depend on the data.
+    """
+    for model_params in ({}, {'n_estimators': 100000, 'max_depth': 8}, {'max_samples': 300}, {'max_samples': 0.5},
+                         {'criterion': 'poisson'}, {'monotonic_cst': [0] * len(FEATURES)}):
+        check_model_params(model_params, n_features=len(FEATURES))
+    for model_params in ({'foo': 1}, {'random_state': 1}, {'n_estimators': 0}, {'n_estimators': '5'}, {'min_samples_split': 1},
+                         {'bootstrap': False, 'max_samples': 10}, {'monotonic_cst': [0, 1]}):
+        with pytest.raises(ValueError):
+            check_model_params(model_params, n_features=len(FEATURES))
+    with pytest.raises(ValueError):
+        HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102, model_params={'max_depth': -2})
+
+
+def test_training_job_queue_keeps_last_finished_jobs(tmp_path):
+    """
+    Test that only the last max_finished_jobs finished jobs are kept.
+    """
+    from train.job_queue import TrainingJobQueue
+
+    job_queue = TrainingJobQueue(executor='threads', max_finished_jobs=2)
+    spec = {
+        'data_path': os.path.abspath('./mlops_project/data/data.csv'), 'features': FEATURES, 'target': TARGET, 'n': 1,
+        'seed_model': 102, 'seed_split': 42, 'test_size': 0.2, 'evaluation': 'oob', 'model_params': {'n_estimators': 2},
+        'n_workers': 1, 'output_path': str(tmp_path / '{job_id}.pkl'), 'model_format': 'joblib',
+    }
+    try:
+        job_ids = [job_queue.submit(spec) for _ in range(4)]
+        assert wait_for_job(job_queue, job_ids[-1])['status'] == 'succeeded'
+        assert [job['id'] for job in job_queue.list()] == job_ids[-2:]
+        assert job_queue.get(job_ids[0]) is None
+        assert set(job_queue._futures) == set(job_ids[-2:])
+    finally:
+        job_queue.shutdown(wait=True)
+
+
+def test_benchmark_suite_writes_comparable_results(tmp_path):
+    """
+    Test that the benchmark suite times every stage on a synthetic dataset and compares runs with a baseline.
+    """
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+    from benchmark_suite import BenchmarkSuite, compare, make_synthetic_dataset
+
+    source_df = load_raw_data()
+    synthetic_df = make_synthetic_dataset(source_df, 2.5, seed=1)
+    assert len(synthetic_df) == 1265 and list(synthetic_df.columns) == list(source_df.columns)
+    assert set(synthetic_df['RAD'].unique()) <= set(source_df['RAD'].unique())
+    assert make_synthetic_dataset(source_df, 2.5, seed=1).equals(synthetic_df)
+
+    suite = BenchmarkSuite(scales=[0.5], repeat=1, n_estimators=5, batch_rows=50)
+    results = suite.run()
+    suite.save(str(tmp_path / 'results.json'))
+
+    names = {result['name'] for result in results['results']}
+    assert {'missing_indicator.transform', 'iqr_dropoutliers.fit_transform', 'drop_missing.transform', 'standard_scaler.fit_transform',
+            'fit_random_forest', 'get_evaluation_metrics', 'persist_model[joblib]', 'load_model[mmap]',
+            'predict_single_row[joblib]', 'predict_batch[mmap]'} <= names
+    assert all(result['seconds'] > 0 and result['peak_memory_bytes'] >= 0 for result in results['results'])
+
+    with open(tmp_path / 'results.json') as file:
+        baseline = json.load(file)
+    baseline['results'][0]['seconds'] /= 10
+    comparison = compare(results, baseline, threshold=0.5)
+    assert len(comparison) == len(results['results'])
+    assert [entry['regression'] for entry in comparison][0] is True
+
+
+@pytest.mark.parametrize('masked', [False, True])
+def test_pipeline_profiler_records_every_stage(masked, tmp_path):
+    """
+    Test that the profiler records time, memory and data sizes of every pipeline step and training method,
+    and leaves the pipeline steps as they were.
+    """
+    profiler = PipelineProfiler()
+    housepricing_pipeline = HousepricingDataPipeline(features=FEATURES, target=TARGET, n=1, seed_model=102, profiler=profiler, model_params={'n_estimators': 5})
+    housepricing_pipeline.create_pipeline(masked=masked)
+    df_transformed = housepricing_pipeline.fit_transform(load_raw_data())
+    housepricing_pipeline.fit_random_forest(X_train=df_transformed[FEATURES], y_train=df_transformed[TARGET])
+    housepricing_pipeline.predict(X_test=df_transformed[FEATURES])
+
+    report = profiler.report()
+    summary = {entry['name']: entry for entry in report.summary()}
+    assert {'pipeline.fit_transform', 'missing_indicator.fit_transform', 'iqr_dropoutliers.fit', 'drop_missing.transform',
+            'scaler.fit_transform', 'fit_random_forest', 'predict'} <= set(summary)
+    assert summary['pipeline.fit_transform']['rows_in'] == len(load_raw_data())
+    assert summary['pipeline.fit_transform']['rows_out'] == len(df_transformed) == summary['scaler.fit_transform']['rows_out']
+    assert summary['iqr_dropoutliers.transform']['rows_out'] < summary['iqr_dropoutliers.transform']['rows_in']
+    assert summary['predict']['rows_out'] == len(df_transformed)
+    assert all(entry['wall_s'] >= 0 and entry['cpu_s'] >= 0 and entry['peak_memory_bytes'] >= 0 for entry in summary.values())
+    assert all(stage['parent'] == 'pipeline.fit_transform' for stage in report.stages if stage['name'].endswith('.fit_transform') and stage['name'] != 'pipeline.fit_transform')
+    assert 'fit_random_forest' in str(report) and len(report.to_frame()) == len(report.stages)
+
+    # Steps are only instrumented while the pipeline runs
+    assert all('fit_transform' not in vars(step) for _, step in housepricing_pipeline.PIPELINE.steps)
+
+    report.write_chrome_trace(str(tmp_path / 'trace.json'))
+    with open(tmp_path / 'trace.json') as file:
+        events = json.load(file)['traceEvents']
+    assert len(events) == len(report.stages) and all(event['ph'] == 'X' and event['dur'] >= 0 for event in events)